@@ -1,26 +1,101 @@
 import os
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash, session
+from flask import Flask, g, jsonify, render_template, request, redirect, send_file, stream_template, url_for, flash, session
 from flask_caching import Cache
 from flask_compress import Compress
-import sqlite3
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import hmac
 import random
-import requests
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import zlib
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from config import TMDB_API_KEY
+import auth
+import catalog
+import caching
+import db
+import enrichment
+import httpcache
+import images
+import metrics
+import mylist
+import recommend
+import tmdb
+import watch
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key' 
 
+# Per-route latency histograms and SQL statement timing, exported on /metrics (see metrics.py).
+# Registered first so its after_request hook runs last and times the whole response.
+metrics.init_app(app)
+
 # --- NEW CACHE CONFIGURATION ---
-app.config['CACHE_TYPE'] = 'SimpleCache' 
+# One SQLite cache file shared by every worker process on the host (see caching.SQLiteCache);
+# NETFLIX_CACHE_TYPE=SimpleCache goes back to a private cache per process
+app.config['CACHE_TYPE'] = os.environ.get('NETFLIX_CACHE_TYPE', 'caching.SQLiteCache')
+app.config['CACHE_SQLITE_PATH'] = os.environ.get('NETFLIX_CACHE_DB', os.path.join(db.BASEDIR, 'app_cache.db'))
 app.config['CACHE_DEFAULT_TIMEOUT'] = 3600 # 1 hour
 cache = Cache(app)
 
+# Typo-tolerant search falls back to the trigram index when a prefix search finds nothing
+app.config['SEARCH_FUZZY'] = os.environ.get('NETFLIX_SEARCH_FUZZY', '0') == '1'
+
+# Search results for the prefixes people type, dropped whenever the catalog version changes
+search_cache = caching.SearchCache(limit=catalog.ROW_LIMIT)
+
+# TMDB responses behind /get_info and /get_trailer, in memory and in a SQLite file every worker shares
+tmdb_cache = caching.ResponseCache(os.environ.get('TMDB_CACHE_DB', os.path.join(db.BASEDIR, 'tmdb_cache.db')))
+
+# Shared TMDB client: pooled connections, timeouts, a couple of quick retries, and a
+# circuit breaker so a TMDB outage fails fast instead of tying up request threads
+tmdb_client = tmdb.TMDBClient(retries=2, max_backoff=2)
+
+# Runs the second half of lookups that go to TMDB twice at once (get_trailer's movie/tv fallback)
+lookup_pool = ThreadPoolExecutor(16, thread_name_prefix='tmdb-lookup')
+
+# Fetches titles saved to My List that aren't in the catalog yet; see enrichment.py.
+# Nobody is waiting on it, so it can retry patiently and keep well under TMDB's rate limit.
+enrichment_worker = enrichment.EnrichmentWorker(
+    tmdb.TMDBClient(pool_size=enrichment.WORKERS, limiter=tmdb.TokenBucket(10)))
+
+# Trailer progress pings, coalesced per profile and title and written in one transaction
+# every NETFLIX_PROGRESS_FLUSH_MS; see watch.py. What's buffered is written on a clean exit.
+progress_buffer = watch.ProgressBuffer()
+
+# Posters, backdrops and logos, kept on disk (as WebP when Pillow is installed); see images.py
+image_cache = images.ImageCache()
+
 # initialize compress
 Compress(app)
 
+# pooled SQLite connections, handed back when the app context tears down
+db.init_app(app)
+
 # --- LOGIN SETUP ---
+# scrypt runs on a bounded process pool (see auth.py), never on the request thread
+password_hasher = auth.PasswordHasher()
+
+# Login attempts allowed per minute, per client IP (signups count too) and per account.
+# 0 turns a limit off. Behind a reverse proxy, wrap the app in ProxyFix so the IP is the client's.
+LOGIN_IP_PER_MINUTE = int(os.environ.get('LOGIN_IP_PER_MINUTE', 20))
+LOGIN_EMAIL_PER_MINUTE = int(os.environ.get('LOGIN_EMAIL_PER_MINUTE', 5))
+login_limits = [(limit, auth.RateLimiter(rate=limit / 60, burst=limit))
+                for limit in (LOGIN_IP_PER_MINUTE, LOGIN_EMAIL_PER_MINUTE)]
+
+def login_wait(email=None):
+    # Seconds until this client may try again (0 = go ahead)
+    keys = [request.remote_addr, email.strip().lower() if email else None]
+    return max([limiter.allow(key) for (per_minute, limiter), key in zip(login_limits, keys)
+                if per_minute and key] or [0])
+
+def auth_error(template, message, status, retry_after=None):
+    flash(message)
+    headers = {'Retry-After': str(math.ceil(retry_after))} if retry_after else {}
+    return render_template(template), status, headers
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login' 
@@ -33,21 +108,54 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
+    user = get_user_data(user_id)['user']
     if user:
         return User(id=user['id'], email=user['email'], name=user['name'])
     return None
 
-def get_db_connection():
-    basedir = os.path.abspath(os.path.dirname(__file__))
 
-    db_path = os.path.join(basedir, 'netflix.db')
+# --- PER-USER SESSION DATA ---
+# The user row and profile list, cached in each process so an authenticated
+# request costs no queries. The key includes a counter kept in the (signed,
+# client side) session: changing a profile bumps it, so whichever worker gets
+# that browser's next request misses and reloads. Other devices logged into
+# the same account catch up within USER_CACHE_TTL.
+USER_CACHE_TTL = 300
+user_cache = caching.LRUCache(max_entries=4096)
+
+def get_user_data(user_id):
+    key = (int(user_id), session.get('user_data_version', 0))
+    entry = user_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < USER_CACHE_TTL:
+        return entry[1]
+
+    conn = get_db_connection(readonly=True)
+    user = conn.execute('SELECT id, email, name FROM users WHERE id = ?', (user_id,)).fetchone()
+    profiles = conn.execute('SELECT * FROM profiles WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+    conn.close()
+
+    data = {'user': dict(user) if user else None, 'profiles': [dict(profile) for profile in profiles]}
+    user_cache.put(key, (time.monotonic(), data))
+    return data
+
+def invalidate_user_data():
+    session['user_data_version'] = session.get('user_data_version', 0) + 1
+
+def get_db_connection(readonly=False):
+    # One pooled connection per app context, shared by load_user, the context processor and the route
+    return db.get_connection(readonly)
+
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+# seed.py and add_to_list bump the version; checking it at most once a second keeps caches cheap
+catalog_version = caching.PolledValue(lambda: catalog.get_catalog_version(get_db_connection(readonly=True)))
+
+def get_catalog_version():
+    return catalog_version.get()
+
+# ETags, 304s and pre-compressed bodies for the catalog JSON routes (see httpcache.py);
+# NETFLIX_HTTP_CACHE=0 turns it off, e.g. to compare against in benchmarks
+http_cache = httpcache.HTTPCache(get_catalog_version, enabled=os.environ.get('NETFLIX_HTTP_CACHE', '1') == '1')
+app.after_request(httpcache.revalidate_private)
 # --- AUTH ROUTES ---
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -57,6 +165,10 @@ def signup():
         password = request.form['password']
         name = request.form.get('name', 'User')
 
+        wait = login_wait()
+        if wait:
+            return auth_error('signup.html', "Too many attempts. Please wait a minute and try again.", 429, wait)
+
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
 
@@ -66,7 +178,11 @@ def signup():
             return redirect(url_for('signup'))
 
         # Create new user
-        hashed_pw = generate_password_hash(password, method='scrypt')
+        try:
+            hashed_pw = password_hasher.hash(password)
+        except auth.HasherBusy:
+            conn.close()
+            return auth_error('signup.html', "We're busy right now. Please try again in a moment.", 503, 5)
         
         # 1. Get the cursor so we can grab the new ID
         cursor = conn.execute('INSERT INTO users (email, password, name) VALUES (?, ?, ?)', 
@@ -84,6 +200,7 @@ def signup():
         
         new_user = User(id=new_user_id, email=email, name=name)
         login_user(new_user)
+        invalidate_user_data()
         
         return redirect(url_for('browse_profiles'))
 
@@ -96,6 +213,10 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
+        wait = login_wait(email)
+        if wait:
+            return auth_error('login.html', "Too many login attempts. Please wait a minute and try again.", 429, wait)
+
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
         conn.close()
@@ -104,10 +225,27 @@ def login():
             flash("Account not found. This is a free clone! Please Sign Up first.")
             return redirect(url_for('login'))
         
-        if not check_password_hash(user['password'], password):
+        try:
+            password_ok = password_hasher.verify(user['password'], password)
+        except auth.HasherBusy:
+            return auth_error('login.html', "We're busy right now. Please try again in a moment.", 503, 5)
+
+        if not password_ok:
             flash("Incorrect password. Please try again.")
             return redirect(url_for('login'))
 
+        # Hashed with older cost settings: upgrade it while we have the password (or next time, if busy)
+        if password_hasher.needs_rehash(user['password']):
+            try:
+                new_hash = password_hasher.hash(password)
+            except auth.HasherBusy:
+                new_hash = None
+            if new_hash:
+                conn = get_db_connection()
+                conn.execute('UPDATE users SET password = ? WHERE id = ?', (new_hash, user['id']))
+                conn.commit()
+                conn.close()
+
         user_obj = User(id=user['id'], email=user['email'], name=user['name'])
         login_user(user_obj)
         
@@ -130,19 +268,19 @@ def logout():
 @app.route('/profiles')
 @login_required
 def browse_profiles():
-    conn = get_db_connection()
-    profiles = conn.execute('SELECT * FROM profiles WHERE user_id = ?', (current_user.id,)).fetchall()
-    conn.close()
+    profiles = get_user_data(current_user.id)['profiles']
     return render_template('profiles.html', profiles=profiles)
 
 @app.route('/set_profile/<int:profile_id>')
 @login_required
 def set_profile(profile_id):
-    conn = get_db_connection()
-    profile = conn.execute('SELECT * FROM profiles WHERE id = ? AND user_id = ?', 
+    # Checked against the database, not the cached profile list: another device may have
+    # deleted the profile within USER_CACHE_TTL. One primary key lookup.
+    conn = get_db_connection(readonly=True)
+    profile = conn.execute('SELECT id, name, avatar FROM profiles WHERE id = ? AND user_id = ?',
                            (profile_id, current_user.id)).fetchone()
     conn.close()
-    
+
     if profile:
         session['profile_id'] = profile['id']
         session['profile_name'] = profile['name']
@@ -169,6 +307,7 @@ def add_profile():
                 conn.execute('INSERT INTO profiles (user_id, name, avatar) VALUES (?, ?, ?)',
                              (current_user.id, name, avatar_color))
                 conn.commit()
+                invalidate_user_data()
             else:
                 flash("Maximum 5 profiles allowed.")
             
@@ -181,9 +320,7 @@ def add_profile():
 @app.route('/manage-profiles')
 @login_required
 def manage_profiles():
-    conn = get_db_connection()
-    profiles = conn.execute('SELECT * FROM profiles WHERE user_id = ?', (current_user.id,)).fetchall()
-    conn.close()
+    profiles = get_user_data(current_user.id)['profiles']
     return render_template('manage_profiles.html', profiles=profiles)
 
 @app.route('/edit-profile/<int:profile_id>', methods=['GET', 'POST'])
@@ -206,6 +343,7 @@ def edit_profile(profile_id):
         conn.execute('UPDATE profiles SET name = ? WHERE id = ?', (new_name, profile_id))
         conn.commit()
         conn.close()
+        invalidate_user_data()
         
         # Update session if we just edited the active profile
         if session.get('profile_id') == profile_id:
@@ -233,6 +371,7 @@ def delete_profile(profile_id):
     conn.execute('DELETE FROM profiles WHERE id = ? AND user_id = ?', (profile_id, current_user.id))
     conn.commit()
     conn.close()
+    invalidate_user_data()
     
     # 3. Handle Session (If we deleted the active profile, log them out of the profile)
     if session.get('profile_id') == profile_id:
@@ -247,30 +386,25 @@ def delete_profile(profile_id):
 def inject_user_data():
     """
     Injects 'all_profiles' AND 'active_profile' into every page.
+    Both are lazy: nothing is looked up unless the template uses them.
     """
     data = {}
     if current_user.is_authenticated:
-        conn = get_db_connection()
-        
         # 1. Get ALL profiles (for the dropdown list)
-        profiles = conn.execute('SELECT * FROM profiles WHERE user_id = ?', (current_user.id,)).fetchall()
-        data['all_profiles'] = profiles
+        data['all_profiles'] = LocalProxy(lambda: get_user_data(current_user.id)['profiles'])
         
         # 2. Get ACTIVE profile (to color the top-right avatar)
-        active_profile_id = session.get('profile_id')
-        
-        if active_profile_id:
-            active_profile = conn.execute('SELECT * FROM profiles WHERE id = ?', (active_profile_id,)).fetchone()
-            data['active_profile'] = active_profile
-        else:
-            if profiles:
-                data['active_profile'] = profiles[0]
-            else:
-                data['active_profile'] = None
-
-        conn.close()
+        data['active_profile'] = LocalProxy(get_active_profile)
     return data
 
+def get_active_profile():
+    profiles = get_user_data(current_user.id)['profiles']
+    active_profile_id = session.get('profile_id')
+
+    if active_profile_id:
+        return next((p for p in profiles if p['id'] == active_profile_id), None)
+    return profiles[0] if profiles else None
+
 
 @app.route('/add_to_list/<media_type>/<int:tmdb_id>', methods=['POST'])
 @login_required
@@ -278,48 +412,93 @@ def add_to_list(media_type, tmdb_id):
     if 'profile_id' not in session:
         return jsonify({'error': 'No profile selected'}), 403
 
+    media_type = media_type.lower()
+    if media_type not in mylist.MEDIA_TYPES:
+        return jsonify({'error': 'Unknown media type'}), 400
+
     profile_id = session['profile_id']
     conn = get_db_connection()
-    media_type = media_type.lower()
-    
-    exists = conn.execute('SELECT * FROM mylist WHERE profile_id = ? AND tmdb_id = ? AND media_type = ?', 
-                          (profile_id, tmdb_id, media_type)).fetchone()
-    
-    if exists:
-        conn.execute('DELETE FROM mylist WHERE profile_id = ? AND tmdb_id = ? AND media_type = ?',
-                     (profile_id, tmdb_id, media_type))
-        status = 'removed'
-    else:
-        local_movie = conn.execute('SELECT * FROM movies WHERE tmdb_id = ? AND media_type = ?', 
-                                   (tmdb_id, media_type)).fetchone()
-        
-        if not local_movie:
-            url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}?api_key={TMDB_API_KEY}&language=en-US"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                title = data.get('title') or data.get('name')
-                poster = data.get('poster_path')
-                backdrop = data.get('backdrop_path')
-                date = data.get('release_date') or data.get('first_air_date')
-                overview = data.get('overview')
-                rating = data.get('vote_average')
-                
-                conn.execute("""
-                    INSERT INTO movies (tmdb_id, title, overview, poster_path, backdrop_path, 
-                                      release_date, vote_average, media_type, genre)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'user_saved')
-                """, (tmdb_id, title, overview, poster, backdrop, date, rating, media_type))
-        
-        conn.execute('INSERT INTO mylist (profile_id, tmdb_id, media_type) VALUES (?, ?, ?)',
-                     (profile_id, tmdb_id, media_type))
-        status = 'added'
-        
+    status = mylist.toggle(conn, profile_id, media_type, tmdb_id)
+    # Not in the catalog yet (e.g. saved from search): fetched in the background, never in this request
+    queued = status == 'added' and enrichment.enqueue(conn, [(media_type, tmdb_id)])
+
     conn.commit()
     conn.close()
+
+    if queued:
+        enrichment_worker.wake()
     return jsonify({'status': status})
 
 
+# Most titles one batch request may touch
+MAX_BATCH_TITLES = 500
+
+@app.route('/api/my-list/batch', methods=['POST'])
+@login_required
+def my_list_batch():
+    """
+    Adds, removes and reorders many titles in one transaction:
+
+        {"add": ["movie:550"], "remove": ["tv:1399"], "order": ["movie:550", "movie:13"]}
+
+    Every key is optional. `order` replaces the whole list order.
+    """
+    if 'profile_id' not in session:
+        return jsonify({'error': 'No profile selected'}), 403
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        ops = {op: [mylist.parse_title_key(key) for key in body.get(op) or []]
+               for op in ('add', 'remove', 'order')}
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if sum(len(titles) for titles in ops.values()) > MAX_BATCH_TITLES:
+        return jsonify({'error': f'At most {MAX_BATCH_TITLES} titles per batch'}), 400
+
+    profile_id = session['profile_id']
+    conn = get_db_connection()
+    added = mylist.add_titles(conn, profile_id, ops['add'])
+    removed = mylist.remove_titles(conn, profile_id, ops['remove'])
+    reordered = mylist.reorder(conn, profile_id, ops['order']) if ops['order'] else 0
+    queued = enrichment.enqueue(conn, added)
+    saved = mylist.saved_titles(conn, profile_id)
+    conn.commit()
+    conn.close()
+
+    if queued:
+        enrichment_worker.wake()
+    return jsonify({'added': len(added), 'removed': removed, 'reordered': reordered, 'saved': sorted(saved)})
+
+
+@app.route('/api/my-list/ids')
+@login_required
+def my_list_ids():
+    # Every "media_type:tmdb_id" on the active profile's list
+    return jsonify({'saved': sorted(get_saved_titles())})
+
+
+def get_saved_titles():
+    # Once per request: cards ask in_my_list() one by one
+    if 'saved_titles' not in g:
+        profile_id = session.get('profile_id')
+        if profile_id is None:
+            g.saved_titles = set()
+        else:
+            conn = get_db_connection(readonly=True)
+            g.saved_titles = mylist.saved_titles(conn, profile_id)
+            conn.close()
+    return g.saved_titles
+
+
+@app.template_global()
+def in_my_list(movie):
+    if not current_user.is_authenticated:
+        return False
+    return mylist.title_key(movie['media_type'], movie['tmdb_id']) in get_saved_titles()
+
+
 @app.route('/my-list')
 @login_required
 def my_list():
@@ -327,37 +506,222 @@ def my_list():
         return redirect(url_for('browse_profiles'))
 
     profile_id = session['profile_id']
-    conn = get_db_connection()
-
-    saved_items = conn.execute("""
-        SELECT movies.* FROM mylist 
-        JOIN movies ON mylist.tmdb_id = movies.tmdb_id 
-        AND mylist.media_type = movies.media_type
-        WHERE mylist.profile_id = ?
-        GROUP BY movies.tmdb_id, movies.media_type
-    """, (profile_id,)).fetchall()
-    
+    conn = get_db_connection(readonly=True)
+    saved_items = mylist.list_titles(conn, profile_id)
     conn.close()
+
+    if any(item['pending'] for item in saved_items):
+        # Also picks up jobs left over from before a restart
+        enrichment_worker.wake()
     return render_template('my_list.html', saved_items=saved_items)
 
-# Memorizes the heavy database scanning for 1 hour
-@cache.cached(timeout=3600, key_prefix='homepage_categories')
-def get_homepage_categories():
-    conn = get_db_connection()
-    categories = {
-        'popular': conn.execute("SELECT * FROM movies WHERE genre LIKE '%popular%' LIMIT 20").fetchall(),
-        'trending': conn.execute("SELECT * FROM movies WHERE genre LIKE '%trending%' LIMIT 20").fetchall(),
-        'new_releases': conn.execute("SELECT * FROM movies WHERE genre LIKE '%new_releases%' LIMIT 20").fetchall(),
-        'anime': conn.execute("SELECT * FROM movies WHERE genre LIKE '%anime%' LIMIT 20").fetchall(),
-        'us_tv': conn.execute("SELECT * FROM movies WHERE genre LIKE '%us_tv_drama%' LIMIT 20").fetchall(),
-        'bollywood': conn.execute("SELECT * FROM movies WHERE genre LIKE '%bollywood%' LIMIT 20").fetchall(),
-        'scifi': conn.execute("SELECT * FROM movies WHERE genre LIKE '%scifi_horror%' LIMIT 20").fetchall(),
-        'kdrama': conn.execute("SELECT * FROM movies WHERE genre LIKE '%kdrama%' LIMIT 20").fetchall(),
-        'action': conn.execute("SELECT * FROM movies WHERE genre LIKE '%action%' LIMIT 20").fetchall()
-    }
+@app.template_global()
+def row_cursor(rows):
+    return catalog.row_cursor(rows) or ''
+
+# Every browse row for /, /movies, /tvshows and /new-popular, built in one query.
+# Keyed on the catalog version, so a re-seed or refresh is picked up within a second.
+def get_browse_rows():
+    key = f'browse_rows:{get_catalog_version()}'
+    rows = cache.get(key)
+    if rows is None:
+        metrics.cache_requests.inc('browse_rows', 'miss')
+        conn = get_db_connection(readonly=True)
+        rows = catalog.materialize_rows(conn)
+        conn.close()
+        cache.set(key, rows, timeout=3600)
+    else:
+        metrics.cache_requests.inc('browse_rows', 'hit')
+    return rows
+
+# --- HOMEPAGE ROWS ---
+# Homepage rows, top to bottom: name -> (browse row, heading, card label, cards shown).
+# Each is rendered once per catalog version into an HTML fragment that every user shares;
+# the first HOME_ROWS_INLINE go out with the page, the rest load from /rows/<name> on scroll.
+HOME_ROWS = {
+    'popular': ('popular', 'Popular on Netflix', 'Netflix', None),
+    'trending': ('trending', 'Trending Now', 'Netflix', None),
+    'new_releases': ('new_releases', 'New Releases', 'Netflix', None),
+    'anime': ('anime', 'Anime', 'Anime', None),
+    'bollywood': ('bollywood', 'Bollywood Movies', 'Bollywood', None),
+    'scifi_horror': ('scifi_horror', 'TV Sci-Fi & Horror', 'Sci-Fi', None),
+    'kdrama': ('kdrama', 'K-Dramas', 'K-Dramas', None),
+    'action': ('action', 'Action Movies', 'Action', None),
+}
+HOME_ROWS_INLINE = 2
+
+# In front of the shared cache, so a hot fragment isn't read back and unpickled per request.
+# A plain LRU, emptied when the catalog version moves: the old version's rows are never
+# asked for again, and frequency admission would keep them over the new ones.
+row_fragments = caching.LRUCache(max_entries=64, max_bytes=8 * 1024 * 1024, admission=False)
+row_fragments_version = None
+
+
+def get_row_fragment(name):
+    """
+    (html, title keys) for one homepage row. The html is the same for every
+    user; personalize_row() marks the titles on a user's list.
+    """
+    global row_fragments_version
+    version = get_catalog_version()
+    if version != row_fragments_version:
+        row_fragments.clear()
+        row_fragments_version = version
+    key = f'row_html:{version}:{name}'
+    fragment = row_fragments.get(key)
+    if fragment is not None:
+        metrics.cache_requests.inc('row_fragments', 'hit')
+    else:
+        fragment = cache.get(key)
+        metrics.cache_requests.inc('row_fragments', 'miss' if fragment is None else 'shared_hit')
+        if fragment is None:
+            browse_row, heading, label, limit = HOME_ROWS[name]
+            movies = get_browse_rows()[browse_row][:limit]
+            html = app.jinja_env.get_template('row.html').render(
+                heading=heading, row_id=catalog.BROWSE_ROWS[browse_row][0], label=label, movies=movies)
+            fragment = (html, frozenset(mylist.title_key(m['media_type'], m['tmdb_id']) for m in movies))
+            cache.set(key, fragment, timeout=3600)
+        row_fragments.put(key, fragment, size=len(fragment[0]))
+    return fragment
+
+
+def personalize_row(fragment, saved):
+    html, keys = fragment
+    for key in keys & saved:
+        html = html.replace(f'fa-plus" data-title="{key}"', f'fa-check" data-title="{key}"')
+    return Markup(html)
+
+
+# --- FEATURED HERO ---
+# Each page's hero takes turns of HERO_MINUTES through a pool of well rated titles with a
+# logo (catalog.hero_pool), in a fixed order, so a refresh shows the same hero and its
+# backdrop comes from the browser cache. NETFLIX_HERO_SLOTS > 1 splits profiles (by a hash
+# of their id) into that many groups, each with its own order.
+HERO_MINUTES = float(os.environ.get('NETFLIX_HERO_MINUTES', 60))
+HERO_SLOTS = int(os.environ.get('NETFLIX_HERO_SLOTS', 1))
+
+# page -> (template, browse rows the pool comes from)
+HERO_PAGES = {
+    'index': ('hero.html', ('popular',)),
+    'movies': ('category_hero.html', ('trending', 'popular')),
+    'tv_shows': ('category_hero.html', ('us_tv_drama', 'kdrama')),
+}
+
+NO_HERO = {
+    'title': 'No Movies Found',
+    'overview': 'Please run python seed.py to load movies.',
+    'backdrop_path': 'https://wallpapers.com/images/hd/netflix-background-gs7hjuwvv2g0e9fj.jpg',
+    'tmdb_id': 0,
+    'media_type': 'movie',
+    'age_rating': 'N/A'
+}
+
+# Keyed on the slot, with the version and turn kept in the value: a new turn replaces the
+# old fragment instead of queueing behind it for admission
+hero_rotations = caching.LRUCache(max_entries=64, admission=False)
+hero_fragments = caching.LRUCache(max_entries=256, max_bytes=4 * 1024 * 1024, admission=False)
+
+
+def get_hero(page):
+    """
+    (html, featured title, next turn's title) for a page's hero. The html is
+    rendered once per turn and catalog version and shared by the whole slot.
+    """
+    turn = int(time.time() // (HERO_MINUTES * 60))
+    slot = zlib.crc32(str(session['profile_id']).encode()) % HERO_SLOTS if HERO_SLOTS > 1 else 0
+    version = get_catalog_version()
+    key = (page, slot)
+    cached = hero_fragments.get(key)
+    if cached is not None and cached[:2] == (version, turn):
+        metrics.cache_requests.inc('hero', 'hit')
+        return cached[2]
+
+    metrics.cache_requests.inc('hero', 'miss')
+    template, rows = HERO_PAGES[page]
+    cached = hero_rotations.get(key)
+    if cached is not None and cached[0] == version:
+        rotation = cached[1]
+    else:
+        browse_rows = get_browse_rows()
+        rotation = catalog.hero_rotation(catalog.hero_pool([browse_rows[name] for name in rows]), slot)
+        hero_rotations.put(key, (version, rotation))
+    featured = catalog.pick_hero(rotation, turn) or (NO_HERO if page == 'index' else None)
+    upcoming = catalog.pick_hero(rotation, turn + 1)
+    html = app.jinja_env.get_template(template).render(featured_movie=featured)
+    hero = (html, featured, upcoming if upcoming is not featured else None)
+    hero_fragments.put(key, (version, turn, hero), size=len(html))
+    return hero
+
+
+# --- CONTINUE WATCHING ---
+# Per profile and changing every few seconds while someone watches, so not cached: it's one
+# indexed read. Shown after this row, above "Because you saved".
+CONTINUE_WATCHING_AFTER = 'popular'
+
+
+def get_continue_watching_row(profile_id):
+    # Pings still in the buffer are merged in from memory, so a trailer closed a moment ago is
+    # already on the row without the page waiting on a write
+    conn = get_db_connection(readonly=True)
+    movies = watch.continue_watching(conn, profile_id, pending=progress_buffer.pending_for(profile_id))
     conn.close()
-    
-    return {k: [dict(row) for row in v] for k, v in categories.items()}
+    if not movies:
+        return None
+    return Markup(app.jinja_env.get_template('row.html').render(
+        heading='Continue Watching', row_id=None, label='Netflix', movies=movies))
+
+
+@app.route('/progress/<media_type>/<int:tmdb_id>', methods=['POST'])
+@login_required
+def progress(media_type, tmdb_id):
+    # {"position": seconds, "duration": seconds} from the trailer player, every few seconds
+    if 'profile_id' not in session:
+        return jsonify({'error': 'No profile selected'}), 403
+
+    media_type = media_type.lower()
+    if media_type not in mylist.MEDIA_TYPES:
+        return jsonify({'error': 'Unknown media type'}), 400
+    try:
+        position, duration = watch.parse_progress(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    progress_buffer.record(session['profile_id'], media_type, tmdb_id, position, duration)
+    return '', 204
+
+
+# --- RECOMMENDATIONS ---
+# "Because you saved ..." (see recommend.py), rendered per profile. The key holds the catalog
+# version, which the batch job bumps, and the profile's saved titles, so saving or removing
+# a title shows on the next page load with nothing to invalidate.
+RECOMMENDATIONS_AFTER = 'popular'
+recommendation_rows = caching.LRUCache(max_entries=4096, max_bytes=16 * 1024 * 1024)
+
+
+def get_recommendation_row(profile_id, saved):
+    key = (profile_id, get_catalog_version(), frozenset(saved))
+    html = recommendation_rows.get(key)
+    if html is None:
+        conn = get_db_connection(readonly=True)
+        anchor, movies = recommend.recommend(conn, profile_id, saved)
+        conn.close()
+        html = ''
+        if movies:
+            html = app.jinja_env.get_template('row.html').render(
+                heading=f'Because you saved {anchor}', row_id=None, label='For You', movies=movies)
+        recommendation_rows.put(key, html, size=len(html))
+    return Markup(html) if html else None
+
+
+@app.route('/rows/<name>')
+@login_required
+@http_cache.cached(max_age=300, private=True)
+def row_fragment(name):
+    # The shared fragment as is: script.js marks the user's My List titles once it's in the page
+    if name not in HOME_ROWS:
+        return jsonify({'error': 'Unknown row'}), 404
+    return get_row_fragment(name)[0]
+
 
 @app.route('/')
 def index():
@@ -367,55 +731,48 @@ def index():
     if 'profile_id' not in session:
         return redirect(url_for('browse_profiles'))
     
-    cats = get_homepage_categories()
-
-    if cats['popular']:
-        featured = random.choice(cats['popular'])
-    else:
-        featured = {
-            'title': 'No Movies Found',
-            'overview': 'Please run python seed.py to load movies.',
-            'backdrop_path': 'https://wallpapers.com/images/hd/netflix-background-gs7hjuwvv2g0e9fj.jpg',
-            'tmdb_id': 0,
-            'media_type': 'movie',
-            'age_rating': 'N/A'
-        }
-    
-    return render_template('index.html', 
-                           featured_movie=featured,
-                           popular_movies=cats['popular'],
-                           trending_movies=cats['trending'],
-                           new_releases=cats['new_releases'],
-                           anime_movies=cats['anime'],
-                           us_tv_movies=cats['us_tv'],
-                           bollywood_movies=cats['bollywood'],
-                           scifi_movies=cats['scifi'],
-                           kdrama_movies=cats['kdrama'],
-                           action_movies=cats['action'])
+    saved = get_saved_titles()
+    profile_id = session['profile_id']
+    html, featured, upcoming = get_hero('index')
+    hero = personalize_row((html, frozenset([mylist.title_key(featured['media_type'], featured['tmdb_id'])])), saved)
+
+    def home_rows():
+        # A generator, so each row is looked up only once the page before it has gone out
+        for position, name in enumerate(HOME_ROWS):
+            if position < HOME_ROWS_INLINE:
+                yield name, personalize_row(get_row_fragment(name), saved)
+            else:
+                yield name, None
+            if name == CONTINUE_WATCHING_AFTER:
+                row = get_continue_watching_row(profile_id)
+                if row:
+                    yield 'continue_watching', row
+            if name == RECOMMENDATIONS_AFTER:
+                row = get_recommendation_row(profile_id, saved)
+                if row:
+                    yield 'because_you_saved', row
+
+    # Streamed: the layout and hero reach the browser before the rows are put together
+    return httpcache.streamed(stream_template('index.html', featured_movie=featured, next_featured=upcoming,
+                                              hero=hero, home_rows=home_rows()))
 
 @app.route('/tvshows')
 @login_required
 def tv_shows():
     if 'profile_id' not in session: return redirect(url_for('browse_profiles'))
     
-    conn = get_db_connection()
-
-    us_tv = conn.execute("SELECT * FROM movies WHERE genre LIKE '%us_tv_drama%' LIMIT 20").fetchall()
-    kdrama = conn.execute("SELECT * FROM movies WHERE genre LIKE '%kdrama%' LIMIT 20").fetchall()
-    anime = conn.execute("SELECT * FROM movies WHERE genre LIKE '%anime%' LIMIT 20").fetchall()
-    scifi = conn.execute("SELECT * FROM movies WHERE genre LIKE '%scifi_horror%' LIMIT 20").fetchall()
-    
-    if us_tv:
-        featured = random.choice(us_tv)
-    elif kdrama:
-        featured = random.choice(kdrama)
-    else:
-        featured = None
+    rows = get_browse_rows()
 
-    conn.close()
+    us_tv = rows['us_tv_drama']
+    kdrama = rows['kdrama']
+    anime = rows['anime']
+    scifi = rows['scifi_horror']
+    html, featured, upcoming = get_hero('tv_shows')
 
     return render_template('tv_shows.html', 
                            featured_movie=featured,
+                           next_featured=upcoming,
+                           hero=Markup(html),
                            us_tv_shows=us_tv,
                            kdramas=kdrama,
                            anime_shows=anime,
@@ -426,25 +783,19 @@ def tv_shows():
 def movies():
     if 'profile_id' not in session: return redirect(url_for('browse_profiles'))
 
-    conn = get_db_connection()
-
-    popular = conn.execute("SELECT * FROM movies WHERE genre LIKE '%popular%' LIMIT 20").fetchall()
-    action = conn.execute("SELECT * FROM movies WHERE genre LIKE '%action%' LIMIT 20").fetchall()
-    bollywood = conn.execute("SELECT * FROM movies WHERE genre lIKE '%bollywood%' LIMIT 20").fetchall()
-    new_releases = conn.execute("SELECT * FROM movies WHERE genre LIKE '%new_releases%' LIMIT 20").fetchall()
-    trending = conn.execute("SELECT * FROM movies WHERE genre LIKE '%trending%' LIMIT 20").fetchall()
-
-    if trending:
-        featured = random.choice(trending)
-    elif popular:
-        featured = random.choice(popular)
-    else:
-        featured = None
+    rows = get_browse_rows()
 
-    conn.close()
+    popular = rows['popular']
+    action = rows['action']
+    bollywood = rows['bollywood']
+    new_releases = rows['new_releases']
+    trending = rows['trending']
+    html, featured, upcoming = get_hero('movies')
 
     return render_template('movies.html', 
                            featured_movie=featured,
+                           next_featured=upcoming,
+                           hero=Markup(html),
                            popular_movies=popular,
                            action_movies=action,
                            bollywood_movies=bollywood,
@@ -453,31 +804,48 @@ def movies():
 
 @app.route('/get_trailer/<media_type>/<int:tmdb_id>')
 def get_trailer(media_type, tmdb_id):
+    # seed.py already resolved the trailer for catalog titles
+    conn = get_db_connection(readonly=True)
+    details = catalog.get_details(conn, tmdb_id, media_type)
+    conn.close()
+    if details is not None:
+        if details['trailer_key']:
+            return jsonify({'key': details['trailer_key']})
+        return jsonify({'error': 'No trailer found'}), 404
+
     def fetch_videos_from_tmdb(m_type, m_id):
-        url = f"https://api.themoviedb.org/3/{m_type}/{m_id}/videos?api_key={TMDB_API_KEY}&language=en-US"
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('results', [])
-            return []
-        except:
+        response = tmdb_client.get(f"/{m_type}/{m_id}/videos", language="en-US")
+        if response.status_code == 404:
             return []
+        # Anything else that isn't a 200 raises, so an outage never gets cached as "no trailer"
+        response.raise_for_status()
+        return response.json().get('results', [])
 
-    results = fetch_videos_from_tmdb(media_type, tmdb_id)
-
-    if not results:
+    def fetch_trailer():
+        # Ask for the other media type at the same time instead of after an empty answer
         fallback_type = 'tv' if media_type == 'movie' else 'movie'
-        results = fetch_videos_from_tmdb(fallback_type, tmdb_id)
+        fallback = lookup_pool.submit(fetch_videos_from_tmdb, fallback_type, tmdb_id)
+        try:
+            results = fetch_videos_from_tmdb(media_type, tmdb_id)
+        except Exception:
+            fallback.cancel()
+            raise
 
-    if results:
-        for video in results:
-            if video['site'] == 'YouTube' and video['type'] == 'Trailer':
-                return jsonify({'key': video['key']})
-        
-        if results[0]['site'] == 'YouTube':
-             return jsonify({'key': results[0]['key']})
+        if not results:
+            results = fallback.result()
+
+        key = tmdb.pick_trailer(results)
+        if key:
+            return 200, {'key': key}
+        return 404, None
 
+    try:
+        status, body = tmdb_cache.get(f'trailer:{media_type}:{tmdb_id}', fetch_trailer)
+    except Exception:
+        status = 404
+
+    if status == 200:
+        return jsonify(body)
     return jsonify({'error': 'No trailer found'}), 404
 
 @app.route('/new-popular')
@@ -485,21 +853,18 @@ def get_trailer(media_type, tmdb_id):
 def new_popular():
     if 'profile_id' not in session: return redirect(url_for('browse_profiles'))
     
-    conn = get_db_connection()
+    rows = get_browse_rows()
 
-    # Use LIKE '%...%' to find genres in your multi-tag database
-    new_releases = conn.execute("SELECT * FROM movies WHERE genre LIKE '%new_releases%' LIMIT 20").fetchall()
+    new_releases = rows['new_releases']
     
     # Filter by media_type to ensure accuracy in the Top 10 sections
-    trending_movies = conn.execute("SELECT * FROM movies WHERE media_type='movie' AND genre LIKE '%trending%'").fetchall()
+    trending_movies = rows['top10_movies']
     
     # We use us_tv_drama as your source for the Top 10 TV row
-    top_tv = conn.execute("SELECT * FROM movies WHERE media_type='tv' AND genre LIKE '%us_tv_drama%'").fetchall()
+    top_tv = rows['top10_tv']
     
-    coming_soon = conn.execute("SELECT * FROM movies WHERE genre LIKE '%popular%' LIMIT 20").fetchall()
-    worth_wait = conn.execute("SELECT * FROM movies WHERE genre LIKE '%action%' LIMIT 20").fetchall()
-
-    conn.close()
+    coming_soon = rows['popular']
+    worth_wait = rows['action']
 
     return render_template('new_popular.html', 
                            new_releases=new_releases,
@@ -509,84 +874,274 @@ def new_popular():
                            worth_wait=worth_wait)
 
 @app.route('/get_info/<media_type>/<int:tmdb_id>')
+@http_cache.cached(max_age=3600)
 def get_info(media_type, tmdb_id):
-    url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}?api_key={TMDB_API_KEY}&language=en-US&append_to_response=credits,images&include_image_language=en,null"
-    
+    conn = get_db_connection(readonly=True)
+    details = catalog.get_details(conn, tmdb_id, media_type)
+    conn.close()
+    if details is not None:
+        return jsonify(catalog.details_json(details))
+
+    def fetch_info():
+        response = tmdb_client.get(f"/{media_type}/{tmdb_id}", language="en-US",
+                                   append_to_response="credits,images", include_image_language="en,null")
+        if response.status_code == 404:
+            return 404, None
+        response.raise_for_status()
+        return 200, response.json()
+
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            return jsonify(response.json())
+        status, body = tmdb_cache.get(f'info:{media_type}:{tmdb_id}', fetch_info)
+        if status == 200:
+            # Not from the catalog, so the catalog version says nothing about when it changes
+            response = jsonify(body)
+            response.cache_control.public = True
+            response.cache_control.max_age = 3600
+            return response
         return jsonify({'error': 'Not found'}), 404
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    except Exception:
+        # TMDB is unhealthy and nothing is cached: fall back to what the catalog row knows
+        conn = get_db_connection(readonly=True)
+        basic = catalog.basic_details_json(conn, tmdb_id, media_type)
+        conn.close()
+        if basic:
+            # Only part of the details: fine for now, but nothing should keep it
+            response = jsonify(basic)
+            response.cache_control.no_store = True
+            return response
+        # The exception text would include the request URL, api_key and all
+        return jsonify({'error': 'TMDB is unavailable'}), 503
+
+
+@app.route('/img/<size>/<file_name>')
+@login_required
+def image(size, file_name):
+    # Logged in only: each new (size, file) costs a TMDB download, a re-encode and disk space
+    if not images.valid_request(size, file_name):
+        return jsonify({'error': 'Not found'}), 404
+    if file_name.endswith('.svg'):
+        return redirect(images.upstream_url(size, file_name))
+
+    try:
+        name = image_cache.get(size, file_name)
+    except images.ImageUnavailable:
+        # Let the browser try TMDB itself rather than show a broken image
+        return redirect(images.upstream_url(size, file_name))
+
+    response = send_file(image_cache.object_path(name), mimetype=images.content_type(name),
+                         max_age=images.MAX_AGE, etag=name.split('.')[0])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route('/api/movies/<genre>')
 @login_required
+@http_cache.cached(max_age=300, private=True)
 def api_movies(genre):
-    # Get the requested page from the URL (e.g., ?page=2). Default is 1.
-    page = int(request.args.get('page', 1))
     per_page = 20
+    conn = get_db_connection(readonly=True)
+
+    # Cursor mode (?after=<token>): seek straight past the last title the client has
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            row_position = catalog.decode_cursor(after, genre) if after else None
+        except ValueError as e:
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+
+        movies = catalog.fetch_row(conn, genre, limit=per_page, after=row_position)
+        conn.close()
+
+        next_cursor = catalog.row_cursor(movies) if len(movies) == per_page else None
+        return jsonify({'movies': [movie_card_json(movie) for movie in movies],
+                        'next_cursor': next_cursor})
+
+    # Legacy mode (?page=2): kept for old clients, same order as cursor mode
+    page = int(request.args.get('page', 1))
     
     # Calculate how many movies to skip
     offset = (page - 1) * per_page
-
-    conn = get_db_connection()
     
-    # Fetch the exact chunk of movies needed using LIKE and OFFSET
-    query = "SELECT * FROM movies WHERE genre LIKE ? LIMIT ? OFFSET ?"
-    movies = conn.execute(query, (f"%{genre}%", per_page, offset)).fetchall()
+    # Fetch the exact chunk of movies needed from the genre index
+    movies = catalog.fetch_row(conn, genre, limit=per_page, offset=offset)
     
     conn.close()
 
     # Send it back to the JavaScript as JSON data
-    movies_list = []
-    for movie in movies:
-        movies_list.append({
-            'tmdb_id': movie['tmdb_id'],
-            'title': movie['title'],
-            'poster_path': movie['poster_path'],
-            
-            # --- THESE 3 LINES FIX THE UNDEFINED ERROR ---
-            'backdrop_path': movie['backdrop_path'], 
-            'logo_path': movie['logo_path'],         
-            'age_rating': movie['age_rating'],       
-            
-            'media_type': movie['media_type']
-        })
+    return jsonify([movie_card_json(movie) for movie in movies])
 
-    return jsonify(movies_list)
+
+def movie_card_json(movie):
+    return {
+        'tmdb_id': movie['tmdb_id'],
+        'title': movie['title'],
+        'poster_path': movie['poster_path'],
+        
+        # --- THESE 3 LINES FIX THE UNDEFINED ERROR ---
+        'backdrop_path': movie['backdrop_path'], 
+        'logo_path': movie['logo_path'],         
+        'age_rating': movie['age_rating'],       
+        
+        'media_type': movie['media_type']
+    }
 
 
 @app.route('/search')
+@http_cache.cached(max_age=60)
 def search():
-    query = request.args.get('q', '').strip()
-    if not query:
+    words = catalog.search_words(request.args.get('q', ''))
+    if not words:
         return jsonify([])
 
-    conn = get_db_connection()
-    results = conn.execute("""
-        SELECT * FROM movies 
-        WHERE title LIKE ? 
-        ORDER BY vote_average DESC 
-        LIMIT 20
-    """, ('%' + query + '%',)).fetchall()
+    # Most keystrokes are answered from memory; see caching.SearchCache
+    search_cache.sync(get_catalog_version())
+    results = search_cache.get(words)
+    fuzzy = app.config['SEARCH_FUZZY']
+
+    if results is None or (not results and fuzzy):
+        conn = get_db_connection(readonly=True)
+        results = catalog.prefix_search(conn, words)
+        if results or not fuzzy:
+            search_cache.put(words, results)
+        else:
+            results = catalog.trigram_search(conn, words)
+            search_cache.put(words, results, complete=False)
+        conn.close()
+
+    return jsonify([movie_card_json(movie) for movie in results])
+
+
+@app.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    return jsonify({'search': search_cache.stats(), 'tmdb': tmdb_cache.stats(), 'http': http_cache.stats()})
+
+
+@app.route('/api/auth-stats')
+@login_required
+def auth_stats():
+    return jsonify({'hasher': password_hasher.stats(),
+                    'rate_limited': {'ip': login_limits[0][1].limited, 'email': login_limits[1][1].limited}})
+
+
+@app.route('/api/tmdb-stats')
+@login_required
+def tmdb_stats():
+    # Breaker state plus call counts and latency percentiles per TMDB endpoint
+    return jsonify(tmdb_client.metrics())
+
+
+# --- METRICS ---
+# Numbers the caches and TMDB clients already keep, read on every scrape of /metrics
+
+@metrics.collector
+def cache_metrics():
+    caches = {'search': search_cache.stats(), 'tmdb': tmdb_cache.stats(), 'http': http_cache.stats(),
+              'row_fragments': row_fragments.stats(), 'user': user_cache.stats(),
+              'recommendations': recommendation_rows.stats()}
+    yield ('app_cache_hits', 'counter', 'Hits per in-process cache (stale and filtered hits included).',
+           ('cache',), {(name,): stats['hits'] + stats.get('stale_hits', 0) + stats.get('filtered_hits', 0)
+                        for name, stats in caches.items()})
+    yield ('app_cache_misses', 'counter', 'Misses per in-process cache.',
+           ('cache',), {(name,): stats['misses'] for name, stats in caches.items()})
+    yield ('app_cache_entries', 'gauge', 'Entries held per in-process cache.',
+           ('cache',), {(name,): stats['entries'] for name, stats in caches.items()})
+    yield ('http_not_modified', 'counter', '304s answered from the catalog ETag before the view ran.',
+           (), {(): http_cache.not_modified})
+
+    images_stats = image_cache.stats()
+    yield ('image_cache_objects', 'gauge', 'Images stored on disk.', (), {(): images_stats['objects']})
+    yield ('image_cache_bytes', 'gauge', 'Bytes of images stored on disk.', (), {(): images_stats['bytes']})
+    yield ('image_cache_fetches', 'counter', 'Images fetched from TMDB.', (), {(): images_stats['fetches']})
+    yield ('image_cache_failures', 'counter', 'Image fetches that failed.', (), {(): images_stats['failures']})
+
+
+@metrics.collector
+def progress_metrics():
+    stats = progress_buffer.stats()
+    yield ('watch_progress_pings', 'counter', 'Progress pings received.', (), {(): stats['pings']})
+    yield ('watch_progress_pending', 'gauge', 'Titles with a ping waiting for the next flush.',
+           (), {(): stats['pending']})
+    yield ('watch_progress_flushes', 'counter', 'Transactions the progress buffer has written.',
+           (), {(): stats['flushes']})
+    yield ('watch_progress_written', 'counter', 'Rows those transactions upserted.', (), {(): stats['written']})
+    yield ('watch_progress_flush_errors', 'counter', 'Flushes that failed and were retried.',
+           (), {(): stats['errors']})
+
+
+@metrics.collector
+def tmdb_metrics():
+    clients = {'app': tmdb_client.metrics(), 'enrichment': enrichment_worker.client.metrics()}
+    endpoints = {(client, endpoint): summary for client, data in clients.items()
+                 for endpoint, summary in data['endpoints'].items()}
+    for field, help in (('calls', 'TMDB requests made.'), ('errors', 'TMDB requests that failed after retries.'),
+                        ('retries', 'TMDB retries.'), ('rejected', 'TMDB requests refused by the open breaker.')):
+        yield (f'tmdb_{field}', 'counter', help, ('client', 'endpoint'),
+               {key: summary[field] for key, summary in endpoints.items()})
+    for quantile in ('p50', 'p95', 'p99'):
+        yield (f'tmdb_latency_{quantile}_ms', 'gauge', f'{quantile} latency over the last 512 calls.',
+               ('client', 'endpoint'), {key: summary[f'{quantile}_ms'] for key, summary in endpoints.items()})
+    yield ('tmdb_breaker_open', 'gauge', '1 while the circuit breaker is open (or half open).',
+           ('client',), {(client,): int(data['breaker'] != 'closed') for client, data in clients.items()})
+
+
+def metrics_allowed():
+    """
+    With METRICS_TOKEN set, "Authorization: Bearer <token>". Without one, nobody,
+    unless METRICS_ALLOW_LOCAL=1 lets localhost in: behind a reverse proxy on the
+    same host every request comes from 127.0.0.1, so that has to be a choice.
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return os.environ.get('METRICS_ALLOW_LOCAL') == '1' and request.remote_addr in ('127.0.0.1', '::1')
+
+
+def operator_only(view):
+    # /metrics and the diagnostics beside it: statements, query plans and stacks aren't for every user
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not metrics_allowed():
+            return 'Forbidden\n', 403, {'Content-Type': 'text/plain'}
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/metrics')
+@operator_only
+def metrics_endpoint():
+    # Prometheus scrapes this
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                                   'Cache-Control': 'no-store'}
+
+
+@app.route('/api/slow-queries')
+@operator_only
+def slow_queries():
+    # Statements over NETFLIX_SLOW_QUERY_MS, slowest first, with the plan SQLite picks for them
+    conn = get_db_connection(readonly=True)
+    report = metrics.explain_slow_queries(conn)
     conn.close()
+    return jsonify(report)
+
 
-    movies_list = []
-    for movie in results:
-        movies_list.append({
-            'tmdb_id': movie['tmdb_id'],
-            'title': movie['title'],
-            'poster_path': movie['poster_path'],
-            'backdrop_path': movie['backdrop_path'], # NEW
-            'logo_path': movie['logo_path'],         # NEW
-            'age_rating': movie['age_rating'],       # NEW
-            'media_type': movie['media_type']
-        })
+@app.route('/api/profile')
+@operator_only
+def profile_stacks():
+    # Collapsed stacks from the sampling profiler (NETFLIX_PROFILE_INTERVAL_MS), ready for flamegraph.pl
+    if not metrics.profiler.thread:
+        return jsonify({'error': 'Profiler is off; set NETFLIX_PROFILE_INTERVAL_MS'}), 404
+    return metrics.profiler.stacks(), 200, {'Content-Type': 'text/plain'}
 
-    return jsonify(movies_list)
 
+# Stopping the dev server with SIGTERM should still write the buffered progress (see
+# watch.exit_on_sigterm). `flask run` imports this module instead of running it; under a
+# WSGI/ASGI server the server owns the signal handlers.
+if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    watch.exit_on_sigterm()
 
 if __name__ == '__main__':
+    watch.exit_on_sigterm()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""
+ASGI entry point: the same site as app.py, but /get_trailer and /get_info
+run as async handlers on one shared aiohttp session. Under plain Flask each of
+those holds a worker thread for a whole TMDB round trip, so a worker with
+8 threads and 200 ms TMDB latency tops out at 40 lookups a second; here a
+lookup waiting on TMDB costs a coroutine. Catalog reads go to a thread, and
+responses get the same ETags, Cache-Control, compression and metrics as the
+Flask versions. Every other route is the Flask app, run on asgiref's thread
+pool as usual.
+
+    pip install -r requirements.txt
+    uvicorn asgi:application --workers 2
+"""
+import asyncio
+import hashlib
+import re
+import time
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+import catalog
+import db
+import httpcache
+import metrics
+import tmdb
+from app import app as flask_app, http_cache, tmdb_cache
+
+# Same retry budget as app.tmdb_client: a user is waiting on these
+tmdb_async = tmdb.AsyncTMDBClient(retries=2, max_backoff=2)
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+def read_catalog(query, *args):
+    # Runs on a worker thread (asyncio.to_thread) with a pooled read-only connection,
+    # so a slow SQLite read never blocks the event loop
+    conn = db.pools[True].acquire()
+    try:
+        return query(conn, *args)
+    finally:
+        db.pools[True].release(conn)
+
+
+# --- PROXY ROUTES (mirror get_trailer / get_info in app.py) ---
+
+async def fetch_videos(media_type, tmdb_id):
+    response = await tmdb_async.get(f"/{media_type}/{tmdb_id}/videos", language="en-US")
+    if response.status_code == 404:
+        return []
+    # Anything else that isn't a 200 raises, so an outage never gets cached as "no trailer"
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+
+async def get_trailer(media_type, tmdb_id):
+    details = await asyncio.to_thread(read_catalog, catalog.get_details, tmdb_id, media_type)
+    if details is not None:
+        if details['trailer_key']:
+            return 200, {'key': details['trailer_key']}, None
+        return 404, {'error': 'No trailer found'}, None
+
+    async def fetch_trailer():
+        # Both media types at once; the fallback only counts if the first comes back empty
+        fallback_type = 'tv' if media_type == 'movie' else 'movie'
+        results, fallback = await asyncio.gather(fetch_videos(media_type, tmdb_id),
+                                                 fetch_videos(fallback_type, tmdb_id),
+                                                 return_exceptions=True)
+        if isinstance(results, Exception):
+            raise results
+        if not results:
+            if isinstance(fallback, Exception):
+                raise fallback
+            results = fallback
+
+        key = tmdb.pick_trailer(results)
+        if key:
+            return 200, {'key': key}
+        return 404, None
+
+    try:
+        status, body = await tmdb_cache.aget(f'trailer:{media_type}:{tmdb_id}', fetch_trailer)
+    except Exception:
+        status = 404
+
+    if status == 200:
+        return 200, body, None
+    return 404, {'error': 'No trailer found'}, None
+
+
+async def get_info(media_type, tmdb_id):
+    details = await asyncio.to_thread(read_catalog, catalog.get_details, tmdb_id, media_type)
+    if details is not None:
+        return 200, catalog.details_json(details), None
+
+    async def fetch_info():
+        response = await tmdb_async.get(f"/{media_type}/{tmdb_id}", language="en-US",
+                                        append_to_response="credits,images", include_image_language="en,null")
+        if response.status_code == 404:
+            return 404, None
+        response.raise_for_status()
+        return 200, response.json()
+
+    try:
+        status, body = await tmdb_cache.aget(f'info:{media_type}:{tmdb_id}', fetch_info)
+        if status == 200:
+            # Not from the catalog, so the catalog version says nothing about when it changes
+            return 200, body, 'public, max-age=3600'
+        return 404, {'error': 'Not found'}, None
+    except Exception:
+        # TMDB is unhealthy and nothing is cached: fall back to what the catalog row knows
+        basic = await asyncio.to_thread(read_catalog, catalog.basic_details_json, tmdb_id, media_type)
+        if basic:
+            # Only part of the details: fine for now, but nothing should keep it
+            return 200, basic, 'no-store'
+        return 503, {'error': 'TMDB is unavailable'}, None
+
+
+# path -> (endpoint name as in app.py, handler, max-age if app.py wraps it in http_cache.cached)
+ROUTES = [
+    (re.compile(r'/get_trailer/([^/]+)/(\d+)'), 'get_trailer', get_trailer, None),
+    (re.compile(r'/get_info/([^/]+)/(\d+)'), 'get_info', get_info, 3600),
+]
+
+
+def match_route(path):
+    for pattern, endpoint, handler, max_age in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            args = match.groups()
+            return (endpoint, handler, max_age), (args[0], int(args[1]))
+    return None, None
+
+
+# --- RESPONSES ---
+# The headers the Flask versions of these routes get: http_cache's catalog ETag, 304 and
+# pre-compressed bodies for get_info; revalidate_private's "private, no-cache" content ETag
+# for the rest; Flask-Compress for anything else big enough; and the /metrics counters.
+
+async def send_response(send, status, headers, payload=b''):
+    headers = dict(headers, **{'Content-Length': str(len(payload))})
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+def compressed(payload, encoding, headers):
+    if encoding and len(payload) >= httpcache.MIN_COMPRESS_SIZE:
+        headers['Content-Encoding'] = encoding
+        payload = httpcache.compress(payload, encoding)
+    headers['Vary'] = ', '.join(filter(None, (headers.get('Vary'), 'Accept-Encoding')))
+    return payload
+
+
+async def send_cached(send, entry, headers):
+    data, content_encoding, mimetype = entry
+    headers = dict(headers, **{'Content-Type': mimetype, 'Vary': 'Accept-Encoding'})
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    await send_response(send, 200, headers, data)
+
+
+async def respond(scope, send, route, args):
+    _, handler, max_age = route
+    request_headers = {name.decode().lower(): value.decode() for name, value in scope['headers']}
+    if_none_match = parse_etags(request_headers.get('if-none-match'))
+    encoding = parse_accept_header(request_headers.get('accept-encoding')).best_match(httpcache.encodings())
+
+    etag = None
+    if max_age is not None and http_cache.enabled:
+        query = parse_qsl(scope['query_string'].decode(), keep_blank_values=True)
+        etag = await asyncio.to_thread(http_cache.current_etag, scope['path'], query)
+        cached_headers = {'ETag': quote_etag(etag, weak=True), 'Cache-Control': f'public, max-age={max_age}'}
+        if if_none_match.contains_weak(etag):
+            http_cache.not_modified += 1
+            await send_response(send, 304, cached_headers)
+            return 304
+        entry = http_cache.cached_body(etag, encoding)
+        if entry is not None:
+            await send_cached(send, entry, cached_headers)
+            return 200
+
+    status, body, cache_control = await handler(*args)
+    payload = flask_app.json.response(body).get_data()  # jsonify's bytes, so both share http_cache bodies
+    headers = {'Content-Type': 'application/json'}
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    elif etag is not None and status == 200:
+        entry = http_cache.store(etag, encoding, payload, 'application/json')
+        await send_cached(send, entry, cached_headers)
+        return status
+    elif status == 200:
+        # Per user, like any Flask GET without its own Cache-Control
+        content_etag = hashlib.sha1(payload).hexdigest()[:20]
+        headers.update({'ETag': quote_etag(content_etag, weak=True), 'Cache-Control': 'private, no-cache',
+                        'Vary': 'Cookie'})
+        if if_none_match.contains_weak(content_etag):
+            await send_response(send, 304, headers)
+            return 304
+    payload = compressed(payload, encoding, headers)
+    await send_response(send, status, headers, payload)
+    return status
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            tmdb_async.open()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await tmdb_async.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        route, args = match_route(scope['path'])
+        if route is not None:
+            started = time.perf_counter()
+            status = await respond(scope, send, route, args)
+            if metrics.ENABLED:
+                metrics.http_seconds.observe(time.perf_counter() - started, route[0], 'GET')
+                metrics.http_requests.inc(route[0], 'GET', str(status))
+            return
+
+    return await flask_asgi(scope, receive, send)
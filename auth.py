@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# --- PASSWORD HASHING ---
+# scrypt is slow and memory hungry on purpose (about 32 MB and a few dozen ms
+# per hash at the defaults), so it runs on a small process pool instead of the
+# request thread. At most HASH_QUEUE_LIMIT hashes are queued or running at
+# once; past that, callers get HasherBusy (a 503) right away instead of piling
+# up behind a login flood while the browse pages starve.
+
+# Raising N costs CPU and memory per login; lowering it costs security.
+# Existing hashes are upgraded the next time their owner logs in.
+SCRYPT_N = int(os.environ.get('SCRYPT_N', 2 ** 15))
+SCRYPT_R = int(os.environ.get('SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('SCRYPT_P', 1))
+HASH_METHOD = f"scrypt:{SCRYPT_N}:{SCRYPT_R}:{SCRYPT_P}"
+
+# HASH_WORKERS=0 hashes on the request thread (handy for debugging)
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', min(4, os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.environ.get('HASH_QUEUE_LIMIT', 8 * max(1, HASH_WORKERS)))
+HASH_TIMEOUT = 10
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method=HASH_METHOD, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT,
+                 timeout=HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(queue_limit)
+        self.pool = None
+        self.pid = None
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def executor(self):
+        # Created on first use in each process, so a forking server never inherits one. Spawned,
+        # not forked: a forked worker would hold the server's listening socket open after it exits
+        if self.pool is None or self.pid != os.getpid():
+            with self.lock:
+                if self.pool is None or self.pid != os.getpid():
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+                    self.pid = os.getpid()
+        return self.pool
+
+    def restart(self, broken):
+        # A worker that dies (the OOM killer, say) breaks the whole pool: every later call would fail
+        with self.lock:
+            if self.pool is broken:
+                self.pool = None
+        broken.shutdown(wait=False)
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        pool = self.executor()
+        try:
+            return self.attempt(pool, fn, *args)
+        except BrokenProcessPool:
+            self.restart(pool)
+            return self.attempt(self.executor(), fn, *args)
+
+    def attempt(self, pool, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        # The slot is held until the hash really finishes, even if we stop waiting for it
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.rejected += 1
+            raise HasherBusy("Password hashing timed out") from None
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self.run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # "scrypt:32768:8:1$salt$hash": anything hashed with other settings gets upgraded
+        return pwhash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'in_flight': self.queue_limit - self.slots._value,
+            'rejected': self.rejected,
+        }
+
+
+# --- RATE LIMITING ---
+
+class RateLimiter:
+    """
+    A token bucket per key (an IP, an email address): `rate` attempts per
+    second on average, bursts of up to `burst`. Only the `max_keys` most
+    recently seen keys are kept; a forgotten key simply starts with a full
+    bucket again.
+    """
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.limited = 0
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Takes a token for `key`. Returns 0 if the attempt may go ahead,
+        otherwise how many seconds until it could.
+        """
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
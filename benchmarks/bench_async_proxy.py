@@ -0,0 +1,164 @@
+"""
+/get_trailer throughput: thread-capped Flask (WSGI) vs the ASGI entry point.
+
+Both servers talk to benchmarks/stub_tmdb.py with injected latency and get
+a stream of trailer lookups for titles that aren't in the catalog or the
+response cache, so every request goes to the stub (twice: movie and tv at
+once). The WSGI server handles requests on a fixed pool of threads, like a
+gunicorn gthread worker; the ASGI one is uvicorn running asgi.application.
+
+    pip install uvicorn aiohttp asgiref
+    python benchmarks/bench_async_proxy.py --latency-ms 200 --threads 8 --clients 64
+"""
+import argparse
+import itertools
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_tmdb
+
+
+def serve_wsgi(port, threads):
+    sys.path.insert(0, ROOT)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    from werkzeug.serving import BaseWSGIServer
+    from app import app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        # At most `threads` requests in progress; the rest wait in the queue
+        pool = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', port, app)
+    server.request_queue_size = 1024
+    server.serve_forever()
+
+
+def serve_asgi(port):
+    sys.path.insert(0, ROOT)
+    import uvicorn
+    uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning', backlog=1024)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, threads, env):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', kind, '--port', str(port), '--threads', str(threads)],
+                            env=env, cwd=ROOT, start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return proc, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    os.killpg(proc.pid, signal.SIGTERM)
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def run_load(base_url, clients, seconds, ids):
+    stop = threading.Event()
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                ok = session.get(f'{base_url}/get_trailer/movie/{next(ids)}', timeout=30).status_code in (200, 404)
+            except requests.RequestException:
+                ok = False
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'req_s': len(latencies) / seconds,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--threads', type=int, default=8, help='request threads for the WSGI server')
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve == 'wsgi':
+        return serve_wsgi(args.port, args.threads)
+    if args.serve == 'asgi':
+        return serve_asgi(args.port)
+
+    # Half the ids have no videos under the media type asked for, so the fallback matters
+    stub, state, stub_url = stub_tmdb.start(latency_ms=args.latency_ms, video_rate=0.5)
+    ids = itertools.count(10_000_000)  # never in the catalog, never repeated
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ('wsgi', 'asgi'):
+            env = dict(os.environ, TMDB_API_URL=stub_url, NETFLIX_DB=os.path.join(tmp, f'{kind}.db'),
+                       TMDB_CACHE_DB=os.path.join(tmp, f'{kind}_tmdb_cache.db'), NETFLIX_CACHE_TYPE='SimpleCache')
+            proc, base_url = start_server(kind, args.threads, env)
+            try:
+                before = state.requests
+                result = run_load(base_url, args.clients, args.seconds, ids)
+                result['upstream'] = state.requests - before
+                results.append((kind, result))
+            finally:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait()
+    stub.shutdown()
+
+    names = {'wsgi': f'flask, {args.threads} threads', 'asgi': 'asgi (uvicorn)'}
+    print(f"\nTMDB latency {args.latency_ms:.0f} ms, {args.clients} concurrent clients")
+    print(f"{'server':<20}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'TMDB calls':>12}")
+    for kind, r in results:
+        print(f"{names[kind]:<20}{r['req_s']:>8.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['errors']:>8}"
+              f"{r['upstream']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Requests/sec on / and /search with and without the SQLite connection pool.
+
+Starts the app on a threaded werkzeug server twice (NETFLIX_DB_POOL=0, then 1)
+against a copy of the database and hammers it from several client threads.
+
+    python benchmarks/bench_db_pool.py --db netflix.db --threads 8 --seconds 10
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SERVER = """
+import sys
+sys.path.insert(0, {root!r})
+from werkzeug.serving import make_server
+from app import app
+make_server('127.0.0.1', {port}, app, threaded=True).serve_forever()
+"""
+
+
+def start_server(db_path, port, pooled):
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_DB_POOL='1' if pooled else '0')
+    proc = subprocess.Popen([sys.executable, '-c', SERVER.format(root=ROOT, port=port)], env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            requests.get(base + '/login', timeout=1)
+            return proc, base
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('server did not start')
+
+
+def logged_in_session(base):
+    s = requests.Session()
+    email = f'bench-{uuid.uuid4().hex[:8]}@example.com'
+    s.post(base + '/signup', data={'email': email, 'password': 'bench', 'name': 'Bench'})
+    profiles = s.get(base + '/profiles').text
+    profile_id = profiles.split('/set_profile/')[1].split("'")[0].split('"')[0]
+    s.get(f'{base}/set_profile/{profile_id}')
+    return s
+
+
+def hammer(base, cookies, path, threads, seconds):
+    done = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(i):
+        s = requests.Session()
+        s.cookies.update(cookies)
+        while time.perf_counter() < deadline:
+            s.get(base + path).raise_for_status()
+            done[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(done) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    paths = ['/', '/search?q=the']
+    results = {}
+
+    # The benchmark signs up a user, so it runs on a copy rather than the real database
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'netflix.db')
+        shutil.copy(args.db, db_path)
+        for pooled in (False, True):
+            proc, base = start_server(db_path, args.port, pooled)
+            try:
+                cookies = logged_in_session(base).cookies
+                for path in paths:
+                    results[(pooled, path)] = hammer(base, cookies, path, args.threads, args.seconds)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print(f"{'route':<16}{'no pool':>12}{'pooled':>12}{'speedup':>10}")
+    for path in paths:
+        before, after = results[(False, path)], results[(True, path)]
+        print(f"{path:<16}{before:>10.1f}/s{after:>10.1f}/s{after / before:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Homepage time-to-first-byte, time-to-hero and total time.
+
+Starts the app in a separate process (a threaded werkzeug server on a copy
+of the database), logs a client in and fetches "/" over and over with
+gzip, the way a browser would, from a few clients at once. For each
+response it records when the first body byte arrived, when the hero had
+arrived in full (the browser can paint it from there) and when the last
+byte did.
+
+    python benchmarks/bench_homepage.py --db netflix.db --seconds 10 --clients 4
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import requests
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'correct horse'
+HERO_END = b'</header>'
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from app import app
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_account(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT OR IGNORE INTO users (email, password, name) VALUES (?, ?, ?)',
+                 (EMAIL, generate_password_hash(PASSWORD, method='scrypt'), 'Bench'))
+    conn.execute("INSERT INTO profiles (user_id, name, avatar) SELECT id, 'Bench', 'blue' FROM users WHERE email = ?",
+                 (EMAIL,))
+    conn.commit()
+    profile_id = conn.execute('SELECT MAX(id) FROM profiles').fetchone()[0]
+    conn.close()
+    return profile_id
+
+
+def start_server(db_path):
+    port = free_port()
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache')
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', str(port)], env=env, cwd=ROOT,
+                            start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return proc, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    os.killpg(proc.pid, signal.SIGTERM)
+    raise RuntimeError('server did not start')
+
+
+def fetch(session, url):
+    """
+    GETs url with gzip; returns (first byte, hero, total) in seconds and the
+    size on the wire.
+    """
+    started = time.perf_counter()
+    response = session.get(url, headers={'Accept-Encoding': 'gzip'}, stream=True)
+    first_byte = hero = None
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 32) if response.headers.get('Content-Encoding') == 'gzip' else None
+    page, size = b'', 0
+    for chunk in response.raw.stream(16 * 1024, decode_content=False):
+        now = time.perf_counter()
+        if first_byte is None:
+            first_byte = now - started
+        size += len(chunk)
+        page += decoder.decompress(chunk) if decoder else chunk
+        if hero is None and HERO_END in page:
+            hero = now - started
+    return first_byte, hero, time.perf_counter() - started, size
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'netflix.db')
+        shutil.copy(args.db, db_path)
+        profile_id = make_account(db_path)
+        proc, base_url = start_server(db_path)
+        try:
+            login = requests.Session()
+            login.post(f'{base_url}/login', data={'email': EMAIL, 'password': PASSWORD})
+            login.get(f'{base_url}/set_profile/{profile_id}')
+            fetch(login, f'{base_url}/')  # warm the caches
+
+            stop = threading.Event()
+            results, lock = [], threading.Lock()
+
+            def client():
+                session = requests.Session()
+                session.cookies.update(login.cookies)
+                while not stop.is_set():
+                    result = fetch(session, f'{base_url}/')
+                    with lock:
+                        results.append(result)
+
+            threads = [threading.Thread(target=client) for _ in range(args.clients)]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait()
+
+    first_bytes, heroes, totals, sizes = zip(*results)
+    print(f"\n{len(results)} homepage loads, {args.clients} clients, {len(results) / args.seconds:.1f}/s, "
+          f"{sum(sizes) / len(sizes) / 1024:.1f} KB each on the wire (gzip)")
+    print(f"{'':<14}{'p50 ms':>9}{'p90 ms':>9}")
+    for name, values in (('first byte', first_bytes), ('hero', heroes), ('total', totals)):
+        print(f"{name:<14}{percentile(values, 0.5):>9.1f}{percentile(values, 0.9):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Catalog JSON with and without the HTTP caching layer (httpcache.py).
+
+Runs the app in-process (Flask's test client, so this measures server time,
+not the network) on a copy of the database, logs one client in, and replays
+the row and search requests a browser makes while scrolling back and forth:
+
+    off          NETFLIX_HTTP_CACHE=0: every request queries SQLite and
+                 Flask-Compress re-compresses the body
+    on           the same requests; bodies come pre-compressed from memory
+    revalidate   the browser already has them and sends If-None-Match
+
+    python benchmarks/bench_http_cache.py --db netflix.db --seconds 5
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+QUERIES = ['star', 'the', 'love', 'war', 'man', 'dark', 'king', 'night']
+
+
+def run(client, urls, seconds, etags=None):
+    done, sent = 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for url in urls:
+            headers = {'Accept-Encoding': 'br, gzip'}
+            if etags is not None:
+                headers['If-None-Match'] = etags[url]
+            response = client.get(url, headers=headers)
+            assert response.status_code in (200, 304), (url, response.status_code)
+            done += 1
+            sent += len(response.data)
+    return done / seconds, sent / done
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'netflix.db')
+        shutil.copy(args.db, db_path)
+        os.environ.update(NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache',
+                          TMDB_CACHE_DB=os.path.join(tmp, 'tmdb_cache.db'))
+        sys.path.insert(0, ROOT)
+        import app
+
+        client = app.app.test_client()
+        client.post('/signup', data={'email': 'bench@example.com', 'password': 'pw', 'name': 'Bench'})
+
+        tags = [row[0] for row in sqlite3.connect(db_path).execute(
+            'SELECT tag FROM movie_genres GROUP BY tag ORDER BY COUNT(*) DESC LIMIT 8')]
+        urls = [f'/api/movies/{tag}?page={page}' for tag in tags for page in (1, 2, 3)]
+        urls += [f'/search?q={query}' for query in QUERIES]
+
+        results = []
+        app.http_cache.enabled = False
+        results.append(('off', *run(client, urls, args.seconds)))
+
+        app.http_cache.enabled = True
+        etags = {url: client.get(url).headers['ETag'] for url in urls}
+        results.append(('on', *run(client, urls, args.seconds)))
+        results.append(('revalidate', *run(client, urls, args.seconds, etags)))
+
+    print(f"\n{len(urls)} URLs (rows and searches), Accept-Encoding: br, gzip")
+    print(f"{'mode':<12}{'req/s':>10}{'bytes/resp':>12}")
+    for name, rate, size in results:
+        print(f"{name:<12}{rate:>10.0f}{size:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Browse latency while /login is being flooded.
+
+Starts the app in a separate process (a threaded werkzeug server on a copy
+of the database), logs one client in, then for each mode runs a few browse
+clients against "/" next to a pile of threads POSTing wrong passwords for
+real accounts, the way a credential-stuffing run does. Modes:
+
+    idle            no login traffic, the baseline
+    inline          scrypt on the request thread, no rate limits (the old way)
+    pool            scrypt on the bounded process pool, no rate limits
+    pool + limits   the defaults: process pool plus per-IP/per-account limits
+
+    python benchmarks/bench_login_load.py --seconds 10 --attackers 16
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ACCOUNTS = 50
+PASSWORD = 'correct horse'
+
+MODES = [
+    ('idle', {}, False),
+    ('inline', {'HASH_WORKERS': '0', 'LOGIN_IP_PER_MINUTE': '0', 'LOGIN_EMAIL_PER_MINUTE': '0'}, True),
+    ('pool', {'LOGIN_IP_PER_MINUTE': '0', 'LOGIN_EMAIL_PER_MINUTE': '0'}, True),
+    ('pool + limits', {}, True),
+]
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from app import app
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_accounts(db_path):
+    # Hashed once here so the server only spends CPU on the attack itself
+    pwhash = generate_password_hash(PASSWORD, method='scrypt')
+    conn = sqlite3.connect(db_path)
+    emails = [f'bench{n}@example.com' for n in range(ACCOUNTS)]
+    conn.executemany('INSERT OR IGNORE INTO users (email, password, name) VALUES (?, ?, ?)',
+                     [(email, pwhash, 'Bench') for email in emails])
+    conn.execute("INSERT INTO profiles (user_id, name, avatar) SELECT id, 'Bench', 'blue' FROM users WHERE email = ?",
+                 (emails[0],))
+    conn.commit()
+    conn.close()
+    return emails
+
+
+def start_server(db_path, env_overrides):
+    port = free_port()
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache', **env_overrides)
+    # Own process group, so stopping it also stops its password hashing workers
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', str(port)], env=env, cwd=ROOT,
+                            start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return proc, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('server did not start')
+
+
+def browse_session(base_url, email, db_path):
+    session = requests.Session()
+    session.post(f'{base_url}/login', data={'email': email, 'password': PASSWORD})
+    profile_id = sqlite3.connect(db_path).execute(
+        'SELECT profiles.id FROM profiles JOIN users ON users.id = profiles.user_id WHERE email = ?',
+        (email,)).fetchone()[0]
+    session.get(f'{base_url}/set_profile/{profile_id}')
+    session.get(f'{base_url}/')  # warm the browse rows cache
+    return session
+
+
+def run_mode(base_url, session, emails, seconds, browsers, attackers, flood):
+    stop = threading.Event()
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+
+    def browse():
+        client = requests.Session()
+        client.cookies.update(session.cookies)
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get(f'{base_url}/')
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    def attack():
+        client = requests.Session()
+        while not stop.is_set():
+            try:
+                response = client.post(f'{base_url}/login', allow_redirects=False, timeout=30,
+                                       data={'email': random.choice(emails[1:]), 'password': 'hunter2'})
+                status = response.status_code
+            except requests.RequestException:
+                status = 'error'
+            with lock:
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=browse) for _ in range(browsers)]
+    if flood:
+        threads += [threading.Thread(target=attack) for _ in range(attackers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'browse_s': len(latencies) / seconds,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'logins_s': sum(statuses.values()) / seconds,
+        'statuses': dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--browsers', type=int, default=2)
+    parser.add_argument('--attackers', type=int, default=16)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'netflix.db')
+        shutil.copy(args.db, db_path)
+        emails = make_accounts(db_path)
+
+        results = []
+        for name, env, flood in MODES:
+            print(f"Running {name}...", flush=True)
+            proc, base_url = start_server(db_path, env)
+            try:
+                session = browse_session(base_url, emails[0], db_path)
+                results.append((name, run_mode(base_url, session, emails, args.seconds,
+                                               args.browsers, args.attackers, flood)))
+            finally:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait()
+
+    print(f"\n{'mode':<16}{'browse/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'logins/s':>10}  login statuses")
+    for name, r in results:
+        print(f"{name:<16}{r['browse_s']:>10.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['logins_s']:>10.1f}  "
+              f"{r['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
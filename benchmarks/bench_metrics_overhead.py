@@ -0,0 +1,95 @@
+"""
+Cost of the instrumentation in metrics.py: the per-request hooks and the
+timed SQLite cursor.
+
+Runs the same request mix with NETFLIX_METRICS=1 and NETFLIX_METRICS=0,
+each in its own process (the setting is read at import), on a copy of the
+database with Flask's test client, so this is server time only. The HTTP
+cache is turned off so every request actually reaches SQLite.
+
+    python benchmarks/bench_metrics_overhead.py --db netflix.db --seconds 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+QUERIES = ['star', 'the', 'love', 'war']
+
+
+def run(db_path, seconds):
+    # In the child process: replay the mix for `seconds`, print req/s as JSON
+    sys.path.insert(0, ROOT)
+    import app
+
+    client = app.app.test_client()
+    client.post('/signup', data={'email': 'bench@example.com', 'password': 'pw', 'name': 'Bench'})
+    conn = sqlite3.connect(db_path)
+    client.get(f"/set_profile/{conn.execute('SELECT MAX(id) FROM profiles').fetchone()[0]}")
+    tags = [row[0] for row in conn.execute(
+        'SELECT tag FROM movie_genres GROUP BY tag ORDER BY COUNT(*) DESC LIMIT 4')]
+    urls = ['/', '/rows/anime'] + [f'/api/movies/{tag}?page={page}' for tag in tags for page in (1, 2)]
+    urls += [f'/search?q={query}' for query in QUERIES]
+
+    for url in urls:  # warm up
+        client.get(url)
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for url in urls:
+            response = client.get(url)
+            response.get_data()
+            assert response.status_code == 200, (url, response.status_code)
+            done += 1
+    print(json.dumps({'rate': done / seconds, 'urls': len(urls)}))
+
+
+def measure(db_path, tmp, seconds, enabled):
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache', NETFLIX_HTTP_CACHE='0',
+               NETFLIX_METRICS='1' if enabled else '0', TMDB_CACHE_DB=os.path.join(tmp, 'tmdb_cache.db'),
+               NETFLIX_IMAGE_CACHE=os.path.join(tmp, 'image_cache'))
+    out = subprocess.run([sys.executable, __file__, '--run', db_path, '--seconds', str(seconds)],
+                         env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.seconds)
+        return
+
+    rates = {True: [], False: []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.rounds):
+            # Alternated, so drift on a noisy machine hits both the same
+            for enabled in (False, True):
+                db_path = os.path.join(tmp, 'netflix.db')
+                shutil.copy(args.db, db_path)
+                result = measure(db_path, tmp, args.seconds, enabled)
+                rates[enabled].append(result['rate'])
+
+    off, on = max(rates[False]), max(rates[True])
+    print(f"\n{result['urls']} URLs (homepage, a row fragment, rows, searches), HTTP cache off, "
+          f"best of {args.rounds}")
+    print(f"{'metrics':<10}{'req/s':>10}{'us/req':>10}")
+    for name, rate in (('off', off), ('on', on)):
+        print(f"{name:<10}{rate:>10.0f}{1e6 / rate:>10.0f}")
+    print(f"overhead: {(1e6 / on - 1e6 / off):.0f} us per request ({(off / on - 1) * 100:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
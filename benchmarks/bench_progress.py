@@ -0,0 +1,173 @@
+"""
+Sustained /progress pings: writing each one straight to SQLite versus the
+write-behind buffer in watch.py.
+
+Builds a small catalog with make_catalog.py, then for each mode starts a
+fresh process (NETFLIX_PROGRESS_FLUSH_MS is read at import) where a number
+of viewers, one thread and one login each, ping as fast as they can for a
+while and a reader keeps loading the homepage. With the Flask test client,
+so this is server time only. Then the same viewers call
+progress_buffer.record() directly, without Flask in the way, to show what
+the storage side alone can take. Afterwards every viewer's last position
+is checked against watch_progress, so a lost ping shows up as a mismatch.
+
+    python benchmarks/bench_progress.py --viewers 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TITLES_PER_VIEWER = 5  # each viewer moves on to another title every PINGS_PER_TITLE pings
+PINGS_PER_TITLE = 60
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return [timings[min(len(timings) - 1, int(len(timings) * p))] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def run(db_path, viewers, seconds):
+    # In the child process: ping for `seconds`, print the numbers as JSON
+    sys.path.insert(0, ROOT)
+    import app
+    import make_catalog
+
+    def logged_in(n):
+        client = app.app.test_client()
+        email = make_catalog.EMAIL.format(n)
+        client.post('/login', data={'email': email, 'password': make_catalog.PASSWORD})
+        conn = app.db.connect()
+        profile_id = conn.execute("""
+            SELECT profiles.id FROM profiles JOIN users ON users.id = profiles.user_id
+            WHERE users.email = ? ORDER BY profiles.id LIMIT 1
+        """, (email,)).fetchone()[0]
+        conn.close()
+        client.get(f'/set_profile/{profile_id}')
+        return client, profile_id
+
+    conn = app.db.connect()
+    titles = conn.execute('SELECT media_type, tmdb_id FROM movies ORDER BY id LIMIT ?',
+                          (viewers * TITLES_PER_VIEWER,)).fetchall()
+    conn.close()
+
+    stop = threading.Event()
+    ping_times = [[] for _ in range(viewers)]
+    last_sent = {}
+    page_times = []
+
+    def viewer(n, client, profile_id, direct=False):
+        pings = 0
+        while not stop.is_set():
+            media_type, tmdb_id = titles[n * TITLES_PER_VIEWER + (pings // PINGS_PER_TITLE) % TITLES_PER_VIEWER]
+            position = pings % PINGS_PER_TITLE + 1
+            started = time.perf_counter()
+            if direct:
+                app.progress_buffer.record(profile_id, media_type, tmdb_id, position, 600)
+            else:
+                response = client.post(f'/progress/{media_type}/{tmdb_id}', json={'position': position, 'duration': 600})
+                assert response.status_code == 204, response.status_code
+            ping_times[n].append(time.perf_counter() - started)
+            last_sent[(profile_id, media_type, tmdb_id)] = position
+            pings += 1
+
+    def reader(client):
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/').get_data()
+            page_times.append(time.perf_counter() - started)
+
+    def run_viewers(direct):
+        stop.clear()
+        threads = [threading.Thread(target=viewer, args=(n, client, profile_id, direct))
+                   for n, (client, profile_id) in enumerate(clients)]
+        if not direct:
+            threads.append(threading.Thread(target=reader, args=(reader_client,)))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        timings = [t for times in ping_times for t in times]
+        for times in ping_times:
+            times.clear()
+        return {'pings': len(timings), 'rate': len(timings) / (time.perf_counter() - started),
+                'ping_ms': percentiles(timings)}
+
+    clients = [logged_in(n + 1) for n in range(viewers)]
+    reader_client, _ = logged_in(viewers + 1)
+    http = run_viewers(direct=False)
+    http['stats'] = app.progress_buffer.stats()
+    direct = run_viewers(direct=True)
+
+    app.progress_buffer.flush()
+    conn = app.db.connect()
+    stored = {(row[0], row[1], row[2]): row[3] for row in conn.execute(
+        'SELECT profile_id, media_type, tmdb_id, position FROM watch_progress')}
+    conn.close()
+    lost = sum(stored.get(key) != position for key, position in last_sent.items())
+    print(json.dumps({'http': http, 'direct': direct, 'page_ms': percentiles(page_times), 'lost': lost}))
+
+
+def measure(db_path, tmp, viewers, seconds, flush_ms):
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache', NETFLIX_PROGRESS_FLUSH_MS=str(flush_ms),
+               TMDB_CACHE_DB=os.path.join(tmp, 'tmdb_cache.db'), NETFLIX_IMAGE_CACHE=os.path.join(tmp, 'image_cache'),
+               LOGIN_IP_PER_MINUTE='1000000', LOGIN_EMAIL_PER_MINUTE='1000000')
+    out = subprocess.run([sys.executable, __file__, '--run', db_path, '--viewers', str(viewers),
+                          '--seconds', str(seconds)],
+                         env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--viewers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--flush-ms', type=int, default=1000, help='the write-behind interval to test')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.viewers, args.seconds)
+        return
+
+    import make_catalog
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, 'template.db')
+        make_catalog.build(template, 10000, args.viewers + 1)
+        for name, flush_ms in (('every ping', 0), (f'every {args.flush_ms} ms', args.flush_ms)):
+            db_path = os.path.join(tmp, 'netflix.db')
+            shutil.copy(template, db_path)
+            results[name] = measure(db_path, tmp, args.viewers, args.seconds, flush_ms)
+            os.remove(db_path)
+
+    print(f"\n{args.viewers} viewers pinging flat out for {args.seconds:g}s, one reader loading /")
+    print(f"{'written':<18}{'pings/s':>9}{'commits':>9}{'ping p50':>10}{'p99 ms':>8}{'/ p50':>8}{'p99 ms':>8}")
+    for name, result in results.items():
+        http = result['http']
+        commits = http['stats']['flushes'] or http['pings']
+        print(f"{name:<18}{http['rate']:>9.0f}{commits:>9}{http['ping_ms'][0]:>10.2f}{http['ping_ms'][2]:>8.2f}"
+              f"{result['page_ms'][0]:>8.2f}{result['page_ms'][2]:>8.2f}")
+
+    print("\nprogress_buffer.record() alone, same viewers")
+    print(f"{'written':<18}{'pings/s':>9}{'p50 us':>9}{'p99 us':>9}{'lost':>6}")
+    for name, result in results.items():
+        direct = result['direct']
+        print(f"{name:<18}{direct['rate']:>9.0f}{direct['ping_ms'][0] * 1000:>9.0f}{direct['ping_ms'][2] * 1000:>9.0f}"
+              f"{result['lost']:>6}")
+
+
+if __name__ == '__main__':
+    main()
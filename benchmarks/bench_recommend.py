@@ -0,0 +1,110 @@
+"""
+The "Because you saved" batch job and what its row costs the homepage.
+
+Builds a synthetic database with make_catalog.py (about a million My List
+rows by default), then:
+
+  - times recommend.build_neighbors() with NumPy and, with --python, the
+    plain Python fallback
+  - times recommend.recommend() for a sample of profiles, the query a cold
+    homepage runs once per profile and list state
+  - loads / for a sample of profiles (each once cold, then warm, the way a
+    user comes back) with the row and without it
+
+    python benchmarks/bench_recommend.py --titles 100k --users 26000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return [timings[min(len(timings) - 1, int(len(timings) * p))] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def logged_in(app, email, password, profile_id):
+    client = app.app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+    client.get(f'/set_profile/{profile_id}')
+    return client
+
+
+def time_homepage(app, clients, with_row):
+    app.RECOMMENDATIONS_AFTER = 'popular' if with_row else None
+    app.recommendation_rows.clear()
+    cold, warm = [], []
+    for client in clients:
+        for timings in (cold, warm):
+            started = time.perf_counter()
+            client.get('/').get_data()
+            timings.append(time.perf_counter() - started)
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles', default='100k')
+    parser.add_argument('--users', type=int, default=26000, help='about 38 My List rows each')
+    parser.add_argument('--profiles', type=int, default=300, help='profiles sampled for recommend()')
+    parser.add_argument('--pages', type=int, default=50, help='of those, profiles that load / (one login each)')
+    parser.add_argument('--python', action='store_true', help='also time the batch without NumPy')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'netflix.db')
+        # Before the app's modules are imported: they read these once
+        os.environ.update(NETFLIX_DB=db_path, NETFLIX_CACHE_TYPE='SimpleCache', NETFLIX_HTTP_CACHE='0',
+                          TMDB_CACHE_DB=os.path.join(tmp, 'tmdb_cache.db'),
+                          NETFLIX_IMAGE_CACHE=os.path.join(tmp, 'image_cache'),
+                          LOGIN_IP_PER_MINUTE='1000000', LOGIN_EMAIL_PER_MINUTE='1000000')
+        import db
+        import make_catalog
+        import mylist
+        import recommend
+
+        make_catalog.build(db_path, make_catalog.parse_count(args.titles), args.users)
+
+        conn = db.connect()
+        saves = conn.execute('SELECT COUNT(*) FROM mylist').fetchone()[0]
+        batches = [('numpy', True)] + ([('python', False)] if args.python else [])
+        batch_times = []
+        for name, use_numpy in batches:
+            started = time.perf_counter()
+            count = recommend.build_neighbors(conn, use_numpy=use_numpy)
+            batch_times.append((name, time.perf_counter() - started, count))
+
+        sample = random.Random(3).sample(conn.execute("""
+            SELECT users.email, profiles.id FROM profiles JOIN users ON users.id = profiles.user_id
+        """).fetchall(), args.profiles)
+        lookups = []
+        for _, profile_id in sample:
+            started = time.perf_counter()
+            recommend.recommend(conn, profile_id, mylist.saved_titles(conn, profile_id))
+            lookups.append(time.perf_counter() - started)
+        conn.close()
+
+        import app
+        clients = [logged_in(app, email, make_catalog.PASSWORD, profile_id) for email, profile_id in sample[:args.pages]]
+        pages = {with_row: time_homepage(app, clients, with_row) for with_row in (False, True)}
+
+    print(f"\n{saves} My List rows")
+    for name, seconds, count in batch_times:
+        print(f"batch ({name}): {seconds:.1f}s, neighbors for {count} titles")
+    print(f"\n{'':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(f"{'recommend() per profile':<28}" + ''.join(f'{v:>9.2f}' for v in percentiles(lookups)))
+    for with_row, (cold, warm) in pages.items():
+        label = 'with row' if with_row else 'without row'
+        print(f"{'/ ' + label + ', first load':<28}" + ''.join(f'{v:>9.2f}' for v in percentiles(cold)))
+        print(f"{'/ ' + label + ', next load':<28}" + ''.join(f'{v:>9.2f}' for v in percentiles(warm)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Search latency: the old `title LIKE '%q%'` scan vs the FTS5 index.
+
+Builds a synthetic catalog (50k titles by default) in a temporary database,
+then replays every prefix a user would type for a sample of titles, the way
+handleSearch() in script.js does, and reports p50/p95/p99 per strategy.
+
+    python benchmarks/bench_search.py --titles 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import catalog
+
+WORDS = ("the star one piece dark night love war king queen city lost last first house game blue red "
+         "black white stranger things crown money heist squid witcher ozark narcos bridgerton dragon "
+         "ball naruto attack titan death note hunter demon slayer kingdom sweet home vincenzo crash "
+         "landing you tiger bear moon sun river mountain secret life story legend fire ice shadow "
+         "ghost blood gold silver iron wolf lion eagle ocean island road train station school").split()
+
+SYLLABLES = "ka ri mo to na shi ve lo an dor el ma ra zen qu ol is ter bri gan sa fe u pa li ne ro".split()
+
+
+def vocabulary(rng, size):
+    # Real titles/overviews draw from tens of thousands of words; pad the
+    # familiar ones above with made-up words so doclists have a realistic spread
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def build_catalog(path, titles, seed=7, vocab_size=20000):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tmdb_id INTEGER UNIQUE, title TEXT, overview TEXT,
+            poster_path TEXT, backdrop_path TEXT, logo_path TEXT, release_date TEXT,
+            vote_average REAL, media_type TEXT, genre TEXT, age_rating TEXT
+        )
+    """)
+    # Zipf word choice so some prefixes ("the", "star") are very common
+    words = vocabulary(rng, vocab_size)
+    weights = [1 / (i + 1) for i in range(len(words))]
+    rows = []
+    for i in range(titles):
+        title = ' '.join(rng.choices(words, weights, k=rng.randint(1, 4))).title()
+        overview = ' '.join(rng.choices(words, weights, k=30))
+        rows.append((i + 1, title, overview, round(rng.uniform(2, 9), 1), rng.choice(['movie', 'tv'])))
+    conn.executemany('INSERT INTO movies (tmdb_id, title, overview, vote_average, media_type) VALUES (?, ?, ?, ?, ?)', rows)
+    catalog.rebuild_search_index(conn)
+    conn.execute('ANALYZE')
+    conn.commit()
+    return conn
+
+
+def typed_queries(conn, samples, seed=11):
+    rng = random.Random(seed)
+    titles = [row[0] for row in conn.execute('SELECT title FROM movies ORDER BY RANDOM() LIMIT ?', (samples,))]
+    queries = []
+    for title in titles:
+        text = title.lower()
+        queries += [text[:n] for n in range(2, len(text) + 1)]
+    rng.shuffle(queries)
+    return queries
+
+
+def like_search(conn, query):
+    return conn.execute("SELECT * FROM movies WHERE title LIKE ? ORDER BY vote_average DESC LIMIT 20",
+                        ('%' + query + '%',)).fetchall()
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    pick = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def run(conn, fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(conn, query)
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles', type=int, default=50000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building a {args.titles}-title catalog...")
+        conn = build_catalog(os.path.join(tmp, 'bench.db'), args.titles)
+        conn.row_factory = sqlite3.Row
+        queries = typed_queries(conn, args.samples)
+        print(f"Replaying {len(queries)} typed prefixes\n")
+
+        strategies = [
+            ('LIKE scan', like_search),
+            ('FTS5 prefix', lambda c, q: catalog.search_titles(c, q)),
+            ('FTS5 + trigram', lambda c, q: catalog.search_titles(c, q, fuzzy=True)),
+        ]
+        print(f"{'strategy':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, fn in strategies:
+            p50, p95, p99 = run(conn, fn, queries)
+            print(f"{name:<18}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Seeding throughput (titles/sec) against the local stub TMDB server.
+
+Runs seed.save_to_db() into a temporary database twice: once with a single
+discover worker and a single enrichment worker (close to the old serial
+loop, minus its fixed sleeps), then with the default pools. Both runs share
+the same token-bucket rate limit, which is what bounds a real seed.
+
+    python benchmarks/bench_seed.py --latency-ms 50 --pages 2 --regions 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_tmdb
+
+
+def run_seed(db_path, base_url, pages, regions, rate, discover_workers, enrich_workers):
+    os.environ['NETFLIX_DB'] = db_path
+    import db
+    import seed
+    import tmdb
+
+    db.DB_PATH = db_path
+    tmdb.API_URL = base_url
+    seed.REGIONS = seed.REGIONS[:regions]
+    seed.DISCOVER_WORKERS, seed.ENRICH_WORKERS = discover_workers, enrich_workers
+    seed.client.limiter = tmdb.TokenBucket(rate)
+
+    started = time.monotonic()
+    added = seed.save_to_db(pages=pages)
+    return added, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--regions', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=40, help='requests/sec allowed by the token bucket')
+    parser.add_argument('--skip-serial', action='store_true')
+    args = parser.parse_args()
+
+    server, state, base_url = stub_tmdb.start(latency_ms=args.latency_ms, total_pages=args.pages, catalog_size=3000)
+
+    import seed
+    modes = [('pipeline', seed.DISCOVER_WORKERS, seed.ENRICH_WORKERS)]
+    if not args.skip_serial:
+        modes.insert(0, ('serial (1 + 1 workers)', 1, 1))
+
+    results = []
+    for name, discover_workers, enrich_workers in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            before = state.requests
+            added, elapsed = run_seed(os.path.join(tmp, 'netflix.db'), base_url, args.pages, args.regions,
+                                      args.rate, discover_workers, enrich_workers)
+            results.append((name, added, state.requests - before, elapsed))
+
+    server.shutdown()
+
+    print(f"\n{'mode':<24}{'titles':>8}{'requests':>10}{'seconds':>10}{'titles/s':>10}")
+    for name, added, requests_made, elapsed in results:
+        print(f"{name:<24}{added:>8}{requests_made:>10}{elapsed:>10.1f}{added / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
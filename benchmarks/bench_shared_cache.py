@@ -0,0 +1,112 @@
+"""
+Per-process SimpleCache vs the shared SQLiteCache, across worker processes.
+
+Each worker process plays a gunicorn worker serving the browse pages: every
+"request" reads the browse rows for the current catalog version from the
+cache and rebuilds them (catalog.materialize_rows) on a miss. Halfway
+through, the catalog version is bumped, like a refresh would.
+
+With SimpleCache every worker warms (and re-warms) its own copy; with the
+SQLite file one worker's rebuild serves all of them.
+
+    python benchmarks/bench_shared_cache.py --db netflix.db --workers 4 --seconds 6
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import catalog
+from caching import SQLiteCache
+from flask_caching.backends.simplecache import SimpleCache
+
+
+def make_cache(backend, path):
+    if backend == 'SimpleCache':
+        return SimpleCache(threshold=500, default_timeout=3600)
+    return SQLiteCache(path, default_timeout=3600)
+
+
+def worker(backend, cache_path, db_path, version, deadline, results):
+    cache = make_cache(backend, cache_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+
+    requests_served, rebuilds, latencies, payload_bytes = 0, 0, [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        key = f'browse_rows:{version.value}'
+        rows = cache.get(key)
+        if rows is None:
+            rows = catalog.materialize_rows(conn)
+            cache.set(key, rows)
+            rebuilds += 1
+            payload_bytes = len(pickle.dumps(rows, pickle.HIGHEST_PROTOCOL))
+        latencies.append(time.perf_counter() - started)
+        requests_served += 1
+
+    results.put((requests_served, rebuilds, latencies, payload_bytes))
+
+
+def run(backend, workers, seconds, db_path):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'app_cache.db')
+        if backend != 'SimpleCache':
+            make_cache(backend, cache_path)  # create the table before the workers race for it
+
+        version = multiprocessing.Value('i', 1)
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        procs = [multiprocessing.Process(target=worker, args=(backend, cache_path, db_path, version, deadline, results))
+                 for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+
+        time.sleep(seconds / 2)
+        with version.get_lock():
+            version.value += 1
+
+        collected = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        stored = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+
+    served = sum(r[0] for r in collected)
+    rebuilds = sum(r[1] for r in collected)
+    latencies = sorted(l for r in collected for l in r[2])
+    payload = max(r[3] for r in collected)
+    # SimpleCache holds one pickled copy per live version per worker; SQLite holds one file
+    memory = payload * workers * 2 if backend == 'SimpleCache' else stored
+    return {
+        'req_s': served / seconds,
+        'rebuilds': rebuilds,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'memory_kb': memory / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(ROOT, 'netflix.db'))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=6)
+    args = parser.parse_args()
+
+    print(f"{'backend':<14}{'req/s':>10}{'rebuilds':>10}{'p50 ms':>9}{'p99 ms':>9}{'cache KB':>10}")
+    for backend in ('SimpleCache', 'SQLiteCache'):
+        r = run(backend, args.workers, args.seconds, args.db)
+        print(f"{backend:<14}{r['req_s']:>10.0f}{r['rebuilds']:>10}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+              f"{r['memory_kb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Replays realistic browsing sessions against the app and reports throughput
+and latency percentiles per endpoint as JSON, so runs can be compared over
+time.
+
+Each virtual user loops over one session after another, the way a browser
+would drive the site:
+
+    login -> /profiles -> pick a profile -> / -> the lazy homepage rows ->
+    scroll a couple of rows (/api/movies cursors) -> type a search, one
+    request per keystroke -> open a few titles (/get_info) -> add one to
+    My List -> logout
+
+By default it starts everything itself: benchmarks/stub_tmdb.py (so
+/get_info misses cost a realistic round trip) and the app on a threaded
+werkzeug server, using a copy of the database. Build the database with
+make_catalog.py first, since the accounts come from there:
+
+    python benchmarks/make_catalog.py --titles 100k --out /tmp/netflix.db
+    python benchmarks/load_driver.py --db /tmp/netflix.db --users 16 --seconds 60 --out run.json
+
+Pass --url to drive an app that is already running (gunicorn, uvicorn...)
+on that database instead. --baseline old.json prints the change against an
+earlier run.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_tmdb
+from make_catalog import DEFAULT_OUT, EMAIL, PASSWORD
+
+ROW = re.compile(r'<div class="row" id="(\w+)" data-cursor="([^"]*)"')
+ROW_SLOT = re.compile(r'data-row="(\w+)"')
+CARD = re.compile(r"openMoreInfo\('(movie|tv)', (\d+)\)")
+CARD_TITLE = re.compile(r'<p class="movie-title">([^<]+)</p>')
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log line per request
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(tmp, db_path, tmdb_url):
+    port = free_port()
+    env = dict(os.environ, NETFLIX_DB=db_path, NETFLIX_CACHE_DB=os.path.join(tmp, 'app_cache.db'),
+               TMDB_CACHE_DB=os.path.join(tmp, 'tmdb_cache.db'), NETFLIX_IMAGE_CACHE=os.path.join(tmp, 'image_cache'),
+               TMDB_API_URL=tmdb_url, TMDB_IMAGE_URL=tmdb_url.rsplit('/', 1)[0] + '/t/p',
+               # Every virtual user logs in from 127.0.0.1
+               LOGIN_IP_PER_MINUTE='1000000', LOGIN_EMAIL_PER_MINUTE='1000000')
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', str(port)], env=env, cwd=ROOT,
+                            start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return proc, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    os.killpg(proc.pid, signal.SIGTERM)
+    raise RuntimeError('server did not start')
+
+
+def load_accounts(db_path):
+    # email -> profile ids, for the accounts make_catalog.py created
+    accounts = {}
+    conn = sqlite3.connect(db_path)
+    for email, profile_id in conn.execute("""
+        SELECT users.email, profiles.id FROM users JOIN profiles ON profiles.user_id = users.id
+        WHERE users.email LIKE ? ORDER BY users.id, profiles.id
+    """, (EMAIL.format('%'),)):
+        accounts.setdefault(email, []).append(profile_id)
+    conn.close()
+    if not accounts:
+        sys.exit(f"No load test accounts in {db_path}; build it with benchmarks/make_catalog.py")
+    return sorted(accounts.items())
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(seconds, ok)]
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def session_done(self):
+        with self.lock:
+            self.sessions += 1
+
+
+class Browser:
+    """
+    One virtual user: a requests.Session plus a timer around every call.
+    """
+    def __init__(self, base_url, recorder, rng, think):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.think = think
+        self.session = requests.Session()
+
+    def call(self, endpoint, method, path, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False, timeout=30, **kwargs)
+            body = response.content
+            ok = response.status_code in expect
+        except requests.RequestException:
+            response, body, ok = None, b'', False
+        self.recorder.add(endpoint, time.perf_counter() - started, ok)
+        if self.think:
+            time.sleep(self.rng.expovariate(1 / self.think))
+        return response, body
+
+    def run_session(self, email, profile_ids):
+        rng = self.rng
+        self.session.cookies.clear()
+        self.call('login', 'POST', '/login', expect=(302,), data={'email': email, 'password': PASSWORD})
+        self.call('profiles', 'GET', '/profiles')
+        self.call('set_profile', 'GET', f'/set_profile/{rng.choice(profile_ids)}', expect=(302,))
+
+        _, body = self.call('home', 'GET', '/')
+        page = body.decode('utf-8', 'replace')
+        rows = dict(ROW.findall(page))
+        titles, names = CARD.findall(page), CARD_TITLE.findall(page)
+        # The browser fetches the lazy rows as they scroll into view
+        for name in ROW_SLOT.findall(page)[:rng.randint(1, 4)]:
+            _, fragment = self.call('row_fragment', 'GET', f'/rows/{name}')
+            fragment = fragment.decode('utf-8', 'replace')
+            rows.update(ROW.findall(fragment))
+            titles += CARD.findall(fragment)
+            names += CARD_TITLE.findall(fragment)
+
+        for genre in rng.sample(sorted(rows), min(2, len(rows))):
+            cursor = rows[genre]
+            for _ in range(rng.randint(1, 4)):
+                if not cursor:
+                    break
+                response, _ = self.call('api_movies', 'GET', f'/api/movies/{genre}', params={'after': cursor})
+                if response is None or response.status_code != 200:
+                    break
+                data = response.json()
+                titles += [(movie['media_type'], str(movie['tmdb_id'])) for movie in data['movies']]
+                names += [movie['title'] for movie in data['movies'] if movie['title']]
+                cursor = data['next_cursor']
+
+        if names:
+            # Typing a word from a title on screen, one request per keystroke
+            word = rng.choice(rng.choice(names).split()).lower()
+            for n in range(1, len(word) + 1):
+                self.call('search', 'GET', '/search', params={'q': word[:n]})
+
+        if titles:
+            opened = rng.sample(titles, min(len(titles), rng.randint(1, 3)))
+            for media_type, tmdb_id in opened:
+                self.call('get_info', 'GET', f'/get_info/{media_type}/{tmdb_id}')
+            media_type, tmdb_id = opened[0]
+            self.call('add_to_list', 'POST', f'/add_to_list/{media_type}/{tmdb_id}')
+
+        self.call('logout', 'GET', '/logout', expect=(302,))
+        self.recorder.session_done()
+
+
+def percentile(values, p):
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1)
+
+
+def summarize(recorder, seconds):
+    endpoints = {}
+    total = errors = 0
+    for name, samples in sorted(recorder.samples.items()):
+        latencies = sorted(s for s, _ in samples)
+        failed = sum(1 for _, ok in samples if not ok)
+        total += len(samples)
+        errors += failed
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': failed,
+            'rps': round(len(samples) / seconds, 1),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': round(latencies[-1] * 1000, 1),
+        }
+    return {'requests': total, 'errors': errors, 'throughput_rps': round(total / seconds, 1), 'endpoints': endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"\n{report['sessions']} sessions, {report['requests']} requests in {report['config']['seconds']:g}s: "
+          f"{report['throughput_rps']} req/s, {report['errors']} errors")
+    header = f"{'endpoint':<14}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    if baseline:
+        header += f"{'p50 vs base':>13}{'p99 vs base':>13}"
+    print(header)
+    for name, stats in report['endpoints'].items():
+        line = (f"{name:<14}{stats['rps']:>8}{stats['errors']:>8}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+        old = (baseline or {}).get('endpoints', {}).get(name)
+        if old:
+            line += f"{stats['p50_ms'] / max(old['p50_ms'], 0.1):>12.2f}x{stats['p99_ms'] / max(old['p99_ms'], 0.1):>12.2f}x"
+        print(line)
+    if baseline:
+        print(f"throughput vs base: {report['throughput_rps'] / max(baseline['throughput_rps'], 0.1):.2f}x "
+              f"(base {baseline.get('git_commit')} at {baseline.get('started_at')})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=DEFAULT_OUT, help='a make_catalog.py database')
+    parser.add_argument('--url', help='drive an app that is already running on --db')
+    parser.add_argument('--users', type=int, default=16, help='virtual users, each running sessions back to back')
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--think-ms', type=float, default=0, help='mean pause after each request')
+    parser.add_argument('--tmdb-latency-ms', type=float, default=80)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write the JSON report here')
+    parser.add_argument('--baseline', help='an earlier --out report to compare against')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    accounts = load_accounts(args.db)
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def virtual_user(n):
+        rng = random.Random(args.seed * 1000 + n)
+        browser = Browser(base_url, recorder, rng, args.think_ms / 1000)
+        while not stop.is_set():
+            browser.run_session(*rng.choice(accounts))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = stub = None
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            stub, _, tmdb_url = stub_tmdb.start(latency_ms=args.tmdb_latency_ms)
+            db_path = os.path.join(tmp, 'netflix.db')
+            shutil.copy(args.db, db_path)
+            proc, base_url = start_server(tmp, db_path, tmdb_url)
+        try:
+            threads = [threading.Thread(target=virtual_user, args=(n,), daemon=True) for n in range(args.users)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            if proc:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait()
+            if stub:
+                stub.shutdown()
+
+    report = {
+        'started_at': started_at,
+        'git_commit': git_commit(),
+        'config': {'db': os.path.abspath(args.db), 'url': args.url, 'users': args.users, 'seconds': args.seconds,
+                   'think_ms': args.think_ms, 'tmdb_latency_ms': None if args.url else args.tmdb_latency_ms,
+                   'seed': args.seed},
+        'sessions': recorder.sessions,
+        **summarize(recorder, elapsed),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Synthetic netflix.db for benchmarks, without TMDB.
+
+Builds the real schema (seed.create_tables) and fills it with a catalog of
+any size plus users, profiles and My List rows, all from a fixed random
+seed, so two runs with the same arguments produce the same database:
+
+- titles are 60% movies, 40% TV. Titles and overviews draw words from a
+  Zipf vocabulary (see bench_search.py), so some search prefixes are very
+  common and most are rare
+- every title gets the browse tag its discover query would have given it
+  (anime and K-dramas are TV, Bollywood is movies...) and about a third
+  pick up a second or third tag, the way seed.py merges titles found by
+  several queries ("trending,action")
+- lower ids are more popular: My List picks favour them, and the
+  "Because you saved" neighbors are computed from those lists
+- image paths and ids match benchmarks/stub_tmdb.py, so /get_info and /img
+  work against the stub
+
+Every account is loadtest<n>@example.com with the password "loadtest".
+Without --out it goes to netflix-loadtest.db in the temp directory, which is
+also where load_driver.py looks by default. No TMDB key or config.py needed.
+
+    python benchmarks/make_catalog.py --titles 100k --out /tmp/netflix.db
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.security import generate_password_hash
+
+import auth
+import catalog
+import recommend
+import seed
+from bench_search import vocabulary
+
+PASSWORD = 'loadtest'
+EMAIL = 'loadtest{}@example.com'
+
+# Out of the repo, so a synthetic catalog never lands on (or in a commit as) the real netflix.db
+DEFAULT_OUT = os.path.join(tempfile.gettempdir(), 'netflix-loadtest.db')
+
+# Browse tag -> (share of titles whose first tag it is, media types it occurs on)
+TAGS = {
+    'trending': (0.12, ('movie', 'tv')),
+    'popular': (0.10, ('movie',)),
+    'new_releases': (0.12, ('movie',)),
+    'action': (0.16, ('movie', 'tv')),
+    'anime': (0.08, ('tv',)),
+    'us_tv_drama': (0.14, ('tv',)),
+    'bollywood': (0.08, ('movie',)),
+    'kdrama': (0.07, ('tv',)),
+    'scifi_horror': (0.13, ('movie', 'tv')),
+}
+# Discover queries that overlap with the others, so titles found twice end up in these
+EXTRA_TAGS = ('trending', 'popular', 'new_releases', 'action', 'scifi_horror')
+AGE_RATINGS = {'movie': ('G', 'PG', 'PG-13', 'R', 'NR'), 'tv': ('TV-Y7', 'TV-PG', 'TV-14', 'TV-MA')}
+
+
+def parse_count(text):
+    # "10k" -> 10000, "1M" -> 1000000
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1].lower(), 1)
+    return int(float(text.rstrip('kKmM')) * scale)
+
+
+def pick_tags(rng, media_type):
+    allowed = [(tag, share) for tag, (share, media_types) in TAGS.items() if media_type in media_types]
+    tags = rng.choices([tag for tag, _ in allowed], [share for _, share in allowed])
+    for chance in (0.35, 0.10):
+        extra = rng.choice(EXTRA_TAGS)
+        if rng.random() < chance and extra not in tags and media_type in TAGS[extra][1]:
+            tags.append(extra)
+    return tags
+
+
+def titles(rng, count, words):
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(words))))
+    for tmdb_id in range(1, count + 1):
+        media_type = 'movie' if rng.random() < 0.6 else 'tv'
+        title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))).title()
+        overview = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(15, 40))).capitalize() + '.'
+        date = f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        yield {
+            'tmdb_id': tmdb_id,
+            'title': title,
+            'overview': overview,
+            'poster_path': f'/poster{tmdb_id}.jpg',
+            'backdrop_path': f'/backdrop{tmdb_id}.jpg',
+            'logo_path': f'/logo{tmdb_id}.png' if rng.random() < 0.8 else None,
+            'release_date': date,
+            'vote_average': round(min(9.5, max(2.0, rng.gauss(6.6, 1.1))), 1),
+            'media_type': media_type,
+            'genre': ','.join(pick_tags(rng, media_type)),
+            'age_rating': rng.choice(AGE_RATINGS[media_type]),
+        }
+
+
+def popular_title(rng, cum_weights, media_types):
+    # Zipf over ids: title 1 is saved far more often than title 100000
+    tmdb_id = bisect.bisect(cum_weights, rng.random() * cum_weights[-1]) + 1
+    return tmdb_id, media_types[tmdb_id - 1]
+
+
+def build(path, title_count, users, seed_value=7, vocab_size=20000):
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    seed.create_tables(conn)
+    # Filled in one pass at the end: the insert triggers would index title by title, several times slower
+    catalog.drop_search_index(conn)
+
+    started = time.monotonic()
+    media_types = []
+    batch = []
+    for movie in titles(rng, title_count, vocabulary(rng, vocab_size)):
+        media_types.append(movie['media_type'])
+        batch.append(movie)
+        if len(batch) == 10000:
+            save_titles(conn, batch)
+            batch = []
+            print(f"  {len(media_types)}/{title_count} titles")
+    save_titles(conn, batch)
+    print(f"{title_count} titles in {time.monotonic() - started:.1f}s; building the search index...")
+    catalog.rebuild_search_index(conn)
+
+    # One scrypt hash for everyone: hashing thousands of passwords would take longer than the catalog
+    password = generate_password_hash(PASSWORD, auth.HASH_METHOD)
+    cum_weights = list(itertools.accumulate(1 / (i + 10) for i in range(title_count)))
+    profiles = saved = 0
+    for n in range(1, users + 1):
+        user_id = conn.execute('INSERT INTO users (email, password, name) VALUES (?, ?, ?)',
+                               (EMAIL.format(n), password, f'Load Test {n}')).lastrowid
+        for p in range(rng.choice((1, 1, 2, 2, 3, 4, 5))):
+            profile_id = conn.execute('INSERT INTO profiles (user_id, name, avatar) VALUES (?, ?, ?)',
+                                      (user_id, f'Profile {p + 1}', rng.choice(('blue', 'red', 'green', 'yellow')))).lastrowid
+            picks = {popular_title(rng, cum_weights, media_types) for _ in range(int(rng.expovariate(1 / 15)))}
+            conn.executemany('INSERT OR IGNORE INTO mylist (profile_id, tmdb_id, media_type) VALUES (?, ?, ?)',
+                             [(profile_id, tmdb_id, media_type) for tmdb_id, media_type in picks])
+            profiles += 1
+            saved += len(picks)
+
+    print("Computing recommendations...")
+    recommend.build_neighbors(conn)
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    print(f"{users} users, {profiles} profiles, {saved} My List rows; done in {time.monotonic() - started:.1f}s")
+
+
+def save_titles(conn, movies):
+    conn.executemany("""
+        INSERT INTO movies (tmdb_id, title, overview, poster_path, backdrop_path, logo_path,
+                            release_date, vote_average, media_type, genre, age_rating, enriched_at)
+        VALUES (:tmdb_id, :title, :overview, :poster_path, :backdrop_path, :logo_path,
+                :release_date, :vote_average, :media_type, :genre, :age_rating, NULL)
+    """, movies)
+    conn.executemany('INSERT OR IGNORE INTO movie_genres (tmdb_id, media_type, tag) VALUES (?, ?, ?)',
+                     [(movie['tmdb_id'], movie['media_type'], tag)
+                      for movie in movies for tag in catalog.split_genres(movie['genre'])])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles', default='10k', help='e.g. 10k, 100k, 1M')
+    parser.add_argument('--users', type=int, help='default: one per 100 titles')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    title_count = parse_count(args.titles)
+    if os.path.exists(args.out):
+        sys.exit(f"{args.out} already exists; pass another --out or remove it first")
+    build(args.out, title_count, args.users or max(10, title_count // 100), args.seed)
+
+
+if __name__ == '__main__':
+    main()
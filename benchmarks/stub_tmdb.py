@@ -0,0 +1,232 @@
+"""
+A local stand-in for the TMDB API, for benchmarks and offline runs.
+
+Answers the endpoints seed.py and app.py call with deterministic fake data
+and an optional injected latency:
+
+    /3/discover/{movie,tv}            pages of 20 titles
+    /3/{movie,tv}/<id>                details (+ release_dates, content_ratings, credits, images, videos)
+    /3/{movie,tv}/<id>/images         logos
+    /3/{movie,tv}/<id>/videos         trailers
+    /t/p/<size>/<file>                images (a generated JPEG or PNG; needs Pillow)
+
+Run it standalone and point the app at it:
+
+    python benchmarks/stub_tmdb.py --port 5055 --latency-ms 80
+    TMDB_API_URL=http://127.0.0.1:5055/3 python seed.py
+"""
+import argparse
+import functools
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CATALOG_SIZE = 20000
+IMAGE_WIDTHS = {'w300': 300, 'w500': 500, 'w780': 780, 'original': 3840}
+
+
+class StubState:
+    def __init__(self, latency_ms=0, total_pages=20, catalog_size=CATALOG_SIZE, missing_rate=0.0, video_rate=1.0):
+        self.latency = latency_ms / 1000
+        self.total_pages = total_pages
+        self.catalog_size = catalog_size
+        self.missing_rate = missing_rate
+        self.video_rate = video_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+def stable_random(*parts):
+    digest = hashlib.sha256(':'.join(map(str, parts)).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def fake_title(media_type, tmdb_id):
+    rng = stable_random('title', tmdb_id)
+    words = ['Dark', 'Star', 'Night', 'Crown', 'Money', 'Heist', 'Kingdom', 'Lost', 'City', 'Squid',
+             'Game', 'Stranger', 'Things', 'Blue', 'Witcher', 'Ozark', 'Queen', 'Legend', 'Fire', 'Moon']
+    name = ' '.join(rng.sample(words, rng.randint(1, 3)))
+    date = f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    item = {
+        'id': tmdb_id,
+        'overview': f"{name} is a story about {' '.join(rng.sample(words, 5)).lower()}.",
+        'poster_path': f"/poster{tmdb_id}.jpg",
+        'backdrop_path': f"/backdrop{tmdb_id}.jpg",
+        'vote_average': round(rng.uniform(4, 9), 1),
+    }
+    if media_type == 'movie':
+        item.update(title=name, release_date=date)
+    else:
+        item.update(name=name, first_air_date=date)
+    return item
+
+
+def discover(state, media_type, query):
+    page = int(query.get('page', ['1'])[0])
+    key = sorted((k, v) for k, v in query.items() if k not in ('page', 'api_key'))
+    rng = stable_random('discover', media_type, key, page)
+    ids = [rng.randint(1, state.catalog_size) for _ in range(20)]
+    return {
+        'page': page,
+        'total_pages': state.total_pages,
+        'results': [fake_title(media_type, tmdb_id) for tmdb_id in ids] if page <= state.total_pages else [],
+    }
+
+
+def details(media_type, tmdb_id, query):
+    data = fake_title(media_type, tmdb_id)
+    rng = stable_random('details', tmdb_id)
+    data.update({
+        'runtime': rng.randint(80, 160) if media_type == 'movie' else None,
+        'episode_run_time': [rng.randint(20, 60)] if media_type == 'tv' else [],
+        'genres': [{'id': 18, 'name': 'Drama'}, {'id': 28, 'name': 'Action'}][:rng.randint(1, 2)],
+    })
+    append = query.get('append_to_response', [''])[0].split(',')
+    if 'release_dates' in append:
+        data['release_dates'] = {'results': [{'iso_3166_1': 'US', 'release_dates': [{'certification': 'PG-13'}]}]}
+    if 'content_ratings' in append:
+        data['content_ratings'] = {'results': [{'iso_3166_1': 'US', 'rating': 'TV-MA'}]}
+    if 'credits' in append:
+        data['credits'] = {'cast': [{'name': f'Actor {tmdb_id}-{n}', 'character': f'Role {n}'} for n in range(12)]}
+    if 'images' in append:
+        data['images'] = images(tmdb_id)
+    if 'videos' in append:
+        data['videos'] = videos(tmdb_id)
+    return data
+
+
+def images(tmdb_id):
+    return {'logos': [{'file_path': f'/logo{tmdb_id}.png'}], 'backdrops': [], 'posters': []}
+
+
+def videos(tmdb_id, media_type=None, video_rate=1.0):
+    # video_rate < 1 leaves some (media_type, id) pairs without videos, like a movie id asked for as tv
+    if video_rate < 1 and stable_random('videos', media_type, tmdb_id).random() >= video_rate:
+        return {'results': []}
+    return {'results': [
+        {'site': 'YouTube', 'type': 'Teaser', 'key': f'teaser{tmdb_id}'},
+        {'site': 'YouTube', 'type': 'Trailer', 'key': f'trailer{tmdb_id}'},
+    ]}
+
+
+@functools.lru_cache(maxsize=256)
+def image(size, file_name):
+    # Noise, so it compresses about as badly as a photo; PNG (logos) with transparency
+    width = IMAGE_WIDTHS.get(size)
+    if Image is None or width is None:
+        return None
+    height = width * 9 // 16 if 'backdrop' in file_name or file_name.startswith('b') else width * 3 // 2
+    rng = stable_random('image', file_name)
+    small = Image.frombytes('RGB', (32, 32), rng.randbytes(32 * 32 * 3)).resize((width, height))
+    noise = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    picture = Image.blend(small, noise, 0.15)
+    out = io.BytesIO()
+    if file_name.endswith('.png'):
+        picture.putalpha(128)
+        picture.save(out, 'PNG')
+    else:
+        picture.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            state.count()
+            if state.latency:
+                time.sleep(state.latency)
+
+            url = urlparse(self.path)
+            if url.path.startswith('/t/p/'):
+                return self.send_image(*url.path.split('/')[3:5])
+
+            query = parse_qs(url.query)
+            parts = [p for p in url.path.split('/') if p][1:]  # drop the "3"
+
+            status, body = 404, {'status_message': 'The resource you requested could not be found.'}
+            if len(parts) == 2 and parts[0] == 'discover':
+                status, body = 200, discover(state, parts[1], query)
+            elif len(parts) >= 2 and parts[0] in ('movie', 'tv') and parts[1].isdigit():
+                tmdb_id = int(parts[1])
+                if stable_random('missing', tmdb_id).random() >= state.missing_rate:
+                    if len(parts) == 2:
+                        status, body = 200, details(parts[0], tmdb_id, query)
+                    elif parts[2] == 'images':
+                        status, body = 200, images(tmdb_id)
+                    elif parts[2] == 'videos':
+                        status, body = 200, videos(tmdb_id, parts[0], state.video_rate)
+
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_image(self, size, file_name):
+            data = image(size, file_name)
+            self.send_response(200 if data else 404)
+            self.send_header('Content-Type', 'image/png' if file_name.endswith('.png') else 'image/jpeg')
+            self.send_header('Content-Length', str(len(data or b'')))
+            self.end_headers()
+            self.wfile.write(data or b'')
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default 5 drops connections when an async client opens a hundred at once
+
+
+def start(port=0, **options):
+    """
+    Starts the stub on a background thread; returns (server, state, base_url).
+    """
+    state = StubState(**options)
+    server = StubServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/3"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--total-pages', type=int, default=20)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--catalog-size', type=int, default=CATALOG_SIZE)
+    parser.add_argument('--video-rate', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server, _, base_url = start(args.port, latency_ms=args.latency_ms,
+                                total_pages=args.total_pages, missing_rate=args.missing_rate,
+                                catalog_size=args.catalog_size, video_rate=args.video_rate)
+    print(f"Stub TMDB listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
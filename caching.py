@@ -0,0 +1,556 @@
+import asyncio
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from flask_caching.backends.base import BaseCache
+
+
+class PolledValue:
+    """
+    Remembers the result of `fetch()` for `interval` seconds, so a value that
+    rarely changes (like the catalog version) costs one query per second
+    instead of one per request.
+    """
+    def __init__(self, fetch, interval=1.0):
+        self.fetch = fetch
+        self.interval = interval
+        self.value = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.interval:
+            with self.lock:
+                if now - self.checked_at >= self.interval:
+                    self.value = self.fetch()
+                    self.checked_at = time.monotonic()
+        return self.value
+
+    def reset(self):
+        self.checked_at = 0.0
+
+
+class LRUCache:
+    """
+    Thread-safe LRU bounded by entry count and (approximate) bytes.
+
+    Admission is TinyLFU style: once the cache is full, a new key only evicts
+    the least recently used one if it has been asked for at least as often.
+    A burst of one-off queries can't flush out the prefixes everyone types.
+    Counts are halved every 8 * max_entries lookups, and a victim nobody has
+    touched in the last 2 * max_entries is evicted regardless, so keys that
+    were hot once don't block the ones people ask for now. admission=False is a
+    plain LRU, for caches keyed on a version or a time (nothing is ever
+    asked for twice across those, so frequencies only get in the way).
+    """
+    def __init__(self, max_entries=2048, max_bytes=16 * 1024 * 1024, admission=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.admission = admission
+        self.entries = OrderedDict()  # key -> (value, size, tick of the last get or put)
+        self.frequency = {}
+        self.tick = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _touch(self, key):
+        self.tick += 1
+        if not self.admission:
+            return
+        self.frequency[key] = self.frequency.get(key, 0) + 1
+
+        # Age the counters so yesterday's popular queries don't stick forever
+        if self.tick % (self.max_entries * 8) == 0 or len(self.frequency) > self.max_entries * 8:
+            self.frequency = {k: n // 2 for k, n in self.frequency.items() if n > 1}
+
+    def get(self, key, default=None, count=True):
+        with self.lock:
+            self._touch(key)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.entries[key] = (entry[0], entry[1], self.tick)
+                self.hits += count
+                return entry[0]
+            self.misses += count
+            return default
+
+    def peek(self, key):
+        # Looks without counting a hit/miss or changing recency
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry[0] if entry else None
+
+    def admit(self, key, victim):
+        # Called with the lock held: may `key` push out `victim`?
+        if not self.admission:
+            return True
+        _, _, last_used = self.entries[victim]
+        if self.tick - last_used >= self.max_entries * 2:
+            return True  # nobody has wanted the victim for a while
+        return self.frequency.get(key, 0) >= self.frequency.get(victim, 0)
+
+    def put(self, key, value, size=1):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.tick += 1
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+            while self.entries and (len(self.entries) >= self.max_entries or self.size + size > self.max_bytes):
+                victim = next(iter(self.entries))
+                if not self.admit(key, victim):
+                    return
+                self.size -= self.entries.pop(victim)[1]
+                if victim in self.frequency:
+                    self.frequency[victim] //= 2
+
+            self.entries[key] = (value, size, self.tick)
+            self.size += size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def estimate_size(rows):
+    # Rough footprint of a list of flat dicts: the strings dominate
+    return 64 + sum(100 + sum(len(str(v)) + 50 for v in row.values()) for row in rows)
+
+
+class SearchCache:
+    """
+    Caches search results per normalized query (the list of search words).
+
+    A result set smaller than the page limit is complete: it holds every
+    title the query matches. Typing more letters can only narrow the match,
+    so a longer query is answered by filtering a complete result set for a
+    shorter prefix of it without touching SQLite.
+    """
+    def __init__(self, limit, max_entries=2048, max_bytes=16 * 1024 * 1024):
+        self.limit = limit
+        self.lru = LRUCache(max_entries, max_bytes)
+        self.version = None
+        self.hits = 0
+        self.filtered_hits = 0
+        self.misses = 0
+
+    def sync(self, version):
+        # Drop everything the moment the catalog version moves
+        if version != self.version:
+            self.lru.clear()
+            self.version = version
+
+    def get(self, words):
+        key = ' '.join(words)
+        cached = self.lru.get(key, count=False)
+        if cached is not None:
+            self.hits += 1
+            return cached[0]
+
+        for end in range(len(key) - 1, 0, -1):
+            shorter = self.lru.peek(key[:end])
+            if shorter is not None and shorter[1]:
+                self.filtered_hits += 1
+                results = [row for row in shorter[0] if matches(row, words)]
+                self.put(words, results, complete=True)
+                return results
+
+        self.misses += 1
+        return None
+
+    def put(self, words, results, complete=None):
+        if complete is None:
+            complete = len(results) < self.limit
+        rows = [dict(row) for row in results]
+        self.lru.put(' '.join(words), (rows, complete), estimate_size(rows))
+
+    def stats(self):
+        stats = self.lru.stats()
+        total = self.hits + self.filtered_hits + self.misses
+        stats.update({
+            'hits': self.hits,
+            'filtered_hits': self.filtered_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.filtered_hits) / total, 4) if total else 0.0,
+        })
+        return stats
+
+
+def matches(row, words):
+    """
+    Python mirror of catalog.search_titles(): every completed word appears in
+    the title or overview, and some word there starts with the last one.
+    """
+    text = fold(f"{row.get('title') or ''} {row.get('overview') or ''}")
+    tokens = set(''.join(ch if ch.isalnum() else ' ' for ch in text).split())
+    *done, typing = [fold(word) for word in words]
+    return all(word in tokens for word in done) and any(token.startswith(typing) for token in tokens)
+
+
+def fold(text):
+    # Same folding as the FTS5 unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class ResponseCache:
+    """
+    Two-level cache for upstream (TMDB) responses: an in-memory LRU in front
+    of a small SQLite file that survives restarts and is shared by every
+    worker process.
+
+    fetch() returns (status, body). 200s are kept for `ttl` seconds and
+    404s for `negative_ttl`; anything else (5xx, timeouts) raises and is never
+    cached. Past its TTL an entry is still served for up to `stale_ttl` more
+    seconds while one background thread refreshes it (stale-while-revalidate).
+    Concurrent misses for the same key share a single upstream call.
+    """
+    def __init__(self, path, ttl=24 * 3600, negative_ttl=3600, stale_ttl=7 * 24 * 3600,
+                 max_entries=4096, max_bytes=32 * 1024 * 1024, refresh_workers=4):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.memory = LRUCache(max_entries, max_bytes)
+        self.inflight = {}
+        self.async_inflight = {}
+        self.lock = threading.Lock()
+        self.refresher = ThreadPoolExecutor(refresh_workers, thread_name_prefix='cache-refresh')
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+        self.store = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.store_lock = threading.Lock()
+        with self.store_lock:
+            self.store.execute('PRAGMA journal_mode = WAL')
+            self.store.execute('PRAGMA synchronous = NORMAL')
+            self.store.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    body TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            self.store.commit()
+
+    def lifetime(self, status):
+        return self.ttl if status == 200 else self.negative_ttl
+
+    def lookup(self, key):
+        entry = self.memory.get(key, count=False)
+        if entry is None:
+            with self.store_lock:
+                row = self.store.execute('SELECT status, body, fetched_at FROM responses WHERE key = ?',
+                                         (key,)).fetchone()
+            if row:
+                entry = (row[0], json.loads(row[1]) if row[1] is not None else None, row[2])
+                self.memory.put(key, entry, 100 + len(row[1] or ''))
+        return entry
+
+    def save(self, key, status, body):
+        text = json.dumps(body) if body is not None else None
+        entry = (status, body, time.time())
+        self.memory.put(key, entry, 100 + len(text or ''))
+        try:
+            with self.store_lock:
+                self.store.execute('INSERT OR REPLACE INTO responses (key, status, body, fetched_at) VALUES (?, ?, ?, ?)',
+                                   (key, status, text, entry[2]))
+                self.store.commit()
+        except sqlite3.Error as e:
+            # The memory copy still works; the disk copy is only an optimization
+            print(f"Response cache write failed: {e}")
+        return entry
+
+    def get(self, key, fetch):
+        """
+        Returns (status, body) for key, calling fetch() only when needed.
+        """
+        entry = self.lookup(key)
+        if entry is not None:
+            age = time.time() - entry[2]
+            if age < self.lifetime(entry[0]):
+                self.hits += 1
+                return entry[0], entry[1]
+            if age < self.lifetime(entry[0]) + self.stale_ttl:
+                self.stale_hits += 1
+                self.fetch_once(key, fetch, background=True)
+                return entry[0], entry[1]
+
+        self.misses += 1
+        try:
+            return self.fetch_once(key, fetch).result()[:2]
+        except Exception:
+            # Upstream is down: an entry older than stale_ttl still beats an error
+            if entry is not None:
+                return entry[0], entry[1]
+            raise
+
+    def fetch_once(self, key, fetch, background=False):
+        # Single flight: the first caller starts the fetch, everyone else waits on its future
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                return future
+            future = self.inflight[key] = Future()
+
+        def run():
+            try:
+                self.fetches += 1
+                status, body = fetch()
+                future.set_result(self.save(key, status, body))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.inflight.pop(key, None)
+
+        if background:
+            self.refresher.submit(run)
+        else:
+            run()
+        return future
+
+    async def aget(self, key, fetch):
+        """
+        get() for asyncio code: fetch is a coroutine function, and the single
+        flight and background refresh run as tasks on the event loop. Memory
+        hits stay on the loop; the SQLite reads and writes go to a thread.
+        """
+        entry = self.memory.get(key, count=False)
+        if entry is None:
+            entry = await asyncio.to_thread(self.lookup, key)
+        if entry is not None:
+            age = time.time() - entry[2]
+            if age < self.lifetime(entry[0]):
+                self.hits += 1
+                return entry[0], entry[1]
+            if age < self.lifetime(entry[0]) + self.stale_ttl:
+                self.stale_hits += 1
+                self.afetch_once(key, fetch)
+                return entry[0], entry[1]
+
+        self.misses += 1
+        try:
+            # shield: one caller giving up mustn't cancel the fetch the others are waiting on
+            return (await asyncio.shield(self.afetch_once(key, fetch)))[:2]
+        except Exception:
+            if entry is not None:
+                return entry[0], entry[1]
+            raise
+
+    def afetch_once(self, key, fetch):
+        task = self.async_inflight.get(key)
+        if task is None:
+            task = self.async_inflight[key] = asyncio.ensure_future(self.afetch(key, fetch))
+            task.add_done_callback(lambda done: self.async_inflight.pop(key, None))
+            # A background refresh that fails has nobody awaiting it; don't log that as unhandled
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
+
+    async def afetch(self, key, fetch):
+        self.fetches += 1
+        status, body = await fetch()
+        return await asyncio.to_thread(self.save, key, status, body)
+
+    def stats(self):
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': self.memory.stats()['entries'],
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'upstream_fetches': self.fetches,
+            'hit_rate': round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+        }
+
+
+class SQLiteCache(BaseCache):
+    """
+    flask_caching backend (CACHE_TYPE = 'caching.SQLiteCache') that keeps
+    pickled values in one SQLite file, so every worker process on the host
+    shares a single copy: warmed once, invalidated once.
+
+    Bounded by CACHE_THRESHOLD entries and CACHE_SQLITE_MAX_BYTES. Past
+    either, expired entries go first, then the least recently read ones.
+    The table is only counted every RECOUNT_EVERY sets; in between, each
+    process adds its own writes to the last count.
+    inc()/dec() run in one IMMEDIATE transaction, so they are atomic across
+    processes and work as shared version counters.
+    """
+    # Reads only refresh an entry's access time once this many seconds have passed
+    ACCESS_RESOLUTION = 30
+    RECOUNT_EVERY = 100
+
+    def __init__(self, path, default_timeout=300, threshold=500, max_bytes=64 * 1024 * 1024,
+                 ignore_delete_many_errors=False):
+        super().__init__(default_timeout=default_timeout, ignore_delete_many_errors=ignore_delete_many_errors)
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        # [entries, bytes, sets since the last real count]; None until the first set counts
+        self.estimate = None
+        self.estimate_lock = threading.Lock()
+
+        self.connection().execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires REAL NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.connection().execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config.get('CACHE_SQLITE_PATH') or os.path.join(app.root_path, 'app_cache.db'),
+            threshold=config['CACHE_THRESHOLD'],
+            max_bytes=config.get('CACHE_SQLITE_MAX_BYTES', 64 * 1024 * 1024),
+        )
+        return cls(*args, **kwargs)
+
+    def connection(self):
+        # One autocommit connection per thread, reopened after a fork
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA mmap_size = 67108864')
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    def get(self, key):
+        now = time.time()
+        conn = self.connection()
+        row = conn.execute('SELECT value, accessed FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)',
+                           (key, now)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ACCESS_RESOLUTION:
+            try:
+                conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            except sqlite3.OperationalError:
+                # Busy: recency is only a hint for eviction, not worth waiting for
+                pass
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=None):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn = self.connection()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                     (key, blob, self.expiry(timeout), len(blob), time.time()))
+        self.wrote(conn, len(blob))
+        return True
+
+    def add(self, key, value, timeout=None):
+        # Only writes when the key is missing or expired
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        cursor = self.connection().execute("""
+            INSERT INTO cache (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires,
+                size = excluded.size, accessed = excluded.accessed
+            WHERE cache.expires != 0 AND cache.expires <= ?
+        """, (key, blob, self.expiry(timeout), len(blob), now, now))
+        if cursor.rowcount > 0:
+            self.wrote(self.connection(), len(blob))
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        return self.connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has(self, key):
+        row = self.connection().execute('SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)',
+                                        (key, time.time())).fetchone()
+        return row is not None
+
+    def clear(self):
+        self.connection().execute('DELETE FROM cache')
+        with self.estimate_lock:
+            self.estimate = None
+        return True
+
+    def inc(self, key, delta=1):
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value, expires FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)',
+                               (key, time.time())).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn.execute('INSERT OR REPLACE INTO cache (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                         (key, blob, row[1] if row else self.expiry(None), len(blob), time.time()))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+    def wrote(self, conn, size):
+        # A replaced key counts twice until the next recount: the estimate only errs high
+        with self.estimate_lock:
+            if self.estimate is None or self.estimate[2] >= self.RECOUNT_EVERY:
+                self.estimate = [*self.count(conn), 0]
+            else:
+                self.estimate[0] += 1
+                self.estimate[1] += size
+                self.estimate[2] += 1
+            over = self.estimate[0] > self.threshold or self.estimate[1] > self.max_bytes
+        if over:
+            self.prune(conn)
+
+    def count(self, conn):
+        return conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+
+    def prune(self, conn):
+        count, size = self.count(conn)
+        if count > self.threshold or size > self.max_bytes:
+            count, size = self.evict(conn)
+        with self.estimate_lock:
+            self.estimate = [count, size, 0]
+
+    def evict(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires != 0 AND expires <= ?', (time.time(),))
+        count, size = self.count(conn)
+        while count > self.threshold or size > self.max_bytes:
+            # Least recently read tenth at a time, so a burst of sets doesn't evict one row per statement
+            conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                         (max(1, count // 10, count - self.threshold),))
+            count, size = self.count(conn)
+        return count, size
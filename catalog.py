@@ -0,0 +1,481 @@
+import base64
+import json
+import sqlite3
+import zlib
+
+# --- CONFIGURATION ---
+ROW_LIMIT = 20
+
+
+# --- GENRE TAG INDEX ---
+# movies.genre stores tags as a comma separated string ("trending,action"),
+# which can only be searched with LIKE '%tag%' (a full table scan that also
+# matches "action" inside "action_comedy"). movie_genres keeps one row per
+# (title, tag) so every browse row becomes an indexed lookup.
+
+def create_genre_table(conn, table='movie_genres'):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tmdb_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            UNIQUE(tag, tmdb_id, media_type)
+        )
+    """)
+
+
+def create_genre_index(conn):
+    create_genre_table(conn)
+    # (tag, id) walks a row in the order titles were tagged, so LIMIT 20 never sorts
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_movie_genres_row ON movie_genres(tag, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_movie_genres_title ON movie_genres(tmdb_id, media_type)')
+
+
+def split_genres(genre):
+    if not genre:
+        return []
+    return [tag.strip() for tag in genre.split(',') if tag.strip()]
+
+
+def add_genre_tags(conn, tmdb_id, media_type, tags):
+    conn.executemany('INSERT OR IGNORE INTO movie_genres (tmdb_id, media_type, tag) VALUES (?, ?, ?)',
+                     [(tmdb_id, media_type, tag) for tag in tags])
+
+
+def rebuild_genre_index(conn):
+    """
+    Rebuilds movie_genres from the comma separated movies.genre column.
+    """
+    create_genre_index(conn)
+    conn.execute('DELETE FROM movie_genres')
+
+    rows = conn.execute('SELECT tmdb_id, media_type, genre FROM movies ORDER BY id').fetchall()
+    conn.executemany('INSERT OR IGNORE INTO movie_genres (tmdb_id, media_type, tag) VALUES (?, ?, ?)',
+                     [(row[0], row[1], tag) for row in rows for tag in split_genres(row[2])])
+
+    # The old index on the raw genre string can never serve a LIKE '%...%' lookup
+    conn.execute('DROP INDEX IF EXISTS idx_movie_genre')
+    conn.commit()
+    return conn.execute('SELECT COUNT(*) FROM movie_genres').fetchone()[0]
+
+
+# --- ROW QUERIES ---
+
+def fetch_row(conn, tag, limit=ROW_LIMIT, media_type=None, offset=0, after=None):
+    """
+    Returns the titles tagged with `tag`, in the order they were tagged.
+    Pass `after` (a row_position from a previous page) for keyset paging.
+    """
+    query = """
+        SELECT movies.*, movie_genres.tag AS row_tag, movie_genres.id AS row_position
+        FROM movie_genres
+        JOIN movies ON movies.tmdb_id = movie_genres.tmdb_id
+        AND movies.media_type = movie_genres.media_type
+        WHERE movie_genres.tag = ?
+    """
+    params = [tag]
+
+    if media_type:
+        query += ' AND movie_genres.media_type = ?'
+        params.append(media_type)
+
+    if after is not None:
+        query += ' AND movie_genres.id > ?'
+        params.append(after)
+
+    query += ' ORDER BY movie_genres.id'
+
+    if limit is not None:
+        query += ' LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+
+    return conn.execute(query, params).fetchall()
+
+
+# --- BROWSE ROWS ---
+# Every row the browse pages (/, /movies, /tvshows, /new-popular) show:
+# name -> (tag, media_type filter, length). The pages pick from one shared
+# dict built by materialize_rows(), which the app caches per catalog version.
+
+TOP10_LIMIT = 10
+
+BROWSE_ROWS = {
+    'popular': ('popular', None, ROW_LIMIT),
+    'trending': ('trending', None, ROW_LIMIT),
+    'new_releases': ('new_releases', None, ROW_LIMIT),
+    'anime': ('anime', None, ROW_LIMIT),
+    'us_tv_drama': ('us_tv_drama', None, ROW_LIMIT),
+    'bollywood': ('bollywood', None, ROW_LIMIT),
+    'scifi_horror': ('scifi_horror', None, ROW_LIMIT),
+    'kdrama': ('kdrama', None, ROW_LIMIT),
+    'action': ('action', None, ROW_LIMIT),
+    'top10_movies': ('trending', 'movie', TOP10_LIMIT),
+    'top10_tv': ('us_tv_drama', 'tv', TOP10_LIMIT),
+}
+
+
+def materialize_rows(conn, rows=BROWSE_ROWS):
+    """
+    Builds every row in one statement: a UNION ALL of one LIMITed seek on
+    idx_movie_genres_row per row. (A ROW_NUMBER() window over the same tags
+    would have to read every title in them before it could cut each row.)
+    Returns {name: [dict, ...]} in row order.
+    """
+    branches, params = [], []
+    for name, (tag, media_type, limit) in rows.items():
+        media_filter = 'AND movie_genres.media_type = ?' if media_type else ''
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT ? AS row_name, movies.*, movie_genres.tag AS row_tag, movie_genres.id AS row_position
+                FROM movie_genres
+                JOIN movies ON movies.tmdb_id = movie_genres.tmdb_id
+                AND movies.media_type = movie_genres.media_type
+                WHERE movie_genres.tag = ? {media_filter}
+                ORDER BY movie_genres.id
+                LIMIT ?
+            )
+        """)
+        params.extend([name, tag] + ([media_type] if media_type else []) + [limit])
+
+    materialized = {name: [] for name in rows}
+    for row in conn.execute(' UNION ALL '.join(branches), params):
+        movie = dict(row)
+        materialized[movie.pop('row_name')].append(movie)
+    return materialized
+
+
+# --- CURSORS ---
+# A cursor is the (tag, row_position, tmdb_id) of the last title a client has
+# seen. The next page is a range seek on idx_movie_genres_row, so page 500
+# costs the same as page 1. Clients should treat the token as opaque.
+
+def encode_cursor(tag, row_position, tmdb_id):
+    raw = f"{tag}:{row_position}:{tmdb_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, tag):
+    """
+    Returns the row_position stored in `token`, or raises ValueError if the
+    token is malformed or belongs to another row.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_tag, row_position, _ = base64.urlsafe_b64decode(padded).decode().rsplit(':', 2)
+        row_position = int(row_position)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+    if cursor_tag != tag:
+        raise ValueError('Cursor belongs to another row')
+    return row_position
+
+
+def row_cursor(rows):
+    """
+    Cursor pointing just past the last of `rows` (None if there are none).
+    """
+    if not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last['row_tag'], last['row_position'], last['tmdb_id'])
+
+
+# --- FEATURED HERO ---
+# The big title on top of /, /movies and /tvshows. Instead of a random pick per
+# request, every title in a page's pool gets a turn of fixed length, in an
+# order that only depends on the pool, so every worker process shows the same
+# hero (and the browser already has its backdrop) until the turn is over.
+
+HERO_MIN_VOTE = 7.0
+HERO_MIN_POOL = 5
+
+
+def hero_pool(rows, min_vote=HERO_MIN_VOTE):
+    """
+    Titles from `rows` (browse rows) that make a good hero: a logo, a
+    backdrop and a rating of at least min_vote. Fewer than HERO_MIN_POOL of
+    those are topped up with the best rated of the rest that have a backdrop,
+    so a thin catalog still rotates.
+    """
+    titles, seen = [], set()
+    for row in rows:
+        for movie in row:
+            key = (movie['media_type'], movie['tmdb_id'])
+            if movie['backdrop_path'] and key not in seen:
+                seen.add(key)
+                titles.append(movie)
+    eligible = [movie for movie in titles if movie['logo_path'] and (movie['vote_average'] or 0) >= min_vote]
+    rest = sorted((movie for movie in titles if movie not in eligible), key=lambda movie: -(movie['vote_average'] or 0))
+    return eligible + rest[:max(0, HERO_MIN_POOL - len(eligible))]
+
+
+def hero_rotation(pool, slot=0):
+    # The pool shuffled by a hash of each title, the same in every process and after restarts.
+    # Other slots get other orders.
+    return sorted(pool, key=lambda movie: zlib.crc32(f"{slot}:{movie['media_type']}:{movie['tmdb_id']}".encode()))
+
+
+def pick_hero(rotation, turn):
+    # Consecutive turns walk the whole rotation before a title comes back
+    return rotation[turn % len(rotation)] if rotation else None
+
+
+# --- FULL TEXT SEARCH ---
+# Three FTS5 indexes over movies, all external content tables (no duplicated
+# text) kept in sync by triggers:
+#   movies_fts          title + overview, finds any title mentioning the words
+#   movies_fts_title    titles only, small doclists so bm25 stays cheap
+#   movies_fts_trigram  title character trigrams, for typo tolerant matching
+# bm25 computes IDF by walking every doclist in the query, which on the dense
+# overview doclists ("the*") costs several ms, so only title hits are bm25
+# ranked and overview hits just fill the remaining slots by rating.
+
+SEARCH_RATING_WEIGHT = 0.25
+
+# Only the first SEARCH_CANDIDATES matches (in seed order, i.e. the most
+# popular titles first) get scored. Without a cap a one or two letter prefix
+# scores most of the catalog on every keystroke.
+SEARCH_CANDIDATES = 400
+
+SEARCH_INDEXES = {
+    'movies_fts': ('title, overview', "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6', detail=none"),
+    'movies_fts_title': ('title', "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6'"),
+    'movies_fts_trigram': ('title', "tokenize='trigram'"),
+}
+
+
+def create_search_index(conn):
+    inserts, deletes = [], []
+    for table, (columns, options) in SEARCH_INDEXES.items():
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                {columns}, content='movies', content_rowid='id', {options}
+            )
+        """)
+        new_values = ', '.join(f'new.{col.strip()}' for col in columns.split(','))
+        old_values = ', '.join(f'old.{col.strip()}' for col in columns.split(','))
+        inserts.append(f"INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new_values});")
+        deletes.append(f"INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values});")
+
+    # One execute() per trigger rather than executescript(), which would commit
+    # first and break seed.py's swap out of its transaction
+    inserts, deletes = '\n'.join(inserts), '\n'.join(deletes)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+            {inserts}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+            {deletes}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, overview ON movies BEGIN
+            {deletes}
+            {inserts}
+        END
+    """)
+
+
+def drop_search_index(conn):
+    for trigger in ('movies_fts_insert', 'movies_fts_delete', 'movies_fts_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    for table in SEARCH_INDEXES:
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def rebuild_search_index(conn):
+    drop_search_index(conn)
+    create_search_index(conn)
+    fill_search_index(conn)
+    optimize_search_index(conn)
+    conn.commit()
+    return conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+
+def fill_search_index(conn):
+    # Reindexes every title currently in movies
+    for table in SEARCH_INDEXES:
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def optimize_search_index(conn):
+    # Merges the b-tree segments left behind by many small trigger inserts
+    for table in SEARCH_INDEXES:
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+
+
+def search_words(query):
+    # Anything that isn't a letter or digit would be FTS5 query syntax, so drop it
+    cleaned = ''.join(ch if ch.isalnum() else ' ' for ch in query.lower())
+    return cleaned.split()
+
+
+def ranked_hits(conn, table, match, limit, exclude=(), rank=True):
+    score = f'bm25({table})' if rank else '0'
+    placeholders = ', '.join('?' for _ in exclude)
+    skip = f'AND movies.id NOT IN ({placeholders})' if exclude else ''
+    return conn.execute(f"""
+        SELECT movies.* FROM (
+            SELECT rowid, {score} AS score FROM {table}
+            WHERE {table} MATCH ?
+            LIMIT ?
+        ) AS hits
+        JOIN movies ON movies.id = hits.rowid
+        WHERE 1 {skip}
+        ORDER BY hits.score - COALESCE(movies.vote_average, 0) * ?
+        LIMIT ?
+    """, (match, SEARCH_CANDIDATES, *exclude, SEARCH_RATING_WEIGHT, limit)).fetchall()
+
+
+def search_titles(conn, query, limit=ROW_LIMIT, fuzzy=False):
+    """
+    Typeahead search: titles matching every word first (bm25 blended with
+    vote_average), then titles whose overview mentions the words.
+    With fuzzy=True, falls back to trigram matching when nothing matches.
+    """
+    words = search_words(query)
+    if not words:
+        return []
+
+    results = prefix_search(conn, words, limit)
+    if results or not fuzzy:
+        return results
+    return trigram_search(conn, words, limit)
+
+
+def prefix_search(conn, words, limit=ROW_LIMIT):
+    # Only the last word is still being typed. Completed words match exactly,
+    # which lets FTS5 seek their doclists instead of merging every prefix term.
+    match = ' AND '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+    results = ranked_hits(conn, 'movies_fts_title', match, limit)
+
+    if len(results) < limit:
+        seen = [movie['id'] for movie in results]
+        results += ranked_hits(conn, 'movies_fts', match, limit - len(results), exclude=seen, rank=False)
+    return results
+
+
+def trigram_search(conn, words, limit=ROW_LIMIT):
+    # Typo tolerance: any shared trigram is a candidate, most shared wins
+    trigrams = {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+    if not trigrams:
+        return []
+
+    match = ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+    return ranked_hits(conn, 'movies_fts_trigram', match, limit)
+
+
+# --- TITLE DETAILS ---
+# What the info modal and the trailer player need for a title, resolved once
+# by seed.py instead of asked of TMDB on every click. Kept beside movies (not
+# in it) so a catalog refresh swap leaves it alone. A row whose trailer_key is
+# NULL means TMDB has no trailer; no row at all means nobody looked yet.
+
+def create_details_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS title_details (
+            tmdb_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            trailer_key TEXT,
+            runtime INTEGER,
+            genres TEXT,
+            cast_names TEXT,
+            fetched_at INTEGER,
+            PRIMARY KEY (tmdb_id, media_type)
+        )
+    """)
+
+
+def details_row(tmdb_id, media_type, details, fetched_at):
+    # Parameters for save_details(), from tmdb.trim_details()
+    return (tmdb_id, media_type, details['trailer_key'], details['runtime'],
+            json.dumps(details['genres']), json.dumps(details['cast']), fetched_at)
+
+
+def save_details(conn, rows):
+    conn.executemany("""
+        INSERT OR REPLACE INTO title_details (tmdb_id, media_type, trailer_key, runtime, genres, cast_names, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def get_details(conn, tmdb_id, media_type):
+    """
+    The catalog row plus its details, or None if either is missing.
+    """
+    try:
+        return conn.execute("""
+            SELECT movies.*, title_details.trailer_key, title_details.runtime,
+                   title_details.genres AS detail_genres, title_details.cast_names
+            FROM title_details
+            JOIN movies ON movies.tmdb_id = title_details.tmdb_id AND movies.media_type = title_details.media_type
+            WHERE title_details.tmdb_id = ? AND title_details.media_type = ?
+        """, (tmdb_id, media_type)).fetchone()
+    except sqlite3.OperationalError:
+        # Database from before title_details existed
+        return None
+
+
+def details_json(row):
+    """
+    Shapes a get_details() row like the TMDB details response the info modal
+    reads (title, images.logos, genres, credits.cast, ...).
+    """
+    return {
+        'id': row['tmdb_id'],
+        'title': row['title'],
+        'overview': row['overview'],
+        'backdrop_path': row['backdrop_path'],
+        'poster_path': row['poster_path'],
+        'release_date': row['release_date'],
+        'vote_average': row['vote_average'],
+        'runtime': row['runtime'],
+        'genres': [{'name': name} for name in json.loads(row['detail_genres'] or '[]')],
+        'credits': {'cast': [{'name': name} for name in json.loads(row['cast_names'] or '[]')]},
+        'images': {'logos': [{'file_path': row['logo_path']}] if row['logo_path'] else []},
+    }
+
+
+def basic_details_json(conn, tmdb_id, media_type):
+    # details_json() from the catalog row alone, for when TMDB is down; None if it isn't in the catalog
+    movie = conn.execute('SELECT * FROM movies WHERE tmdb_id = ? AND media_type = ?',
+                         (tmdb_id, media_type)).fetchone()
+    if movie is None:
+        return None
+    return details_json({**dict(movie), 'runtime': None, 'detail_genres': None, 'cast_names': None})
+
+
+# --- CATALOG VERSION ---
+# A counter bumped whenever titles are added or refreshed (seed.py, a title
+# saved to My List that wasn't in the catalog, migrations). Caches in the app
+# key on it, so anything cached before a refresh is dropped as soon as it
+# changes.
+
+def create_catalog_meta(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+
+
+def get_catalog_version(conn):
+    try:
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        # Database from before catalog_meta existed
+        return 0
+    return row[0] if row else 0
+
+
+def bump_catalog_version(conn):
+    create_catalog_meta(conn)
+    conn.execute("""
+        INSERT INTO catalog_meta (key, value) VALUES ('version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
@@ -0,0 +1,195 @@
+import os
+import queue
+import sqlite3
+import time
+from flask import g, has_app_context
+import metrics
+
+# --- CONFIGURATION ---
+BASEDIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.environ.get('NETFLIX_DB', os.path.join(BASEDIR, 'netflix.db'))
+
+# Set NETFLIX_DB_POOL=0 to fall back to one fresh connection per call (used by the benchmarks)
+POOL_ENABLED = os.environ.get('NETFLIX_DB_POOL', '1') != '0'
+POOL_MAX_IDLE = 16
+ITER_CHUNK = 256  # rows a timed cursor reads at a time when iterated
+
+PRAGMAS = [
+    'PRAGMA synchronous = NORMAL',   # safe with WAL, skips an fsync per commit
+    'PRAGMA cache_size = -16000',    # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',  # read pages straight from a 256 MB mapping
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+]
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Times each statement from execute() until its rows have been read and
+    reports it to metrics.record_query() once the cursor is done with it:
+    on the next execute(), close(), or when it's dropped, which is how most
+    `conn.execute(...).fetchall()` cursors end.
+    """
+    statement = None
+
+    def execute(self, sql, parameters=()):
+        self.finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self.statement, self.parameters, self.rows = sql, parameters, 0
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self.statement, self.parameters, self.rows = sql, None, 0
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.elapsed += time.perf_counter() - started
+        self.rows += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.elapsed += time.perf_counter() - started
+        self.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        # `for row in cursor` reads ITER_CHUNK rows per timed fetchmany(): lazy, so a batch
+        # job walking a big table never holds it all, without a Python __next__ per row
+        while True:
+            rows = self.fetchmany(ITER_CHUNK)
+            if not rows:
+                return
+            yield from rows
+
+    def finish(self):
+        if self.statement is not None:
+            rows = self.rows if self.description else max(self.rowcount, 0)
+            metrics.record_query(self.statement, self.elapsed, rows, self.parameters)
+            self.statement = None
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def __del__(self):
+        self.finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    # Every statement run through it is timed (see TimedCursor)
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# NETFLIX_METRICS=0 leaves out the SQL timing along with the rest of metrics.py
+Connection = TimedConnection if metrics.ENABLED else sqlite3.Connection
+
+
+class PooledConnection(Connection):
+    """
+    A connection whose close() hands it back to the pool instead of closing it,
+    so the existing `conn.close()` calls in the routes stay correct.
+    """
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
+
+def connect(readonly=False, factory=Connection):
+    conn = sqlite3.connect(DB_PATH, factory=factory, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+
+    # WAL lets readers keep going while seed.py or a route is writing
+    conn.execute('PRAGMA journal_mode = WAL')
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, readonly=False, max_idle=POOL_MAX_IDLE):
+        self.readonly = readonly
+        self.idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return connect(self.readonly, factory=PooledConnection)
+
+    def release(self, conn):
+        conn.close()
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close_for_real()
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close_for_real()
+            except queue.Empty:
+                return
+
+
+pools = {False: ConnectionPool(readonly=False), True: ConnectionPool(readonly=True)}
+
+
+def get_connection(readonly=False):
+    """
+    Returns this app context's connection, checking one out of the pool the
+    first time it is asked for. Read-only connections refuse any write.
+    """
+    if not POOL_ENABLED:
+        conn = sqlite3.connect(DB_PATH, factory=Connection)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    if not has_app_context():
+        return connect(readonly)
+
+    key = '_db_ro' if readonly else '_db_rw'
+    conn = g.get(key)
+    if conn is None:
+        conn = pools[readonly].acquire()
+        setattr(g, key, conn)
+    return conn
+
+
+def release_connections(exception=None):
+    for readonly, key in ((True, '_db_ro'), (False, '_db_rw')):
+        conn = g.pop(key, None)
+        if conn is not None:
+            pools[readonly].release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_connections)
@@ -0,0 +1,202 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import catalog
+import db
+import tmdb
+
+# --- BACKGROUND ENRICHMENT ---
+# A title saved to My List that isn't in the catalog yet (found through search,
+# say) goes onto enrich_jobs instead of being fetched while the user waits.
+# A worker thread claims due jobs in batches, fetches them from TMDB with no
+# transaction open, and writes a whole batch in one short one. A claim is a
+# lease: if the process dies mid-fetch the job becomes due again on its own.
+
+BATCH_SIZE = 20
+WORKERS = 4
+POLL_INTERVAL = 5
+LEASE = 120
+MAX_ATTEMPTS = 6
+RETRY_BASE = 10
+RETRY_MAX = 3600
+
+
+def create_jobs_table(conn):
+    # next_attempt_at is NULL once a job has given up (the title shows as unavailable)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS enrich_jobs (
+            tmdb_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL,
+            last_error TEXT,
+            created_at INTEGER,
+            PRIMARY KEY (tmdb_id, media_type)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrich_jobs_due ON enrich_jobs(next_attempt_at)")
+
+
+def enqueue(conn, titles):
+    """
+    Queues the (media_type, tmdb_id) pairs that aren't in the catalog yet.
+    Runs inside the caller's transaction; returns how many were queued.
+    """
+    now = time.time()
+    queued = 0
+    for media_type, tmdb_id in titles:
+        cursor = conn.execute("""
+            INSERT INTO enrich_jobs (tmdb_id, media_type, next_attempt_at, created_at)
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM movies WHERE tmdb_id = ? AND media_type = ?)
+            ON CONFLICT(tmdb_id, media_type) DO UPDATE SET next_attempt_at = excluded.next_attempt_at, attempts = 0
+            WHERE enrich_jobs.next_attempt_at IS NULL
+        """, (tmdb_id, media_type, now, int(now), tmdb_id, media_type))
+        queued += cursor.rowcount
+    return queued
+
+
+def claim_batch(conn, limit=BATCH_SIZE, lease=LEASE):
+    # Leases up to `limit` due jobs to the caller; returns [(media_type, tmdb_id, attempts)]
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("""
+            UPDATE enrich_jobs SET next_attempt_at = ?, attempts = attempts + 1
+            WHERE (tmdb_id, media_type) IN (
+                SELECT tmdb_id, media_type FROM enrich_jobs
+                WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?
+            )
+            RETURNING media_type, tmdb_id, attempts
+        """, (now + lease, now, limit)).fetchall()
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return [tuple(row) for row in rows]
+
+
+def retry_delay(attempts):
+    return random.uniform(0.5, 1) * min(RETRY_MAX, RETRY_BASE * 2 ** attempts)
+
+
+def movie_row(media_type, tmdb_id, data):
+    return (tmdb_id, data.get('title') or data.get('name'), data.get('overview'),
+            data.get('poster_path'), data.get('backdrop_path'), tmdb.get_logo(data),
+            data.get('release_date') or data.get('first_air_date'), data.get('vote_average'),
+            media_type, 'user_saved', tmdb.get_real_certification(media_type, data))
+
+
+def fetch_title(client, media_type, tmdb_id):
+    """
+    ('ok', details), ('missing', reason) when TMDB doesn't know the title, or
+    ('retry', reason) when it may work later.
+    """
+    try:
+        response = client.get(f"/{media_type}/{tmdb_id}", **tmdb.details_params(media_type))
+    except Exception as e:
+        return 'retry', type(e).__name__
+    if response.status_code == 200:
+        try:
+            return 'ok', response.json()
+        except ValueError:
+            # A truncated or garbled body counts as a failed attempt like any other
+            return 'retry', 'invalid JSON from TMDB'
+    if response.status_code == 404:
+        return 'missing', 'not found on TMDB'
+    return 'retry', f"HTTP {response.status_code}"
+
+
+def save_batch(conn, results):
+    """
+    Writes one claimed batch: catalog rows for the titles that came back,
+    new retry times (or give up) for the rest. Returns how many were added.
+    """
+    now = time.time()
+    movies, details, done, failed = [], [], [], []
+    for media_type, tmdb_id, attempts, outcome, payload in results:
+        if outcome == 'ok':
+            movies.append(movie_row(media_type, tmdb_id, payload))
+            details.append(catalog.details_row(tmdb_id, media_type, tmdb.trim_details(payload), int(now)))
+            done.append((tmdb_id, media_type))
+        else:
+            give_up = outcome == 'missing' or attempts >= MAX_ATTEMPTS
+            next_attempt = None if give_up else now + retry_delay(attempts)
+            failed.append((next_attempt, payload, tmdb_id, media_type))
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("""
+            INSERT OR IGNORE INTO movies
+            (tmdb_id, title, overview, poster_path, backdrop_path, logo_path, release_date, vote_average,
+             media_type, genre, age_rating)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, movies)
+        conn.executemany('INSERT OR IGNORE INTO movie_genres (tmdb_id, media_type, tag) VALUES (?, ?, ?)',
+                         [(tmdb_id, media_type, 'user_saved') for tmdb_id, media_type in done])
+        catalog.save_details(conn, details)
+        conn.executemany('DELETE FROM enrich_jobs WHERE tmdb_id = ? AND media_type = ?', done)
+        conn.executemany("""
+            UPDATE enrich_jobs SET next_attempt_at = ?, last_error = ? WHERE tmdb_id = ? AND media_type = ?
+        """, failed)
+        if movies:
+            catalog.bump_catalog_version(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(movies)
+
+
+def run_batch(conn, client, limit=BATCH_SIZE, pool=None):
+    # Claims, fetches (on `pool` if given) and saves one batch; returns how many jobs it claimed
+    jobs = claim_batch(conn, limit)
+    if jobs:
+        fetch = lambda job: (*job, *fetch_title(client, job[0], job[1]))
+        results = list(pool.map(fetch, jobs) if pool else map(fetch, jobs))
+        save_batch(conn, results)
+    return len(jobs)
+
+
+class EnrichmentWorker:
+    """
+    One daemon thread draining enrich_jobs a batch at a time, with WORKERS
+    threads fetching each batch from TMDB. It starts on the first wake() in
+    each process (so nothing runs before a forking server forks) and then
+    polls every POLL_INTERVAL seconds for retries that come due.
+    """
+    def __init__(self, client, workers=WORKERS, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.client = client
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.pid = None
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def wake(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.pid = os.getpid()
+                    threading.Thread(target=self.run, name='enrichment', daemon=True).start()
+        self.wakeup.set()
+
+    def run(self):
+        conn = db.connect()
+        conn.isolation_level = None  # claim_batch / save_batch open their own transactions
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enrich')
+        while True:
+            try:
+                claimed = run_batch(conn, self.client, self.batch_size, pool)
+            except Exception as e:
+                # Nothing may end this thread: the claimed jobs come due again when their lease runs out
+                print(f"Enrichment batch failed: {type(e).__name__}: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            if not claimed:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
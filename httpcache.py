@@ -0,0 +1,195 @@
+import functools
+import gzip
+import hashlib
+import zlib
+from flask import make_response, request
+from werkzeug.http import quote_etag
+from werkzeug.wrappers import Response
+from caching import LRUCache
+
+try:
+    import brotli  # comes with Flask-Compress on CPython
+except ImportError:
+    brotli = None
+
+# --- HTTP CACHING ---
+# Catalog JSON (rows, search, title info) only changes when the catalog
+# version does, so its ETag is the version plus the URL: a revalidation that
+# still matches gets a 304 before the view runs or SQLite is opened. Bodies
+# are kept per ETag already compressed for each encoding, so a hot row is
+# serialized and gzipped/brotli'd once per catalog version, not per request.
+# Everything else that is per user (pages, My List) gets a content ETag and
+# "private, no-cache": the browser may keep it but must revalidate.
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+MIN_COMPRESS_SIZE = 500  # same default as Flask-Compress; smaller bodies go out as they are
+
+
+def make_etag(*parts):
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+
+
+def encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def choose_encoding():
+    # None means identity
+    return request.accept_encodings.best_match(encodings())
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class HTTPCache:
+    """
+    cached(max_age, private) wraps a view (JSON or an HTML fragment) whose
+    output depends only on the catalog version and the request URL. `version` is called per request
+    and must be cheap (app.get_catalog_version polls at most once a second).
+    A view can opt a single response out by setting its own Cache-Control;
+    only 200s are cached.
+    """
+    def __init__(self, version, max_entries=4096, max_bytes=32 * 1024 * 1024, enabled=True):
+        self.version = version
+        # Plain LRU, emptied on a version bump: every ETag embeds the version, so old bodies are dead
+        self.bodies = LRUCache(max_entries, max_bytes, admission=False)
+        self.bodies_version = None
+        self.enabled = enabled
+        self.not_modified = 0
+
+    def cached(self, max_age, private=False):
+        cache_control = f"{'private' if private else 'public'}, max-age={max_age}"
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+
+                etag = self.current_etag(request.path, request.args.items(multi=True))
+                # Weak: one ETag covers the identity, gzip and br forms of the same body
+                headers = {'ETag': quote_etag(etag, weak=True), 'Cache-Control': cache_control}
+
+                if request.if_none_match.contains_weak(etag):
+                    self.not_modified += 1
+                    return Response(status=304, headers=headers)
+
+                encoding = choose_encoding()
+                entry = self.cached_body(etag, encoding)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or 'Cache-Control' in response.headers:
+                        return response
+                    entry = self.store(etag, encoding, response.get_data(), response.mimetype)
+
+                data, content_encoding, mimetype = entry
+                response = Response(data, mimetype=mimetype, headers=headers)
+                if content_encoding:
+                    # Flask-Compress leaves responses that already have a Content-Encoding alone
+                    response.headers['Content-Encoding'] = content_encoding
+                response.vary.add('Accept-Encoding')
+                return response
+            return wrapper
+        return decorator
+
+    def current_etag(self, path, args):
+        # The ETag for a URL at the current catalog version; a new version empties the body cache
+        version = self.version()
+        if version != self.bodies_version:
+            self.bodies.clear()
+            self.bodies_version = version
+        return make_etag(version, path, sorted(args))
+
+    def cached_body(self, etag, encoding):
+        # (body, content encoding, mimetype) stored for etag, compressed for `encoding` if need be; None if there's none
+        entry = self.bodies.get((etag, encoding))
+        if entry is None:
+            identity = self.bodies.peek((etag, None))
+            if identity is not None:
+                entry = self.encode(etag, identity, encoding)
+        return entry
+
+    def store(self, etag, encoding, data, mimetype):
+        identity = (data, None, mimetype)
+        self.bodies.put((etag, None), identity, size=len(data))
+        return self.encode(etag, identity, encoding)
+
+    def encode(self, etag, identity, encoding):
+        if not encoding or len(identity[0]) < MIN_COMPRESS_SIZE:
+            return identity
+        entry = (compress(identity[0], encoding), encoding, identity[2])
+        self.bodies.put((etag, encoding), entry, size=len(entry[0]))
+        return entry
+
+    def stats(self):
+        stats = self.bodies.stats()
+        stats['not_modified'] = self.not_modified
+        return stats
+
+
+def compress_stream(chunks, encoding):
+    # Flushes after every chunk, so each reaches the browser as soon as it's rendered
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            yield compressor.process(chunk.encode()) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def coalesce(chunks, min_size):
+    # Jinja yields every bit of markup separately; group them into fewer, larger writes
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= min_size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def streamed(chunks, min_chunk=4096):
+    """
+    Response for a page rendered in pieces (flask.stream_template). It is
+    compressed here rather than by Flask-Compress, whose stream compressor
+    holds everything back until its buffer fills, which would undo the point
+    of streaming. Per user, so "private, no-cache" and no ETag.
+    """
+    encoding = choose_encoding()
+    chunks = coalesce(chunks, min_chunk)
+    response = Response(compress_stream(chunks, encoding) if encoding else chunks, mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def revalidate_private(response):
+    """
+    after_request hook: any other successful GET that didn't set its own
+    Cache-Control is treated as per-user. It gets a weak content ETag, so a
+    browser revalidating an unchanged page gets a 304 (no body, nothing to
+    compress), and "private, no-cache" so shared caches never keep it.
+    """
+    if (request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.is_streamed
+            or 'Cache-Control' in response.headers or response.direct_passthrough):
+        return response
+
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:20], weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
@@ -0,0 +1,291 @@
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from caching import LRUCache
+import catalog
+import db
+import tmdb
+
+try:
+    from PIL import Image  # optional: without it images are cached as TMDB sends them
+except ImportError:
+    Image = None
+
+# --- IMAGE CACHE ---
+# /img/<size>/<file> serves TMDB posters, backdrops and logos from a local
+# disk cache. The first request for an image fetches it from TMDB, scales it
+# to the width we render and re-encodes it as WebP; after that it's a file
+# read. Files are named by the hash of their bytes, so an image stored under
+# several names is kept once. TMDB never changes the image behind a file
+# path, so responses are cacheable forever.
+
+CACHE_DIR = os.environ.get('NETFLIX_IMAGE_CACHE', os.path.join(db.BASEDIR, 'image_cache'))
+
+# Past this the images fetched longest ago are deleted, a tenth at a time, like caching.SQLiteCache.
+# Make it bigger than what seed.py --prefetch-images downloads, or the prefetch evicts itself.
+MAX_BYTES = int(os.environ.get('NETFLIX_IMAGE_CACHE_MB', 2048)) * 1024 * 1024
+
+# Our size name -> (TMDB size to fetch, width to scale down to)
+SIZES = {
+    'w300': ('w300', 300),     # cards and card logos
+    'w500': ('w500', 500),     # hero logos
+    'w780': ('w780', 780),     # hero poster on phones
+    'w1920': ('original', 1920),  # hero backdrop; TMDB originals can be 4K and several MB
+}
+
+WEBP_QUALITY = 80
+MAX_AGE = 365 * 24 * 3600
+FETCH_TIMEOUT = (3.05, 15)
+
+# TMDB file paths are a random name plus an extension; anything else is refused.
+# SVG logos are passed through to TMDB: served from our origin they could run scripts.
+FILE_NAME = re.compile(r'[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp|svg)')
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+
+class ImageUnavailable(Exception):
+    pass
+
+
+def valid_request(size, file_name):
+    return size in SIZES and FILE_NAME.fullmatch(file_name) is not None
+
+
+def upstream_url(size, file_name):
+    return f"{tmdb.IMAGE_URL}/{SIZES[size][0]}/{file_name}"
+
+
+def reencode(data, width):
+    """
+    Scales an image down to `width` (never up) and re-encodes it as WebP,
+    keeping transparency for logos. Returns (bytes, extension).
+    """
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    out = io.BytesIO()
+    image.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue(), 'webp'
+
+
+class ImageCache:
+    """
+    Content-addressed store under `path`: objects/<2 hex>/<sha256>.<ext>,
+    plus a small SQLite index from (size, file) to object. Safe to share
+    between worker processes; concurrent misses for the same image in one
+    process share a single fetch. Holds at most `max_bytes` of objects.
+    """
+    def __init__(self, path=CACHE_DIR, session=None, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stored_bytes = None  # this process's running estimate; prune() counts for real
+        self.session = session or requests.Session()
+        self.memory = LRUCache(max_entries=16384)  # (size, file) -> object name
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.failures = 0
+
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        self.index = sqlite3.connect(os.path.join(path, 'index.db'), check_same_thread=False, timeout=5)
+        self.index_lock = threading.Lock()
+        with self.index_lock:
+            self.index.execute('PRAGMA journal_mode = WAL')
+            self.index.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    size TEXT NOT NULL,
+                    file TEXT NOT NULL,
+                    object TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    fetched_at INTEGER NOT NULL,
+                    PRIMARY KEY (size, file)
+                )
+            """)
+            self.index.execute('CREATE INDEX IF NOT EXISTS idx_images_fetched ON images(fetched_at)')
+            self.index.execute('CREATE INDEX IF NOT EXISTS idx_images_object ON images(object)')
+            self.index.commit()
+
+    def object_path(self, name):
+        return os.path.join(self.path, 'objects', name[:2], name)
+
+    def lookup(self, size, file_name):
+        key = (size, file_name)
+        name = self.memory.get(key, count=False)
+        if name is None:
+            with self.index_lock:
+                row = self.index.execute('SELECT object FROM images WHERE size = ? AND file = ?', key).fetchone()
+            if row is None:
+                return None
+            name = row[0]
+            self.memory.put(key, name)
+        return name
+
+    def store(self, size, file_name, data, ext):
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        path = self.object_path(name)
+        added = not os.path.exists(path)
+        if added:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name first, so a reader never sees half a file
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with self.index_lock:
+            self.index.execute('INSERT OR REPLACE INTO images (size, file, object, bytes, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                               (size, file_name, name, len(data), int(time.time())))
+            self.index.commit()
+            if self.stored_bytes is None:
+                self.stored_bytes = self.total_bytes()
+            elif added:
+                self.stored_bytes += len(data)
+            if self.stored_bytes > self.max_bytes:
+                self.prune()
+        self.memory.put((size, file_name), name)
+        return name
+
+    def total_bytes(self):
+        # Called with index_lock held. An object stored under several names counts once.
+        return self.index.execute(
+            'SELECT COALESCE(SUM(bytes), 0) FROM (SELECT DISTINCT object, bytes FROM images)').fetchone()[0]
+
+    def prune(self):
+        """
+        Called with index_lock held: drops the images fetched longest ago,
+        a tenth at a time, until the cache is under max_bytes again, and
+        deletes the objects nothing points to any more.
+        """
+        self.stored_bytes = self.total_bytes()
+        while self.stored_bytes > self.max_bytes:
+            count = self.index.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+            oldest = self.index.execute('SELECT size, file, object FROM images ORDER BY fetched_at LIMIT ?',
+                                        (max(1, count // 10),)).fetchall()
+            self.index.executemany('DELETE FROM images WHERE size = ? AND file = ?',
+                                   [(size, file_name) for size, file_name, _ in oldest])
+            self.index.commit()
+            for name in {name for _, _, name in oldest}:
+                if self.index.execute('SELECT 1 FROM images WHERE object = ?', (name,)).fetchone() is None:
+                    try:
+                        os.remove(self.object_path(name))
+                    except FileNotFoundError:
+                        pass  # another process pruned it first
+            self.stored_bytes = self.total_bytes()
+
+    def fetch(self, size, file_name):
+        self.fetches += 1
+        try:
+            response = self.session.get(upstream_url(size, file_name), timeout=FETCH_TIMEOUT)
+        except requests.RequestException as e:
+            raise ImageUnavailable(type(e).__name__) from None
+        if response.status_code != 200:
+            raise ImageUnavailable(f"TMDB answered HTTP {response.status_code}")
+
+        data, ext = response.content, file_name.rsplit('.', 1)[1]
+        if Image is not None:
+            try:
+                data, ext = reencode(data, SIZES[size][1])
+            except (OSError, ValueError):
+                pass  # not something Pillow can read; keep TMDB's bytes
+        return self.store(size, file_name, data, ext)
+
+    def get(self, size, file_name):
+        """
+        Object name for the image, fetching it first if needed. Raises
+        ImageUnavailable if TMDB can't provide it.
+        """
+        name = self.lookup(size, file_name)
+        if name is not None and os.path.exists(self.object_path(name)):
+            return name
+
+        key = (size, file_name)
+        with self.lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+
+        if leader:
+            try:
+                future.set_result(self.fetch(size, file_name))
+            except Exception as e:
+                self.failures += 1
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.inflight.pop(key, None)
+        return future.result()
+
+    def stats(self):
+        with self.index_lock:
+            count, total = self.index.execute(
+                'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM (SELECT DISTINCT object, bytes FROM images)').fetchone()
+        return {'objects': count, 'bytes': total, 'fetches': self.fetches, 'failures': self.failures,
+                'webp': Image is not None}
+
+
+def content_type(name):
+    return CONTENT_TYPES[name.rsplit('.', 1)[1]]
+
+
+# --- PREFETCH (seed.py --prefetch-images) ---
+
+# The rows the browse pages pick their hero title from
+HERO_ROWS = ('popular', 'trending', 'us_tv_drama', 'kdrama')
+
+
+def tmdb_file(path):
+    # '/abc.jpg' from the catalog -> 'abc.jpg'
+    return path.lstrip('/') if path else None
+
+
+def catalog_images(conn):
+    """
+    Every (size, file) the site renders: card images for the whole catalog,
+    plus the hero sizes for titles in the hero rows.
+    """
+    wanted = set()
+    for poster, backdrop, logo in conn.execute('SELECT poster_path, backdrop_path, logo_path FROM movies'):
+        wanted.update(('w300', tmdb_file(path)) for path in (poster, backdrop, logo) if path)
+
+    for name, rows in catalog.materialize_rows(conn).items():
+        if name in HERO_ROWS:
+            for movie in rows:
+                for size, path in (('w1920', movie['backdrop_path']), ('w780', movie['poster_path']),
+                                   ('w500', movie['logo_path'])):
+                    if path:
+                        wanted.add((size, tmdb_file(path)))
+    return sorted(key for key in wanted if valid_request(*key) and not key[1].endswith('.svg'))
+
+
+def prefetch(cache, wanted, workers=8):
+    """
+    Makes sure every (size, file) in `wanted` is cached; returns
+    (already cached, fetched, failed).
+    """
+    def warm(key):
+        if cache.lookup(*key) is not None:
+            return 'cached'
+        try:
+            cache.get(*key)
+            return 'fetched'
+        except ImageUnavailable:
+            return 'failed'
+
+    counts = {'cached': 0, 'fetched': 0, 'failed': 0}
+    with ThreadPoolExecutor(workers, thread_name_prefix='image-prefetch') as pool:
+        for n, outcome in enumerate(pool.map(warm, wanted), 1):
+            counts[outcome] += 1
+            if n % 500 == 0:
+                print(f"  {n}/{len(wanted)} images ({counts['fetched']} fetched, {counts['failed']} failed)")
+    return counts['cached'], counts['fetched'], counts['failed']
@@ -0,0 +1,252 @@
+import bisect
+import collections
+import os
+import re
+import sys
+import threading
+import time
+from flask import g, request
+
+# --- METRICS ---
+# Counters and histograms kept in memory per process and exported in the
+# Prometheus text format on /metrics. Recording one request or one SQL
+# statement is a few dict lookups and additions, cheap enough to leave on.
+# NETFLIX_METRICS=0 turns the request hooks and the SQL timing off.
+
+ENABLED = os.environ.get('NETFLIX_METRICS', '1') == '1'
+
+# Statements slower than this are counted, printed once and listed on /api/slow-queries
+SLOW_QUERY_MS = float(os.environ.get('NETFLIX_SLOW_QUERY_MS', 50))
+
+# >0 starts the sampling profiler: every thread's stack is sampled every this many ms
+PROFILE_INTERVAL_MS = float(os.environ.get('NETFLIX_PROFILE_INTERVAL_MS', 0))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+metrics = []
+collectors = []
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = collections.defaultdict(float)
+        self.lock = threading.Lock()
+        metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] += amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f'{self.name}{label_text(self.labels, labels)} {value:g}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self.lock = threading.Lock()
+        metrics.append(self)
+
+    def observe(self, value, *labels):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{label_text(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{label_text(self.labels, labels)} {total:.6f}'
+            yield f'{self.name}_count{label_text(self.labels, labels)} {cumulative}'
+
+
+def collector(fn):
+    """
+    Registers fn() -> iterable of (name, type, help, label names, {label values: value});
+    called on every scrape, for numbers something else already keeps (cache stats, TMDB).
+    """
+    collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.lines())
+    for fn in collectors:
+        for name, kind, help, labels, values in fn():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for label_values, value in sorted(values.items()):
+                if value is not None:
+                    lines.append(f'{name}{label_text(labels, label_values)} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- REQUESTS ---
+
+http_seconds = Histogram('http_request_duration_seconds',
+                         'Time to build a response (for streamed pages, until the first chunk).',
+                         ('endpoint', 'method'))
+http_requests = Counter('http_requests_total', 'Responses sent.', ('endpoint', 'method', 'status'))
+
+
+# Hits and misses for caches that don't keep their own stats (browse rows, row fragments)
+cache_requests = Counter('cache_requests_total', 'Cache lookups by outcome.', ('cache', 'result'))
+
+
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        http_seconds.observe(time.perf_counter() - started, endpoint, request.method)
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+
+def init_app(app):
+    # Call before anything else registers an after_request hook: they run in reverse, so this one runs last
+    if ENABLED:
+        app.before_request(start_timer)
+        app.after_request(record_request)
+    if PROFILE_INTERVAL_MS > 0:
+        profiler.start()
+
+
+# --- SQL ---
+
+sql_seconds = Histogram('sqlite_query_duration_seconds', 'SQLite statements, from execute() until the rows are read.',
+                        ('query',), SQL_BUCKETS)
+sql_rows = Counter('sqlite_query_rows_total', 'Rows returned (or changed) per statement.', ('query',))
+sql_slow = Counter('sqlite_slow_queries_total', f'Statements that took over {SLOW_QUERY_MS:g} ms.', ('query',))
+
+slow_queries = {}  # query -> {'sql', 'count', 'max_ms', 'parameters'}
+normalized = {}
+
+PARAM_LIST = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def normalize(sql):
+    # One label per statement, not per IN (?, ?, ...) length; memoized since the same strings come back
+    query = normalized.get(sql)
+    if query is None:
+        query = PARAM_LIST.sub('?, ...', ' '.join(sql.split()))
+        if len(normalized) > 4096:
+            normalized.clear()
+        normalized[sql] = query
+    return query
+
+
+def record_query(sql, seconds, rows, parameters):
+    query = normalize(sql)
+    sql_seconds.observe(seconds, query)
+    sql_rows.inc(query, amount=rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        sql_slow.inc(query)
+        entry = slow_queries.get(query)
+        if entry is None:
+            print(f"Slow query ({seconds * 1000:.0f} ms): {query}")
+            # Only the shape of the parameters is kept: they can be emails and the like
+            shape = list(parameters) if isinstance(parameters, dict) else len(parameters or ())
+            entry = slow_queries[query] = {'sql': ' '.join(sql.split()), 'count': 0, 'max_ms': 0.0,
+                                           'parameters': shape}
+        entry['count'] += 1
+        entry['max_ms'] = max(entry['max_ms'], round(seconds * 1000, 1))
+
+
+def explain_slow_queries(conn):
+    """
+    The slow statements with their EXPLAIN QUERY PLAN, planned with every
+    parameter NULL (the plan rarely depends on the values).
+    """
+    report = []
+    for query, entry in sorted(slow_queries.items(), key=lambda item: -item[1]['max_ms']):
+        shape = entry['parameters']
+        parameters = dict.fromkeys(shape) if isinstance(shape, list) else (None,) * shape
+        try:
+            plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {entry['sql']}", parameters)]
+        except Exception as e:
+            plan = [f'(could not explain: {e})']
+        report.append({'query': query, 'count': entry['count'], 'max_ms': entry['max_ms'], 'plan': plan})
+    return report
+
+
+# --- SAMPLING PROFILER ---
+
+class StackSampler:
+    """
+    Every `interval` seconds, records the current stack of every other thread.
+    stacks() returns them in the collapsed "a;b;c count" format flame graph
+    tools read. Costs one sys._current_frames() per sample, nothing per request.
+    """
+    def __init__(self, interval, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.counts = collections.Counter()
+        self.samples = 0
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stacks(self, limit=200):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.counts.most_common(limit)) + '\n'
+
+
+profiler = StackSampler(PROFILE_INTERVAL_MS / 1000)
@@ -0,0 +1,79 @@
+import catalog
+import db
+import enrichment
+import mylist
+import recommend
+import watch
+
+# Upgrades an existing netflix.db in place so it doesn't need a full re-seed.
+# Every step is safe to run more than once.
+
+def migrate_genre_index(conn):
+    print("Rebuilding movie_genres from movies.genre...")
+    count = catalog.rebuild_genre_index(conn)
+    print(f"  > {count} genre tags indexed")
+
+
+def migrate_search_index(conn):
+    print("Building the full-text search index...")
+    count = catalog.rebuild_search_index(conn)
+    print(f"  > {count} titles searchable")
+
+
+def migrate_title_details(conn):
+    # Filled in by the next `python seed.py --refresh`; until then the routes ask TMDB
+    print("Creating the title_details table...")
+    catalog.create_details_table(conn)
+    conn.commit()
+
+
+def migrate_mylist(conn):
+    print("Removing duplicate My List rows and adding the unique index...")
+    mylist.add_position_column(conn)
+    removed = mylist.dedupe_mylist(conn)
+    mylist.create_mylist_index(conn)
+    conn.commit()
+    print(f"  > {removed} duplicates removed")
+
+
+def migrate_enrich_jobs(conn):
+    # Titles saved while TMDB was down never made it into the catalog; queue them
+    print("Creating the enrichment queue...")
+    enrichment.create_jobs_table(conn)
+    missing = conn.execute("SELECT DISTINCT media_type, tmdb_id FROM mylist").fetchall()
+    queued = enrichment.enqueue(conn, missing)
+    conn.commit()
+    print(f"  > {queued} saved titles queued for a background fetch")
+
+
+def migrate_recommendations(conn):
+    print("Computing \"Because you saved\" neighbors from My List...")
+    count = recommend.build_neighbors(conn)
+    print(f"  > {count} titles have neighbors")
+
+
+def migrate_watch_progress(conn):
+    print("Creating the watch progress table...")
+    watch.create_progress_table(conn)
+    conn.commit()
+
+
+def run_migrations():
+    conn = db.connect()
+    migrate_genre_index(conn)
+    migrate_search_index(conn)
+    migrate_title_details(conn)
+    migrate_mylist(conn)
+    migrate_enrich_jobs(conn)
+    migrate_recommendations(conn)
+    migrate_watch_progress(conn)
+
+    # Whatever a running app cached was built from the old tables
+    catalog.bump_catalog_version(conn)
+    conn.commit()
+    conn.close()
+    print("Migrations complete!")
+
+
+if __name__ == "__main__":
+    run_migrations()
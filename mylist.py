@@ -0,0 +1,146 @@
+# --- MY LIST ---
+# One row per (profile, title): idx_mylist_entry makes a duplicate impossible,
+# so adding is an upsert and removing reports whether anything was there.
+# `position` stays NULL until a profile reorders its list; until then titles
+# show in the order they were added.
+
+MEDIA_TYPES = ('movie', 'tv')
+
+
+def create_mylist_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mylist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile_id INTEGER,
+            tmdb_id INTEGER,
+            media_type TEXT,
+            position INTEGER,
+            FOREIGN KEY(profile_id) REFERENCES profiles(id)
+        )
+    """)
+    # Tables from before the index: add the column and drop duplicates first
+    add_position_column(conn)
+    dedupe_mylist(conn)
+    create_mylist_index(conn)
+
+
+def create_mylist_index(conn):
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mylist_entry
+        ON mylist(profile_id, media_type, tmdb_id)
+    """)
+
+
+def dedupe_mylist(conn):
+    """
+    Keeps the oldest row of every (profile, title) pair and deletes the rest,
+    which the unique index needs before it can be built. Returns how many
+    rows went.
+    """
+    cursor = conn.execute("""
+        DELETE FROM mylist WHERE id NOT IN (
+            SELECT MIN(id) FROM mylist GROUP BY profile_id, media_type, tmdb_id
+        )
+    """)
+    return cursor.rowcount
+
+
+def add_position_column(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(mylist)")]
+    if 'position' not in columns:
+        conn.execute("ALTER TABLE mylist ADD COLUMN position INTEGER")
+
+
+def title_key(media_type, tmdb_id):
+    return f"{media_type}:{tmdb_id}"
+
+
+def parse_title_key(key):
+    # "movie:550" -> ('movie', 550); raises ValueError on anything else
+    media_type, _, tmdb_id = str(key).partition(':')
+    media_type = media_type.lower()
+    if media_type not in MEDIA_TYPES or not tmdb_id.isdigit():
+        raise ValueError(f"Bad title {key!r}, expected e.g. 'movie:550'")
+    return media_type, int(tmdb_id)
+
+
+def toggle(conn, profile_id, media_type, tmdb_id):
+    """
+    Removes the title if it is on the list, otherwise adds it. Returns
+    'added' or 'removed'. Runs inside the caller's transaction.
+    """
+    removed = conn.execute("""
+        DELETE FROM mylist WHERE profile_id = ? AND media_type = ? AND tmdb_id = ?
+        RETURNING id
+    """, (profile_id, media_type, tmdb_id)).fetchone()
+    if removed:
+        return 'removed'
+
+    conn.execute("""
+        INSERT INTO mylist (profile_id, tmdb_id, media_type) VALUES (?, ?, ?)
+        ON CONFLICT(profile_id, media_type, tmdb_id) DO NOTHING
+    """, (profile_id, tmdb_id, media_type))
+    return 'added'
+
+
+def add_titles(conn, profile_id, titles):
+    # Returns the (media_type, tmdb_id) pairs that weren't on the list yet
+    added = []
+    for media_type, tmdb_id in titles:
+        row = conn.execute("""
+            INSERT INTO mylist (profile_id, tmdb_id, media_type) VALUES (?, ?, ?)
+            ON CONFLICT(profile_id, media_type, tmdb_id) DO NOTHING
+            RETURNING id
+        """, (profile_id, tmdb_id, media_type)).fetchone()
+        if row:
+            added.append((media_type, tmdb_id))
+    return added
+
+
+def remove_titles(conn, profile_id, titles):
+    cursor = conn.executemany(
+        "DELETE FROM mylist WHERE profile_id = ? AND media_type = ? AND tmdb_id = ?",
+        [(profile_id, media_type, tmdb_id) for media_type, tmdb_id in titles])
+    return cursor.rowcount
+
+
+def reorder(conn, profile_id, titles):
+    """
+    Gives `titles` positions 0, 1, 2... in the order given. Titles left out
+    go after them, in the order they were added.
+    """
+    conn.execute("UPDATE mylist SET position = NULL WHERE profile_id = ?", (profile_id,))
+    cursor = conn.executemany(
+        "UPDATE mylist SET position = ? WHERE profile_id = ? AND media_type = ? AND tmdb_id = ?",
+        [(position, profile_id, media_type, tmdb_id) for position, (media_type, tmdb_id) in enumerate(titles)])
+    return cursor.rowcount
+
+
+def saved_titles(conn, profile_id):
+    # {"movie:550", "tv:1399", ...}, for marking cards without a query per card
+    rows = conn.execute("SELECT media_type, tmdb_id FROM mylist WHERE profile_id = ?", (profile_id,))
+    return {title_key(media_type, tmdb_id) for media_type, tmdb_id in rows}
+
+
+def list_titles(conn, profile_id):
+    """
+    The list with its catalog rows, in list order. Titles still waiting for
+    the background fetch (enrichment.py) come back with only tmdb_id and
+    media_type, `pending` set, and `unavailable` set if the fetch gave up.
+    """
+    # The unique index already rules out duplicates, so no GROUP BY
+    return conn.execute("""
+        SELECT mylist.tmdb_id, mylist.media_type,
+               movies.title, movies.overview, movies.poster_path, movies.backdrop_path,
+               movies.logo_path, movies.age_rating,
+               movies.id IS NULL AS pending,
+               movies.id IS NULL AND enrich_jobs.tmdb_id IS NOT NULL
+                   AND enrich_jobs.next_attempt_at IS NULL AS unavailable
+        FROM mylist
+        LEFT JOIN movies ON mylist.tmdb_id = movies.tmdb_id
+        AND mylist.media_type = movies.media_type
+        LEFT JOIN enrich_jobs ON mylist.tmdb_id = enrich_jobs.tmdb_id
+        AND mylist.media_type = enrich_jobs.media_type
+        WHERE mylist.profile_id = ?
+        ORDER BY mylist.position IS NULL, mylist.position, mylist.id
+    """, (profile_id,)).fetchall()
@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import json
+import math
+import sqlite3
+import time
+from collections import Counter, defaultdict
+import catalog
+import db
+
+try:
+    import numpy as np  # optional: without it the batch counts pairs in plain Python, fine up to ~100k saves
+except ImportError:
+    np = None
+
+# --- RECOMMENDATIONS ---
+# The "Because you saved ..." row on the homepage. A batch job (python
+# recommend.py) counts how often two titles are saved by the same profile,
+# scores each pair by cosine similarity, boosts pairs that share browse tags,
+# and keeps the top NEIGHBORS of every title in title_neighbors. A profile's
+# row is then one indexed join from its latest saves to their neighbors.
+
+NEIGHBORS = 20
+MAX_SAVES = 200    # latest saves per profile the batch counts: one list of thousands would add millions of pairs
+RECENT_SAVES = 50  # latest saves a profile's row is built from
+TAG_BOOST = 0.5    # score * (1 + TAG_BOOST * share of browse tags in common)
+PAIR_CHUNK = 4_000_000
+SCORE_MAX = 2 ** 22 - 1  # scores are at most 1 + TAG_BOOST, kept to 6 decimals
+
+
+def create_neighbors_table(conn, table='title_neighbors'):
+    # neighbors is a JSON list of [media_type, tmdb_id, score], best first. One row per
+    # title rather than per neighbor: the batch writes NEIGHBORS times fewer rows.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            media_type TEXT NOT NULL,
+            tmdb_id INTEGER NOT NULL,
+            neighbors TEXT NOT NULL,
+            PRIMARY KEY (media_type, tmdb_id)
+        ) WITHOUT ROWID
+    """)
+
+
+# --- BATCH ---
+
+def load_saves(conn):
+    """
+    (profile, save id, movie id) for every save of a title in the catalog,
+    plus {movie id: (media_type, tmdb_id, genre)} for those titles.
+    """
+    saves = conn.execute("""
+        SELECT mylist.profile_id, mylist.id, movies.id FROM mylist
+        JOIN movies ON movies.tmdb_id = mylist.tmdb_id AND movies.media_type = mylist.media_type
+    """).fetchall()
+    movie_ids = json.dumps(sorted({movie_id for _, _, movie_id in saves}))
+    titles = {row[0]: tuple(row[1:]) for row in conn.execute(
+        'SELECT id, media_type, tmdb_id, genre FROM movies WHERE id IN (SELECT value FROM json_each(?))',
+        (movie_ids,))}
+    return saves, titles
+
+
+def latest_saves(saves):
+    # Each profile's latest MAX_SAVES saves, grouped by profile
+    saves = sorted(saves, key=lambda save: (save[0], -save[1]))
+    return [save for _, group in itertools.groupby(saves, key=lambda save: save[0])
+            for save in itertools.islice(group, MAX_SAVES)]
+
+
+def tag_masks(titles):
+    # Browse tags as bits, so "tags in common" is an AND and a popcount
+    bits = {}
+    masks = {}
+    for movie_id, (_, _, genre) in titles.items():
+        mask = 0
+        for tag in catalog.split_genres(genre):
+            mask |= 1 << bits.setdefault(tag, len(bits) % 63)
+        masks[movie_id] = mask
+    return masks, len(bits)
+
+
+def popcount(values, bits):
+    if hasattr(np, 'bitwise_count'):  # NumPy 2
+        return np.bitwise_count(values)
+    return sum((values >> bit) & 1 for bit in range(min(bits, 63)))
+
+
+def neighbors_numpy(saves, titles, k):
+    """
+    {movie id: [(neighbor movie id, score), ...] best first} for every saved
+    title, with vectorized ops over every co-saved pair.
+    """
+    if not saves:
+        return {}
+    masks, tag_count = tag_masks(titles)
+    saves = np.array(saves, np.int64)
+    saves = saves[np.lexsort((-saves[:, 1], saves[:, 0]))]  # by profile, latest first
+    profiles = saves[:, 0]
+    starts = np.flatnonzero(np.r_[True, profiles[1:] != profiles[:-1]])
+    recency = np.arange(len(saves)) - np.repeat(starts, np.diff(np.r_[starts, len(saves)]))
+    saves = saves[recency < MAX_SAVES]
+
+    profiles = saves[:, 0]
+    ids, items = np.unique(saves[:, 2], return_inverse=True)
+    n = len(ids)
+    saved_by = np.bincount(items, minlength=n)
+
+    starts = np.flatnonzero(np.r_[True, profiles[1:] != profiles[:-1]])
+    sizes = np.diff(np.r_[starts, len(profiles)])
+
+    # Every unordered pair within each profile's list, as a*n + b with a < b. Profiles are
+    # taken a chunk at a time so the pair arrays stay a few million long.
+    keys = []
+    pairs = np.cumsum(sizes * sizes)
+    bounds = np.unique(np.r_[0, np.searchsorted(pairs, np.arange(PAIR_CHUNK, pairs[-1], PAIR_CHUNK)), len(sizes)])
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        group_sizes, group_starts = sizes[first:last], starts[first:last]
+        per_entry = np.repeat(group_sizes, group_sizes)  # each save pairs with every save of its profile
+        entries = np.arange(group_starts[0], group_starts[0] + len(per_entry))
+        left = np.repeat(entries, per_entry)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(per_entry) - per_entry, per_entry)
+        right = np.repeat(np.repeat(group_starts, group_sizes), per_entry) + offsets
+        a, b = items[left], items[right]
+        keep = a < b
+        keys.append(a[keep] * n + b[keep])
+    if not keys:
+        return {}
+    pair_keys, together = np.unique(np.concatenate(keys), return_counts=True)
+    a, b = pair_keys // n, pair_keys % n
+
+    mask = np.array([masks[movie_id] for movie_id in ids.tolist()], np.int64)
+    shared, union = popcount(mask[a] & mask[b], tag_count), popcount(mask[a] | mask[b], tag_count)
+    overlap = np.divide(shared, union, out=np.zeros(len(a)), where=union > 0)
+    score = np.round(together / np.sqrt(saved_by[a] * saved_by[b]) * (1 + TAG_BOOST * overlap), 6)
+
+    # Both directions, best first per title (ties: lower movie id), cut at k. Sorting one packed
+    # int64 of (title, best score first, neighbor) is several times faster than a lexsort;
+    # it has room for 2**20 titles.
+    source, target = np.r_[a, b], np.r_[b, a]
+    worse = SCORE_MAX - np.rint(np.r_[score, score] * 1e6).astype(np.int64)
+    if n < 2 ** 20:
+        packed = np.sort((source << 42) | (worse << 20) | target)
+        source, worse, target = packed >> 42, (packed >> 20) & SCORE_MAX, packed & (2 ** 20 - 1)
+    else:
+        order = np.lexsort((target, worse, source))
+        source, worse, target = source[order], worse[order], target[order]
+    group_first = np.flatnonzero(np.r_[True, source[1:] != source[:-1]])
+    rank = np.arange(len(source)) - np.repeat(group_first, np.diff(np.r_[group_first, len(source)]))
+    top = rank < k
+
+    source, target = source[top], ids[target[top]].tolist()
+    score = ((SCORE_MAX - worse[top]) / 1e6).tolist()
+    firsts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]]).tolist()
+    return {movie_id: list(zip(target[first:last], score[first:last]))
+            for movie_id, first, last in zip(ids[source[firsts]].tolist(), firsts, firsts[1:] + [len(target)])}
+
+
+def neighbors_python(saves, titles, k):
+    # Same result as neighbors_numpy, one pair at a time
+    masks, _ = tag_masks(titles)
+    saves = latest_saves(saves)
+    together = Counter()
+    saved_by = Counter(movie_id for _, _, movie_id in saves)
+    for _, group in itertools.groupby(saves, key=lambda save: save[0]):
+        items = sorted({movie_id for _, _, movie_id in group})
+        together.update(itertools.combinations(items, 2))
+
+    candidates = defaultdict(list)
+    for (a, b), count in together.items():
+        union = bin(masks[a] | masks[b]).count('1')
+        overlap = bin(masks[a] & masks[b]).count('1') / union if union else 0.0
+        score = round(count / math.sqrt(saved_by[a] * saved_by[b]) * (1 + TAG_BOOST * overlap), 6)
+        candidates[a].append((score, -b, b))
+        candidates[b].append((score, -a, a))
+
+    return {movie_id: [(neighbor, score) for score, _, neighbor in heapq.nlargest(k, scored)]
+            for movie_id, scored in candidates.items()}
+
+
+def build_neighbors(conn, k=NEIGHBORS, use_numpy=True):
+    """
+    Recomputes title_neighbors from every profile's My List; returns the
+    number of titles that got neighbors.
+    """
+    saves, titles = load_saves(conn)
+    if use_numpy and np is not None:
+        neighbors = neighbors_numpy(saves, titles, k)
+    else:
+        neighbors = neighbors_python(saves, titles, k)
+
+    # Built beside the live table and swapped in, like seed.py's refresh: readers keep the old
+    # neighbors until the commit, and inserting in key order is much faster than into a full table
+    conn.execute('DROP TABLE IF EXISTS title_neighbors_next')
+    create_neighbors_table(conn, 'title_neighbors_next')
+    rows = sorted((*titles[movie_id][:2], json.dumps([[*titles[neighbor][:2], score] for neighbor, score in scored]))
+                  for movie_id, scored in neighbors.items())
+    conn.executemany('INSERT INTO title_neighbors_next (media_type, tmdb_id, neighbors) VALUES (?, ?, ?)', rows)
+    conn.execute('DROP TABLE IF EXISTS title_neighbors')
+    conn.execute('ALTER TABLE title_neighbors_next RENAME TO title_neighbors')
+    # Cached homepage rows are keyed on the catalog version
+    catalog.bump_catalog_version(conn)
+    conn.commit()
+    return len(neighbors)
+
+
+# --- SERVING ---
+
+def recommend(conn, profile_id, saved, limit=catalog.ROW_LIMIT):
+    """
+    (title to name the row after, [movie rows]) for a profile: the neighbors
+    of its RECENT_SAVES latest saves, scored by how many of them point there
+    and how recently they were saved, minus anything already on the list.
+    `saved` is mylist.saved_titles() for the profile.
+    """
+    try:
+        rows = conn.execute("""
+            SELECT saved.recency, anchor.title AS anchor_title, json_extract(neighbor.value, '$[2]') AS score, movies.*
+            FROM (
+                SELECT media_type, tmdb_id, ROW_NUMBER() OVER (ORDER BY id DESC) AS recency
+                FROM mylist WHERE profile_id = ?
+                ORDER BY id DESC LIMIT ?
+            ) AS saved
+            JOIN title_neighbors ON title_neighbors.media_type = saved.media_type
+            AND title_neighbors.tmdb_id = saved.tmdb_id
+            JOIN json_each(title_neighbors.neighbors) AS neighbor
+            JOIN movies ON movies.tmdb_id = json_extract(neighbor.value, '$[1]')
+            AND movies.media_type = json_extract(neighbor.value, '$[0]')
+            JOIN movies AS anchor ON anchor.tmdb_id = saved.tmdb_id AND anchor.media_type = saved.media_type
+        """, (profile_id, RECENT_SAVES)).fetchall()
+    except sqlite3.OperationalError:
+        # Database from before title_neighbors existed
+        return None, []
+
+    scores, movies, anchor = defaultdict(float), {}, (None, None)
+    for row in rows:
+        key = f"{row['media_type']}:{row['tmdb_id']}"
+        if key in saved:
+            continue
+        scores[key] += row['score'] / (1 + 0.1 * row['recency'])
+        movies[key] = row
+        if anchor[0] is None or row['recency'] < anchor[0]:
+            anchor = (row['recency'], row['anchor_title'])
+
+    best = heapq.nlargest(limit, scores, key=scores.get)
+    return anchor[1], [dict(movies[key]) for key in best]
+
+
+if __name__ == '__main__':
+    conn = db.connect()
+    started = time.monotonic()
+    count = build_neighbors(conn)
+    conn.close()
+    print(f"Neighbors for {count} titles in {time.monotonic() - started:.1f}s"
+          f"{'' if np is not None else ' (without NumPy)'}")
@@ -1,70 +1,108 @@
+import argparse
+import queue
 import sqlite3
-import requests
+import threading
 import time
-from config import TMDB_API_KEY
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qsl
+import catalog
+import db
+import enrichment
+import images
+import mylist
+import recommend
+import tmdb
+import watch
 
 # --- CONFIGURATION ---
-NETFLIX_PROVIDER_ID = 8  
+NETFLIX_PROVIDER_ID = 8
 REGIONS = ["US", "IN", "GB", "CA", "AU", "JP", "KR"]
-PAGES_TO_FETCH = 500 
+PAGES_TO_FETCH = 500
+
+# Parallelism: discover pages and per-title lookups run on separate pools,
+# all sharing one rate limit and one keep-alive HTTP session
+DISCOVER_WORKERS = 8
+ENRICH_WORKERS = 16
+WRITE_BATCH = 200
+
+# Incremental refresh (python seed.py --refresh): a title whose name, date and
+# artwork haven't changed keeps its logo and certification, but those are
+# still looked up again once they are this old
+ENRICH_MAX_AGE = 30 * 24 * 3600
+
+# (discover params, media_type, genre tag), in the order rows should list titles
+DISCOVER_QUERIES = [
+    # 1. TRENDING
+    ("sort_by=popularity.desc", "movie", "trending"),
+    ("sort_by=popularity.desc", "tv", "trending"),
+
+    # 2. POPULAR
+    ("sort_by=popularity.desc&vote_count.gte=1000", "movie", "popular"),
+
+    # 3. NEW RELEASES
+    ("sort_by=primary_release_date.desc&vote_count.gte=50", "movie", "new_releases"),
+
+    # 4. ACTION
+    ("with_genres=28", "movie", "action"),
+
+    # 5. ANIME
+    ("with_genres=16&with_original_language=ja", "tv", "anime"),
+
+    # 6. US TV DRAMA
+    ("with_genres=18&with_original_language=en", "tv", "us_tv_drama"),
+
+    # 7. BOLLYWOOD
+    ("with_original_language=hi", "movie", "bollywood"),
+
+    # 8. K-DRAMA
+    ("with_original_language=ko", "tv", "kdrama"),
+
+    # 9. SCI-FI & HORROR
+    ("with_genres=878,27", "movie", "scifi_horror"),
+    ("with_genres=10765", "tv", "scifi_horror"),
+
+    # 10. COMEDY (Feeds directly into Popular)
+    ("with_genres=35", "movie", "popular"),
+
+    # 11. THRILLER (Feeds directly into Sci-Fi & Horror)
+    ("with_genres=53", "movie", "scifi_horror"),
+
+    # 12. ROMANCE (Feeds directly into Trending)
+    ("with_genres=10749", "movie", "trending"),
+
+    # 13. DOCUMENTARY (Feeds directly into New Releases)
+    ("with_genres=99", "movie", "new_releases"),
+
+    # 14. ACTION & ADVENTURE TV (Feeds directly into Action)
+    ("with_genres=10759", "tv", "action"),
+]
 
 def get_db_connection():
-    conn = sqlite3.connect('netflix.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.connect()
 
-# --- HELPER: Get Logo ---
-def get_logo(media_type, tmdb_id):
-    url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}/images?api_key={TMDB_API_KEY}&include_image_language=en,null"
-    try:
-        resp = requests.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            logos = data.get('logos', [])
-            if logos:
-                return logos[0]['file_path']
-    except:
-        pass
-    return None
+# --- HTTP: one TMDB client (keep-alive pool, token bucket, retries) shared by every worker thread ---
+# A seed can afford to wait out a Retry-After; the web app can't
+client = tmdb.TMDBClient(pool_size=DISCOVER_WORKERS + ENRICH_WORKERS, retries=5, max_backoff=60,
+                         limiter=tmdb.TokenBucket(tmdb.RATE_LIMIT))
 
-# --- HELPER: Get Real Age Rating ---
-def get_real_certification(media_type, tmdb_id):
-    append_to = "release_dates" if media_type == "movie" else "content_ratings"
-    url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}?api_key={TMDB_API_KEY}&append_to_response={append_to}"
-    
+def tmdb_get(path, **params):
+    return client.get(path, **params)
+
+# --- HELPER: Get Details (one request: rating, cast, trailers and logos appended) ---
+def get_title_details(media_type, tmdb_id):
     try:
-        resp = requests.get(url)
+        resp = tmdb_get(f"/{media_type}/{tmdb_id}", **tmdb.details_params(media_type))
         if resp.status_code == 200:
-            data = resp.json()
-            
-            if media_type == "movie":
-                releases = data.get("release_dates", {}).get("results", [])
-                for country in releases:
-                    if country["iso_3166_1"] in ["US", "IN"]:
-                        for release in country["release_dates"]:
-                            if release["certification"]:
-                                return release["certification"]
-            else:
-                ratings = data.get("content_ratings", {}).get("results", [])
-                for rating in ratings:
-                    if rating["iso_3166_1"] in ["US", "IN"]:
-                        return rating["rating"]
-    except:
+            return resp.json()
+    except Exception:
         pass
-    return "PG-13" if media_type == "movie" else "TV-14"
-
-def save_to_db():
-    conn = get_db_connection()
-    print("Starting Netflix-Only Database Update (Targeting 10,000+)...")
+    return None
 
-    # 1. DROP MOVIES TABLE TO START FRESH
-    conn.execute("DROP TABLE IF EXISTS movies")
-    
-    # 2. CREATE ALL TABLES
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS movies (
+def create_movies_table(conn, table='movies'):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tmdb_id INTEGER UNIQUE,
+            tmdb_id INTEGER,
             title TEXT,
             overview TEXT,
             poster_path TEXT,
@@ -74,10 +112,19 @@ def save_to_db():
             vote_average REAL,
             media_type TEXT,
             genre TEXT,
-            age_rating TEXT
+            age_rating TEXT,
+            enriched_at INTEGER,
+            UNIQUE (tmdb_id, media_type)
         )
     """)
 
+def create_tables(conn):
+    create_movies_table(conn)
+    catalog.create_genre_index(conn)
+    catalog.create_search_index(conn)
+    catalog.create_catalog_meta(conn)
+    catalog.create_details_table(conn)
+
     # Ensure other tables exist (User/Profiles/Mylist are safely kept)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -97,148 +144,505 @@ def save_to_db():
             FOREIGN KEY(user_id) REFERENCES users(id)
         )
     """)
+    mylist.create_mylist_table(conn)
+    enrichment.create_jobs_table(conn)
+    recommend.create_neighbors_table(conn)
+    watch.create_progress_table(conn)
+
+
+# --- REFRESH STATE ---
+# A refresh builds movies_next / movie_genres_next beside the live tables and
+# swaps them in with a single transaction at the end, so the app keeps serving
+# the old catalog until the new one is complete. seed_state holds a checkpoint
+# per discover query and region: every page below next_page is already in the
+# shadow tables, so a refresh that dies halfway picks up from there.
+
+def create_seed_state(conn):
     conn.execute("""
-        CREATE TABLE IF NOT EXISTS mylist (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER,
-            tmdb_id INTEGER,
-            media_type TEXT,
-            FOREIGN KEY(profile_id) REFERENCES profiles(id)
+        CREATE TABLE IF NOT EXISTS seed_state (
+            genre_tag TEXT NOT NULL,
+            media_type TEXT NOT NULL,
+            region TEXT NOT NULL,
+            params TEXT NOT NULL,
+            pages INTEGER NOT NULL,
+            total_pages INTEGER,
+            next_page INTEGER NOT NULL DEFAULT 1,
+            updated_at INTEGER,
+            PRIMARY KEY (genre_tag, media_type, region, params)
         )
     """)
 
-    # 3. Fetch Logic
-    total_added = 0
-    
-    def fetch_and_save(base_params, media_type, genre_tag):
-        nonlocal total_added
-        print(f"\nFetching {genre_tag} ({media_type})...")
-        
-        clean_params = base_params.split('&page=')[0]
-
-        for region in REGIONS:
-            print(f"  > Region: {region}", end=" ")
-            
-            for page in range(1, PAGES_TO_FETCH + 1):
-                url = (f"https://api.themoviedb.org/3/discover/{media_type}?"
-                       f"api_key={TMDB_API_KEY}&language=en-US&page={page}"
-                       f"&watch_region={region}&with_watch_providers={NETFLIX_PROVIDER_ID}"
-                       f"&{clean_params}")
-                
-                try:
-                    response = requests.get(url)
-                    if response.status_code == 200:
-                        data = response.json()
-                        results = data.get('results', [])
-                        
-                        if not results:
-                            print(f" [Ran out of movies. Skipping rest of {region}] ")
-                            break 
-                        
-                        for item in results:
-                            tmdb_id = item.get('id')
-                            title = item.get('title') or item.get('name')
-                            overview = item.get('overview')
-                            poster = item.get('poster_path')
-                            backdrop = item.get('backdrop_path')
-                            date = item.get('release_date') or item.get('first_air_date')
-                            rating = item.get('vote_average')
-                            
-                            if not poster or not backdrop or not title:
-                                continue
-
-                            # --- UPGRADED MULTI-GENRE CHECK ---
-                            existing_movie = conn.execute("SELECT genre FROM movies WHERE tmdb_id = ?", (tmdb_id,)).fetchone()
-                            
-                            if existing_movie:
-                                current_genres = existing_movie['genre']
-                                # If it exists but doesn't have this genre yet, append it with a comma!
-                                if genre_tag not in current_genres.split(','):
-                                    new_genres = current_genres + f",{genre_tag}"
-                                    conn.execute("UPDATE movies SET genre = ? WHERE tmdb_id = ?", (new_genres, tmdb_id))
-                                continue # Skip downloading logos again!
-                            
-                            # If we reach here, it's a brand new movie!
-                            logo = get_logo(media_type, tmdb_id)
-                            age_rating = get_real_certification(media_type, tmdb_id)
-
-                            try:
-                                conn.execute("""
-                                    INSERT INTO movies 
-                                    (tmdb_id, title, overview, poster_path, backdrop_path, logo_path, release_date, vote_average, media_type, genre, age_rating)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                """, (tmdb_id, title, overview, poster, backdrop, logo, date, rating, media_type, genre_tag, age_rating))
-                                
-                                total_added += 1
-                                print(".", end="", flush=True)
-                            except sqlite3.Error:
-                                pass
-                except Exception as e:
-                    print(f"Error: {e}")
-                
-                time.sleep(0.25) # Standard API delay
-                
-                # API Breather every 10 pages
-                if page % 10 == 0:
-                    conn.commit()
-                    print(f"\n--- Pausing to let the API rest (Page {page}) ---")
-                    time.sleep(2) 
-
-    # --- 4. EXECUTE MAPPED QUERIES ---
-    
-    # 1. TRENDING
-    fetch_and_save("sort_by=popularity.desc", "movie", "trending")
-    fetch_and_save("sort_by=popularity.desc", "tv", "trending")
+def drop_refresh_state(conn):
+    create_seed_state(conn)
+    conn.execute("DELETE FROM seed_state")
+    conn.execute("DROP TABLE IF EXISTS movies_next")
+    conn.execute("DROP TABLE IF EXISTS movie_genres_next")
 
-    # 2. POPULAR
-    fetch_and_save("sort_by=popularity.desc&vote_count.gte=1000", "movie", "popular")
+def needs_enrichment(previous, item, media_type):
+    """
+    True unless the live catalog already has this title with the same name,
+    date and artwork, a certification and details, and a lookup younger than
+    ENRICH_MAX_AGE.
+    """
+    if previous is None or previous['media_type'] != media_type or previous['age_rating'] is None:
+        return True
+    if previous['details_at'] is None:
+        return True
 
-    # 3. NEW RELEASES
-    fetch_and_save("sort_by=primary_release_date.desc&vote_count.gte=50", "movie", "new_releases")
+    current = {
+        'title': item.get('title') or item.get('name'),
+        'release_date': item.get('release_date') or item.get('first_air_date'),
+        'poster_path': item.get('poster_path'),
+        'backdrop_path': item.get('backdrop_path'),
+    }
+    if any(previous[column] != value for column, value in current.items()):
+        return True
 
-    # 4. ACTION
-    fetch_and_save("with_genres=28", "movie", "action")
+    # Titles from before enriched_at existed count as fresh until the next refresh stamps them
+    enriched_at = previous.get('enriched_at')
+    return enriched_at is not None and time.time() - enriched_at > ENRICH_MAX_AGE
 
-    # 5. ANIME
-    fetch_and_save("with_genres=16&with_original_language=ja", "tv", "anime")
 
-    # 6. US TV DRAMA
-    fetch_and_save("with_genres=18&with_original_language=en", "tv", "us_tv_drama")
+def print_tmdb_metrics():
+    for endpoint, stats in client.metrics()['endpoints'].items():
+        print(f"  {endpoint:<28} {stats['calls']:>6} calls  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+              f"{stats['retries']} retries  {stats['errors']} errors")
 
-    # 7. BOLLYWOOD
-    fetch_and_save("with_original_language=hi", "movie", "bollywood")
 
-    # 8. K-DRAMA
-    fetch_and_save("with_original_language=ko", "tv", "kdrama")
+class SeedPipeline:
+    """
+    Discover pages -> per-title enrichment -> one writer thread.
 
-    # 9. SCI-FI & HORROR 
-    fetch_and_save("with_genres=878,27", "movie", "scifi_horror")
-    fetch_and_save("with_genres=10765", "tv", "scifi_horror") 
+    Every discovered item gets a rank from its position in the old serial
+    walk (query, region, page, index). Ranks become movies.id and
+    movie_genres.id, so rows list titles in exactly the order a one-at-a-time
+    seed produced even though pages finish in any order.
 
-    # 10. COMEDY (Feeds directly into Popular)
-    fetch_and_save("with_genres=35", "movie", "popular")
+    With refresh=True it writes into the shadow tables instead, reuses the
+    live catalog's logos and certifications for unchanged titles, and
+    checkpoints every page in seed_state once all of its titles are written.
+    """
+    def __init__(self, conn, pages=PAGES_TO_FETCH, discover_workers=None, enrich_workers=None, refresh=False):
+        self.conn = conn
+        self.pages = pages
+        self.refresh = refresh
+        self.movies_table = 'movies_next' if refresh else 'movies'
+        self.genres_table = 'movie_genres_next' if refresh else 'movie_genres'
+        self.discover_pool = ThreadPoolExecutor(discover_workers or DISCOVER_WORKERS, thread_name_prefix='discover')
+        self.enrich_pool = ThreadPoolExecutor(enrich_workers or ENRICH_WORKERS, thread_name_prefix='enrich')
+        self.writes = queue.Queue(maxsize=WRITE_BATCH * 10)
 
-    # 11. THRILLER (Feeds directly into Sci-Fi & Horror)
-    fetch_and_save("with_genres=53", "movie", "scifi_horror")
+        # Titles are (tmdb_id, media_type) pairs: a movie and a show can share an id.
+        # Every title inserted or being enriched:
+        self.known = set()
+        # title -> [(rank, tag)] seen while its enrichment is still running
+        self.pending_tags = {}
+        # title -> Future of its running enrichment
+        self.enriching = {}
+        self.lock = threading.Lock()
 
-    # 12. ROMANCE (Feeds directly into Trending)
-    fetch_and_save("with_genres=10749", "movie", "trending")
+        # (query_index, region_index) -> [next_page, total_pages], and pages written past next_page
+        self.checkpoints = {}
+        self.done_pages = {}
+        # title -> live movies row, for titles a refresh may not need to enrich again
+        self.previous = {}
 
-    # 13. DOCUMENTARY (Feeds directly into New Releases)
-    fetch_and_save("with_genres=99", "movie", "new_releases")
+        self.total_added = 0
+        self.reused = 0
 
-    # 14. ACTION & ADVENTURE TV (Feeds directly into Action)
-    fetch_and_save("with_genres=10759", "tv", "action")
+        if refresh:
+            self.load_refresh_state()
+
+    def load_refresh_state(self):
+        positions = {query: index for index, query in enumerate(DISCOVER_QUERIES)}
+        for row in self.conn.execute("SELECT * FROM seed_state"):
+            query_index = positions.get((row['params'], row['media_type'], row['genre_tag']))
+            if query_index is not None and row['region'] in REGIONS:
+                self.checkpoints[(query_index, REGIONS.index(row['region']))] = [row['next_page'], row['total_pages']]
+
+        self.previous = {(row['tmdb_id'], row['media_type']): dict(row) for row in self.conn.execute("""
+            SELECT movies.*, title_details.fetched_at AS details_at FROM movies
+            LEFT JOIN title_details ON title_details.tmdb_id = movies.tmdb_id
+            AND title_details.media_type = movies.media_type
+        """)}
+
+        # Titles an interrupted run already saved only need their tags from here on
+        self.known.update(tuple(row) for row in self.conn.execute("SELECT tmdb_id, media_type FROM movies_next"))
+
+    def rank(self, query_index, region_index, page, position):
+        return ((query_index * len(REGIONS) + region_index) * self.pages + (page - 1)) * 100 + position + 1
+
+    # --- 1. DISCOVER ---
+    def fetch_page(self, query_index, region_index, page):
+        base_params, media_type, genre_tag = DISCOVER_QUERIES[query_index]
+        params = dict(parse_qsl(base_params.split('&page=')[0]))
+        params.update(language="en-US", page=page, watch_region=REGIONS[region_index],
+                      with_watch_providers=NETFLIX_PROVIDER_ID)
 
-    print(f"\nSUCCESS! Database seeded with {total_added} Netflix-verified titles.")
+        try:
+            response = tmdb_get(f"/discover/{media_type}", **params)
+            if response.status_code != 200:
+                return None
+            data = response.json()
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+        results = data.get('results', [])
+        enrichments = [self.handle_item(item, media_type, genre_tag, self.rank(query_index, region_index, page, position))
+                       for position, item in enumerate(results)]
+
+        # Page 1 tells us how many more pages are worth asking for
+        total_pages = min(data.get('total_pages') or 0, self.pages) if results else 0
+
+        if self.refresh:
+            # Checkpoint only once every title on the page is queued for writing. A page with a
+            # title that failed stays unfinished, so the refresh can't swap in without it
+            enrichments = [future for future in enrichments if future is not None]
+            wait(enrichments)
+            if any(future.exception() for future in enrichments):
+                return total_pages
+            self.writes.put(('page', (query_index, region_index, page, total_pages if page == 1 else None)))
+        return total_pages
+
+    def handle_item(self, item, media_type, genre_tag, rank):
+        tmdb_id = item.get('id')
+        if not item.get('poster_path') or not item.get('backdrop_path') or not (item.get('title') or item.get('name')):
+            return None
+
+        key = (tmdb_id, media_type)
+        with self.lock:
+            if key in self.pending_tags:
+                self.pending_tags[key].append((rank, genre_tag))
+                return self.enriching[key]
+            if key in self.known:
+                # Already saved: just add the genre (skip downloading logos again!)
+                self.writes.put(('tag', (rank, tmdb_id, media_type, genre_tag)))
+                return None
+            self.known.add(key)
+            self.pending_tags[key] = [(rank, genre_tag)]
+
+            # If we reach here, it's a brand new movie!
+            future = self.enriching[key] = self.enrich_pool.submit(self.enrich, item, media_type)
+            return future
+
+    # --- 2. ENRICH ---
+    def enrich(self, item, media_type):
+        tmdb_id = item.get('id')
+        key = (tmdb_id, media_type)
+        previous = self.previous.get(key)
+
+        details = None
+        try:
+            if self.refresh and not needs_enrichment(previous, item, media_type):
+                logo, age_rating = previous['logo_path'], previous['age_rating']
+                enriched_at = previous.get('enriched_at') or int(time.time())
+                self.reused += 1
+            else:
+                data = get_title_details(media_type, tmdb_id) or {}
+                logo = tmdb.get_logo(data)
+                age_rating = tmdb.get_real_certification(media_type, data)
+                enriched_at = int(time.time())
+                if data:
+                    details = catalog.details_row(tmdb_id, media_type, tmdb.trim_details(data), enriched_at)
+        except Exception as e:
+            print(f"Error: {media_type} {tmdb_id}: {e}")
+            with self.lock:
+                # Forget the title entirely: the next page that lists it starts a fresh enrichment
+                self.pending_tags.pop(key, None)
+                self.enriching.pop(key, None)
+                self.known.discard(key)
+            raise
+
+        with self.lock:
+            # Queued under the lock so a later genre tag can't overtake the insert
+            tags = sorted(self.pending_tags.pop(key))
+            self.enriching.pop(key, None)
+            row = (tags[0][0], tmdb_id, item.get('title') or item.get('name'), item.get('overview'),
+                   item.get('poster_path'), item.get('backdrop_path'), logo,
+                   item.get('release_date') or item.get('first_air_date'), item.get('vote_average'),
+                   media_type, ','.join(dict.fromkeys(tag for _, tag in tags)), age_rating, enriched_at)
+            self.writes.put(('movie', row, [(rank, tmdb_id, media_type, tag) for rank, tag in tags], details))
+
+    # --- 3. WRITE (single thread, batched) ---
+    def writer(self):
+        movies, tags, pages, details = [], [], [], []
+        last_flush = time.monotonic()
+
+        while True:
+            op = self.writes.get()
+            if op is None:
+                break
+            if op[0] == 'movie':
+                movies.append(op[1])
+                tags.extend(op[2])
+                if op[3]:
+                    details.append(op[3])
+            elif op[0] == 'tag':
+                tags.append(op[1])
+            else:
+                pages.append(op[1])
+
+            if len(movies) + len(tags) >= WRITE_BATCH or time.monotonic() - last_flush > 2:
+                self.flush(movies, tags, pages, details)
+                movies, tags, pages, details = [], [], [], []
+                last_flush = time.monotonic()
+
+        self.flush(movies, tags, pages, details)
+
+    def flush(self, movies, tags, pages, details):
+        if not movies and not tags and not pages:
+            return
+        try:
+            self.write_batch(movies, tags, pages, details)
+        except sqlite3.Error as e:
+            # Keep draining the queue; one bad batch shouldn't stall every worker
+            self.conn.rollback()
+            print(f"Error: {e}")
+
+    def write_batch(self, movies, tags, pages, details):
+
+        self.conn.executemany(f"""
+            INSERT OR IGNORE INTO {self.movies_table}
+            (id, tmdb_id, title, overview, poster_path, backdrop_path, logo_path, release_date, vote_average, media_type, genre, age_rating, enriched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, movies)
+
+        # A title found again for the same genre keeps its best (earliest) rank
+        self.conn.executemany(f"""
+            INSERT INTO {self.genres_table} (id, tmdb_id, media_type, tag) VALUES (?, ?, ?, ?)
+            ON CONFLICT(tag, tmdb_id, media_type) DO UPDATE SET id = excluded.id
+            WHERE excluded.id < {self.genres_table}.id
+        """, tags)
+
+        # If it exists but doesn't have this genre yet, append it with a comma!
+        self.conn.executemany(f"""
+            UPDATE {self.movies_table} SET genre = genre || ',' || ?
+            WHERE tmdb_id = ? AND media_type = ? AND ',' || genre || ',' NOT LIKE '%,' || ? || ',%'
+        """, [(tag, tmdb_id, media_type, tag) for _, tmdb_id, media_type, tag in tags])
+
+        # Trailer key, runtime, genres and top cast for the info modal (outside the shadow tables)
+        catalog.save_details(self.conn, details)
+
+        if self.refresh:
+            # Same transaction as the titles, so a checkpoint never runs ahead of the data
+            self.save_checkpoints(pages)
+        else:
+            catalog.bump_catalog_version(self.conn)
+        self.conn.commit()
+
+        self.total_added += len(movies)
+        if movies:
+            print(f"  > {self.total_added} titles saved", flush=True)
+
+    def save_checkpoints(self, pages):
+        rows = []
+        for query_index, region_index, page, total_pages in pages:
+            checkpoint = self.checkpoints.setdefault((query_index, region_index), [1, None])
+            if total_pages is not None:
+                checkpoint[1] = total_pages
+
+            # next_page only moves past pages that are all saved, whatever order they finished in
+            done = self.done_pages.setdefault((query_index, region_index), set())
+            done.add(page)
+            while checkpoint[0] in done:
+                checkpoint[0] += 1
+
+            params, media_type, genre_tag = DISCOVER_QUERIES[query_index]
+            rows.append((checkpoint[0], checkpoint[1], int(time.time()),
+                         genre_tag, media_type, REGIONS[region_index], params))
+
+        self.conn.executemany("""
+            UPDATE seed_state SET next_page = ?, total_pages = ?, updated_at = ?
+            WHERE genre_tag = ? AND media_type = ? AND region = ? AND params = ?
+        """, rows)
+
+    def run(self):
+        writer = threading.Thread(target=self.writer, name='writer')
+        writer.start()
+
+        # Where each (query, region) starts: page 1, or wherever an interrupted refresh stopped
+        keys = [(q, r) for q in range(len(DISCOVER_QUERIES)) for r in range(len(REGIONS))]
+        start = {key: tuple(self.checkpoints.get(key, (1, None))) for key in keys}
+
+        # Page 1 of every (query, region) first, then all remaining pages at once
+        first_pages = {self.discover_pool.submit(self.fetch_page, q, r, 1): (q, r)
+                       for (q, r), (next_page, _) in start.items() if next_page == 1}
+        wait(first_pages)
+
+        totals = {key: total_pages for key, (next_page, total_pages) in start.items() if next_page > 1}
+        totals.update({key: future.result() for future, key in first_pages.items()})
+        rest = [self.discover_pool.submit(self.fetch_page, q, r, page)
+                for (q, r), total_pages in totals.items()
+                for page in range(max(2, start[(q, r)][0]), (total_pages or 0) + 1)]
+        wait(rest)
+
+        self.discover_pool.shutdown(wait=True)
+        self.enrich_pool.shutdown(wait=True)
+        self.writes.put(None)
+        writer.join()
+        return self.total_added
+
+
+def save_to_db(pages=PAGES_TO_FETCH):
+    conn = get_db_connection()
+    print("Starting Netflix-Only Database Update (Targeting 10,000+)...")
+
+    # 1. DROP MOVIES TABLE TO START FRESH
+    conn.execute("DROP TABLE IF EXISTS movies")
+    conn.execute("DROP TABLE IF EXISTS movie_genres")
+    catalog.drop_search_index(conn)
+    drop_refresh_state(conn)
+
+    # 2. CREATE ALL TABLES
+    create_tables(conn)
+    conn.commit()
+
+    # 3. Fetch Logic
+    started = time.monotonic()
+    total_added = SeedPipeline(conn, pages=pages).run()
+    elapsed = time.monotonic() - started
+
+    print(f"\nSUCCESS! Database seeded with {total_added} Netflix-verified titles "
+          f"in {elapsed:.0f}s ({total_added / max(elapsed, 0.001):.1f} titles/sec).")
+    print_tmdb_metrics()
 
 
     print("Optimizing database for lightning-fast loads...")
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_movie_genre ON movies(genre);')
+    catalog.create_genre_index(conn)
+    catalog.optimize_search_index(conn)
+    catalog.bump_catalog_version(conn)
     conn.commit()
     conn.close()
-    
+
     print("Database indexing complete! Your Netflix clone is ready to fly.")
+    return total_added
+
+
+# --- INCREMENTAL REFRESH ---
+def start_refresh(conn, pages):
+    drop_refresh_state(conn)
+    create_movies_table(conn, 'movies_next')
+    catalog.create_genre_table(conn, 'movie_genres_next')
+    conn.executemany("""
+        INSERT INTO seed_state (genre_tag, media_type, region, params, pages) VALUES (?, ?, ?, ?, ?)
+    """, [(genre_tag, media_type, region, params, pages)
+          for params, media_type, genre_tag in DISCOVER_QUERIES for region in REGIONS])
+    conn.commit()
+
+def refresh_complete(conn):
+    unfinished = conn.execute("""
+        SELECT COUNT(*) FROM seed_state WHERE total_pages IS NULL OR next_page <= total_pages
+    """).fetchone()[0]
+    return unfinished == 0
+
+def swap_in_refresh(conn):
+    """
+    Replaces the live catalog with the shadow tables in one transaction.
+    Readers see either the old catalog or the new one, never a mix.
+    """
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Titles on someone's list that dropped out of discover stay in the catalog. A movie and
+        # a show can share a tmdb_id, so movies is unique on the pair and neither pushes the other out
+        conn.execute("""
+            INSERT OR IGNORE INTO movies_next
+            (tmdb_id, title, overview, poster_path, backdrop_path, logo_path, release_date, vote_average, media_type, genre,
+             age_rating, enriched_at)
+            SELECT tmdb_id, title, overview, poster_path, backdrop_path, logo_path, release_date, vote_average, media_type, genre,
+                   age_rating, enriched_at
+            FROM movies WHERE (tmdb_id, media_type) IN (SELECT tmdb_id, media_type FROM mylist)
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO movie_genres_next (tmdb_id, media_type, tag)
+            SELECT tmdb_id, media_type, tag FROM movie_genres WHERE tag = 'user_saved'
+        """)
+
+        catalog.drop_search_index(conn)
+        conn.execute("DROP TABLE movie_genres")
+        conn.execute("DROP TABLE movies")
+        conn.execute("ALTER TABLE movies_next RENAME TO movies")
+        conn.execute("ALTER TABLE movie_genres_next RENAME TO movie_genres")
+
+        catalog.create_genre_index(conn)
+        catalog.create_search_index(conn)
+        catalog.fill_search_index(conn)
+        conn.execute("DELETE FROM seed_state")
+        catalog.bump_catalog_version(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def refresh_catalog(pages=PAGES_TO_FETCH, restart=False):
+    conn = get_db_connection()
+    create_tables(conn)
+    create_seed_state(conn)
+
+    state = conn.execute("SELECT MAX(pages), COUNT(*) FROM seed_state").fetchone()
+    shadow = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'movies_next'").fetchone()
+
+    if state[1] and shadow and not restart:
+        # Ranks depend on the page count, so a resumed run keeps the one it started with
+        pages = state[0]
+        done = conn.execute("SELECT COUNT(*) FROM movies_next").fetchone()[0]
+        print(f"Resuming catalog refresh ({done} titles already saved)...")
+    else:
+        print("Starting incremental catalog refresh...")
+        start_refresh(conn, pages)
+
+    started = time.monotonic()
+    pipeline = SeedPipeline(conn, pages=pages, refresh=True)
+    total_added = pipeline.run()
+    elapsed = time.monotonic() - started
+    print(f"\n{total_added} titles saved in {elapsed:.0f}s, {pipeline.reused} reused without "
+          f"fetching their logo or certification again.")
+    print_tmdb_metrics()
+
+    if not refresh_complete(conn):
+        conn.close()
+        print("Some pages failed to load; the live catalog is untouched. Run `python seed.py --refresh` again to resume.")
+        return total_added
+
+    print("Swapping in the refreshed catalog...")
+    swap_in_refresh(conn)
+    catalog.optimize_search_index(conn)
+    conn.commit()
+    conn.close()
+
+    print("Catalog refresh complete!")
+    return total_added
+
+def prefetch_images(workers=8):
+    # Warms the /img cache (images.py) for the whole catalog, so no visitor waits on a first fetch
+    conn = get_db_connection()
+    wanted = images.catalog_images(conn)
+    conn.close()
+
+    print(f"Prefetching {len(wanted)} images...")
+    started = time.monotonic()
+    cache = images.ImageCache()
+    cached, fetched, failed = images.prefetch(cache, wanted, workers)
+    stats = cache.stats()
+    print(f"{fetched} fetched, {cached} already cached, {failed} failed in {time.monotonic() - started:.0f}s; "
+          f"the cache holds {stats['objects']} images, {stats['bytes'] / 2 ** 20:.1f} MB"
+          f"{'' if stats['webp'] else ' (install Pillow to store them as WebP)'}.")
 
 if __name__ == "__main__":
-    save_to_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fill netflix.db with Netflix titles from TMDB.")
+    parser.add_argument('--refresh', action='store_true',
+                        help="update the catalog in place, resuming an interrupted refresh")
+    parser.add_argument('--restart', action='store_true',
+                        help="with --refresh, throw away an unfinished refresh and start over")
+    parser.add_argument('--pages', type=int, default=PAGES_TO_FETCH)
+    parser.add_argument('--prefetch-images', action='store_true',
+                        help="download and convert every poster, backdrop and logo the site shows, then exit")
+    args = parser.parse_args()
+
+    if args.prefetch_images:
+        prefetch_images()
+    elif args.refresh:
+        refresh_catalog(pages=args.pages, restart=args.restart)
+    else:
+        save_to_db(pages=args.pages)
@@ -12,6 +12,9 @@ window.addEventListener("scroll", () => {
 /* --- 2. YOUTUBE CUSTOM PLAYER VARIABLES --- */
 let player;
 let updateInterval;
+let nowPlaying = null;      // { mediaType, tmdbId } of the trailer in the player
+let lastProgressSent = 0;
+const PROGRESS_EVERY_MS = 5000;
 
 /* --- 3. YOUTUBE API SETUP --- */
 function onYouTubeIframeAPIReady() {
@@ -26,6 +29,8 @@ function playTrailer(mediaType, tmdbId, title) {
 
     const titleElement = document.getElementById('player-title');
     if (titleElement) titleElement.innerText = title || "Now Playing";
+    nowPlaying = { mediaType, tmdbId };
+    lastProgressSent = Date.now();
 
     const modal = document.getElementById('video-modal');
     modal.style.display = 'flex';
@@ -104,6 +109,11 @@ function onPlayerStateChange(event) {
         btn.className = 'fas fa-play';
         container.classList.add('paused');     
     }
+
+    // Paused or finished: save where we are now rather than on the next tick
+    if (event.data == YT.PlayerState.PAUSED || event.data == YT.PlayerState.ENDED) {
+        sendProgress();
+    }
 }
 
 /* --- 7. CUSTOM CONTROL FUNCTIONS --- */
@@ -194,6 +204,8 @@ function closeVideo() {
     
     // Stop the progress bar loop
     if (updateInterval) clearInterval(updateInterval);
+    sendProgress();
+    nowPlaying = null;
 
     setTimeout(() => {
         modal.style.display = 'none';
@@ -227,10 +239,33 @@ function startProgressLoop() {
                 const percent = (current / duration) * 100;
                 document.getElementById('progress-bar').style.width = percent + '%';
             }
+            if (Date.now() - lastProgressSent >= PROGRESS_EVERY_MS
+                && player.getPlayerState() == YT.PlayerState.PLAYING) {
+                sendProgress();
+            }
         }
     }, 500);
 }
 
+// Where the trailer is, for "Continue Watching". The server only buffers it, so this is cheap.
+// keepalive lets the last one finish even if the page is being left.
+function sendProgress() {
+    if (!nowPlaying || !player || !player.getCurrentTime) return;
+    const duration = player.getDuration();
+    if (!(duration > 0)) return;
+
+    lastProgressSent = Date.now();
+    fetch(`/progress/${nowPlaying.mediaType}/${nowPlaying.tmdbId}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ position: player.getCurrentTime(), duration: duration }),
+        keepalive: true
+    }).catch(err => console.error(err));
+}
+
+// Leaving the page with the trailer still open
+window.addEventListener('pagehide', sendProgress);
+
 function seekVideo(event) {
     if (!player) return;
     const container = document.querySelector('.progress-container');
@@ -284,7 +319,7 @@ function openMoreInfo(mediaType, tmdbId) {
             if (data.error) return;
 
             // 2. Populate Data
-            document.getElementById('info-backdrop').src = `https://image.tmdb.org/t/p/original${data.backdrop_path}`;
+            document.getElementById('info-backdrop').src = `/img/w1920${data.backdrop_path}`;
             
             const logoImg = document.getElementById('modal-logo');
             const titleText = document.getElementById('modal-title');
@@ -295,7 +330,7 @@ function openMoreInfo(mediaType, tmdbId) {
             }
 
             if (logoPath) {
-                logoImg.src = `https://image.tmdb.org/t/p/w500${logoPath}`;
+                logoImg.src = `/img/w500${logoPath}`;
                 logoImg.style.display = 'block';
                 titleText.style.display = 'none';
             } else {
@@ -334,8 +369,8 @@ function openMoreInfo(mediaType, tmdbId) {
             // This updates the onclick to include the specific ID and Type
             listBtn.setAttribute('onclick', `toggleMyList(event, this, '${mediaType}', ${tmdbId})`);
             
-            // Reset button visual state
-            listBtn.innerHTML = '<i class="fas fa-plus"></i> My List';
+            // Show whether it's already on the list
+            listBtn.innerHTML = `<i class="fas ${listIconClass(mediaType, tmdbId)}"></i> My List`;
         })
         .catch(err => console.error(err));
 }
@@ -383,6 +418,35 @@ window.onclick = function(event) {
 
 
 /* --- TOGGLE MY LIST (Final Polish) --- */
+/* --- MY LIST STATE --- */
+// "movie:550"-style keys of every title on the active profile's list, so cards
+// built here in JS (infinite scroll, the info modal) show the right icon
+let savedTitles = new Set();
+
+function loadSavedTitles() {
+    fetch('/api/my-list/ids')
+        .then(response => response.ok ? response.json() : { saved: [] })
+        .then(data => {
+            savedTitles = new Set(data.saved);
+            markSavedTitles(document);
+        })
+        .catch(() => {});
+}
+
+// Homepage rows are shared by every user (see row.html): their My List icons
+// carry data-title and are switched to a check here
+function markSavedTitles(root) {
+    root.querySelectorAll('i[data-title]').forEach(icon => {
+        const saved = savedTitles.has(icon.dataset.title);
+        icon.classList.toggle('fa-check', saved);
+        icon.classList.toggle('fa-plus', !saved);
+    });
+}
+
+function listIconClass(mediaType, tmdbId) {
+    return savedTitles.has(`${mediaType}:${tmdbId}`) ? 'fa-check' : 'fa-plus';
+}
+
 function toggleMyList(event, btn, mediaType, tmdbId, title) {
     if (event) {
         event.stopPropagation();
@@ -416,6 +480,9 @@ function toggleMyList(event, btn, mediaType, tmdbId, title) {
         return response.json();
     })
     .then(data => {
+        if (data.status === 'added') savedTitles.add(`${mediaType}:${tmdbId}`);
+        if (data.status === 'removed') savedTitles.delete(`${mediaType}:${tmdbId}`);
+
         if (window.location.pathname === '/my-list' && data.status === 'removed') {
             const card = document.getElementById(`card-${tmdbId}`);
             if (card) {
@@ -529,52 +596,91 @@ function toggleCardIcon(event, btn, type) {
 }
 
 
-document.addEventListener("DOMContentLoaded", () => {
-    // 1. Target '.row' instead of '.movie-row' based on your HTML
-    const rows = document.querySelectorAll('.row');
-
-    const observer = new IntersectionObserver((entries) => {
-        entries.forEach(entry => {
-            if (entry.isIntersecting) {
-                const row = entry.target.parentElement;
-                loadMoreMovies(row, entry.target);
-            }
-        });
-    }, {
-        root: null,
-        rootMargin: '0px 300px 0px 0px',
-        threshold: 0.1
+const rowObserver = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            const row = entry.target.parentElement;
+            loadMoreMovies(row, entry.target);
+        }
     });
+}, {
+    root: null,
+    rootMargin: '0px 300px 0px 0px',
+    threshold: 0.1
+});
 
-    rows.forEach(row => {
-        row.setAttribute('data-page', '1');
-        
-        // Grab the ID you added to the HTML (e.g., "popular")
-        let genre = row.id; 
-        if (!genre) return; // Skip rows that don't have an ID
-        
-        row.setAttribute('data-genre', genre);
+function setupRow(row) {
+    // Grab the ID you added to the HTML (e.g., "popular")
+    let genre = row.id; 
+    if (!genre) return; // Skip rows that don't have an ID
+    
+    row.setAttribute('data-genre', genre);
+
+    const sentinel = document.createElement('div');
+    sentinel.className = 'scroll-sentinel';
+    sentinel.style.minWidth = "10px";
+    sentinel.style.height = "100%";
+    sentinel.style.background = "transparent";
+    sentinel.style.flexShrink = "0"; 
 
-        const sentinel = document.createElement('div');
-        sentinel.className = 'scroll-sentinel';
-        sentinel.style.minWidth = "10px";
-        sentinel.style.height = "100%";
-        sentinel.style.background = "transparent";
-        sentinel.style.flexShrink = "0"; 
+    row.appendChild(sentinel);
+    rowObserver.observe(sentinel);
+}
 
-        row.appendChild(sentinel);
-        observer.observe(sentinel);
+// Homepage rows below the fold arrive as empty .row-slot placeholders and are
+// fetched from /rows/<name> a little before they scroll into view
+const slotObserver = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            slotObserver.unobserve(entry.target);
+            loadRowSlot(entry.target);
+        }
     });
+}, {
+    root: null,
+    rootMargin: '600px 0px'
+});
+
+async function loadRowSlot(slot) {
+    try {
+        const response = await fetch(`/rows/${slot.dataset.row}`);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+        const template = document.createElement('template');
+        template.innerHTML = await response.text();
+        markSavedTitles(template.content);
+        const rows = template.content.querySelectorAll('.row');
+
+        slot.replaceWith(template.content);
+        rows.forEach(setupRow);
+    } catch (error) {
+        console.error("Error loading row:", error);
+        slot.remove();
+    }
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    loadSavedTitles();
+
+    // 1. Target '.row' instead of '.movie-row' based on your HTML
+    document.querySelectorAll('.row').forEach(setupRow);
+    document.querySelectorAll('.row-slot').forEach(slot => slotObserver.observe(slot));
 });
 
 async function loadMoreMovies(row, sentinel) {
     const genre = row.getAttribute('data-genre');
-    let currentPage = parseInt(row.getAttribute('data-page'));
-    const nextPage = currentPage + 1;
+
+    // Don't fire a second request for the same cursor while one is in flight
+    if (row.dataset.loading === 'true') return;
+    row.dataset.loading = 'true';
+
+    // The server renders the first cursor into the row (data-cursor)
+    const cursor = row.getAttribute('data-cursor') || '';
 
     try {
-        const response = await fetch(`/api/movies/${genre}?page=${nextPage}`);
-        const movies = await response.json();
+        const response = await fetch(`/api/movies/${genre}?after=${encodeURIComponent(cursor)}`);
+        const data = await response.json();
+        const movies = data.movies || [];
 
         if (movies.length === 0) {
             sentinel.remove(); 
@@ -597,11 +703,11 @@ async function loadMoreMovies(row, sentinel) {
             // Replicate exact HTML structure
             movieCard.innerHTML = `
                 <picture>
-                    <source media="(max-width: 768px)" srcset="https://image.tmdb.org/t/p/w300${movie.poster_path}">
-                    <img src="https://image.tmdb.org/t/p/w300${movie.backdrop_path}" alt="${movie.title}" class="bg-image">
+                    <source media="(max-width: 768px)" srcset="/img/w300${movie.poster_path}">
+                    <img src="/img/w300${movie.backdrop_path}" alt="${movie.title}" class="bg-image">
                 </picture>
 
-                ${hasLogo ? `<img src="https://image.tmdb.org/t/p/w300${movie.logo_path}" class="card-logo">` 
+                ${hasLogo ? `<img src="/img/w300${movie.logo_path}" class="card-logo">` 
                           : `<p class="default-title">${movie.title}</p>`}
 
                 <div class="card-overlay">
@@ -610,7 +716,7 @@ async function loadMoreMovies(row, sentinel) {
                             <i class="fas fa-play"></i>
                         </button>
                         <button class="mini-btn" onclick="event.stopPropagation(); toggleMyList(event, this, '${movie.media_type}', ${movie.tmdb_id})">
-                            <i class="fas fa-plus"></i>
+                            <i class="fas ${listIconClass(movie.media_type, movie.tmdb_id)}"></i>
                         </button>
                         <button class="mini-btn" onclick="event.stopPropagation(); toggleCardIcon(event, this, 'like')">
                             <i class="far fa-thumbs-up"></i>
@@ -627,9 +733,15 @@ async function loadMoreMovies(row, sentinel) {
             row.insertBefore(movieCard, sentinel);
         });
 
-        row.setAttribute('data-page', nextPage);
+        if (data.next_cursor) {
+            row.setAttribute('data-cursor', data.next_cursor);
+        } else {
+            sentinel.remove();
+        }
 
     } catch (error) {
         console.error("Error fetching more movies:", error);
+    } finally {
+        row.dataset.loading = 'false';
     }
 }
\ No newline at end of file
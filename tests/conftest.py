@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import pytest
+
+# The modules live at the top of the repo, not in a package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# app.py and db.py read these at import: keep the tests off the real netflix.db and its caches
+SCRATCH = tempfile.mkdtemp(prefix='netflix-tests-')
+os.environ.update(NETFLIX_DB=os.path.join(SCRATCH, 'unused.db'), NETFLIX_CACHE_TYPE='SimpleCache',
+                  TMDB_CACHE_DB=os.path.join(SCRATCH, 'tmdb_cache.db'),
+                  NETFLIX_IMAGE_CACHE=os.path.join(SCRATCH, 'image_cache'),
+                  NETFLIX_PROGRESS_FLUSH_MS='0', LOGIN_IP_PER_MINUTE='0', LOGIN_EMAIL_PER_MINUTE='0')
+
+
+@pytest.fixture
+def conn(tmp_path):
+    # An empty netflix.db with every table seed.py creates
+    import seed
+    conn = sqlite3.connect(tmp_path / 'netflix.db')
+    conn.row_factory = sqlite3.Row
+    seed.create_tables(conn)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(conn, tmp_path, monkeypatch):
+    # A test client for app.py on the `conn` database, with every in-process cache emptied
+    import app
+    import db
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'netflix.db'))
+    for pool in db.pools.values():
+        pool.close_all()
+    app.cache.clear()
+    for lru in (app.user_cache, app.row_fragments, app.hero_rotations, app.hero_fragments,
+                app.recommendation_rows, app.http_cache.bodies, app.search_cache.lru):
+        lru.clear()
+    app.search_cache.version = None
+    app.catalog_version.reset()
+    yield app.app.test_client()
+    for pool in db.pools.values():
+        pool.close_all()
+
+
+def add_title(conn, tmdb_id, title, media_type='movie', genre='popular', vote=7.0, overview=''):
+    conn.execute("""
+        INSERT INTO movies (tmdb_id, title, overview, poster_path, backdrop_path, vote_average, media_type, genre)
+        VALUES (?, ?, ?, '/poster.jpg', '/backdrop.jpg', ?, ?, ?)
+    """, (tmdb_id, title, overview, vote, media_type, genre))
+
+
+def add_user(conn, email, password='secret', profiles=('Main',)):
+    # Returns (user id, [profile ids])
+    from werkzeug.security import generate_password_hash
+    user_id = conn.execute('INSERT INTO users (email, password, name) VALUES (?, ?, ?)',
+                           (email, generate_password_hash(password), email.split('@')[0])).lastrowid
+    profile_ids = [conn.execute('INSERT INTO profiles (user_id, name, avatar) VALUES (?, ?, ?)',
+                                (user_id, name, 'avatar-blue')).lastrowid for name in profiles]
+    conn.commit()
+    return user_id, profile_ids
@@ -0,0 +1,149 @@
+import gzip
+import app
+import catalog
+from conftest import add_title, add_user
+
+REMOTE = {'REMOTE_ADDR': '203.0.113.7'}
+
+
+def log_in(client, email, password='secret'):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, response.status_code
+
+
+def test_diagnostics_are_for_operators_only(client, conn, monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    monkeypatch.delenv('METRICS_ALLOW_LOCAL', raising=False)
+    add_user(conn, 'viewer@example.com')
+    log_in(client, 'viewer@example.com')
+    for path in ('/metrics', '/api/slow-queries', '/api/profile'):
+        # Closed by default: being logged in, or behind a proxy on localhost, isn't enough
+        assert client.get(path, environ_base=REMOTE).status_code == 403
+        assert client.get(path).status_code == 403
+
+    monkeypatch.setenv('METRICS_ALLOW_LOCAL', '1')
+    assert client.get('/api/slow-queries').status_code == 200
+    assert client.get('/api/slow-queries', environ_base=REMOTE).status_code == 403
+
+    # A token replaces the localhost rule
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape-me')
+    assert client.get('/api/slow-queries').status_code == 403
+    assert client.get('/api/slow-queries', environ_base=REMOTE,
+                      headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/api/slow-queries', environ_base=REMOTE,
+                      headers={'Authorization': 'Bearer scrape-me'}).status_code == 200
+
+
+def test_set_profile_checks_ownership_against_the_database(client, conn):
+    _, (mine, spare) = add_user(conn, 'viewer@example.com', profiles=('Main', 'Spare'))
+    _, (theirs,) = add_user(conn, 'other@example.com')
+    log_in(client, 'viewer@example.com')
+    client.get('/profiles')  # caches the profile list
+
+    assert client.get(f'/set_profile/{theirs}').headers['Location'].endswith('/profiles')
+    assert client.get(f'/set_profile/{mine}').headers['Location'] == '/'
+
+    # Deleted on another device: the cached list still has it, the database doesn't
+    conn.execute('DELETE FROM profiles WHERE id = ?', (spare,))
+    conn.commit()
+    assert client.get(f'/set_profile/{spare}').headers['Location'].endswith('/profiles')
+    with client.session_transaction() as session:
+        assert session['profile_id'] == mine
+
+
+def test_api_movies_cursor_pages_match_the_legacy_pages(client, conn):
+    for n in range(1, 46):
+        add_title(conn, n, f'Title {n}', genre='action')
+    catalog.rebuild_genre_index(conn)
+    add_user(conn, 'viewer@example.com')
+    log_in(client, 'viewer@example.com')
+
+    by_cursor, after = [], ''
+    while after is not None:
+        body = client.get(f'/api/movies/action?after={after}').get_json()
+        by_cursor.extend(movie['tmdb_id'] for movie in body['movies'])
+        after = body['next_cursor']
+    by_page = [movie['tmdb_id'] for page in (1, 2, 3) for movie in client.get(f'/api/movies/action?page={page}').get_json()]
+    assert by_cursor == by_page == list(range(1, 46))
+    assert client.get('/api/movies/anime?after=' + catalog.encode_cursor('action', 1, 1)).status_code == 400
+
+
+def home_catalog(conn):
+    for n in range(1, 11):
+        add_title(conn, n, f'Title {n}', genre='popular,trending', vote=8.0)
+    for n in range(11, 16):
+        add_title(conn, n, f'Show {n}', media_type='tv', genre='anime')
+    catalog.rebuild_genre_index(conn)
+
+
+def watching(client, conn, saved=()):
+    _, (profile_id,) = add_user(conn, 'viewer@example.com')
+    conn.executemany("INSERT INTO mylist (profile_id, media_type, tmdb_id) VALUES (?, 'movie', ?)",
+                     [(profile_id, tmdb_id) for tmdb_id in saved])
+    conn.commit()
+    log_in(client, 'viewer@example.com')
+    client.get(f'/set_profile/{profile_id}')
+
+
+def test_browse_pages_share_one_row_build_per_catalog_version(client, conn, monkeypatch):
+    home_catalog(conn)
+    watching(client, conn)
+    builds = []
+    materialize_rows = catalog.materialize_rows
+    monkeypatch.setattr(catalog, 'materialize_rows', lambda conn: builds.append(1) or materialize_rows(conn))
+
+    for path in ('/movies', '/tvshows', '/new-popular'):
+        assert client.get(path).status_code == 200
+    assert 'Title 1<' in client.get('/movies').get_data(as_text=True)
+    assert len(builds) == 1
+
+    add_title(conn, 17, 'Title 17', genre='popular')
+    catalog.add_genre_tags(conn, 17, 'movie', ['popular'])
+    catalog.bump_catalog_version(conn)
+    conn.commit()
+    app.catalog_version.reset()
+    assert 'Title 17' in client.get('/movies').get_data(as_text=True)
+    assert len(builds) == 2
+
+
+def test_index_streams_the_first_rows_and_leaves_slots_for_the_rest(client, conn):
+    home_catalog(conn)
+    watching(client, conn, saved=[3])
+    response = client.get('/')
+    assert response.is_streamed
+    assert response.headers['Cache-Control'] == 'private, no-cache' and 'ETag' not in response.headers
+    html = response.get_data(as_text=True)
+
+    assert 'Popular on Netflix' in html and 'Trending Now' in html
+    assert 'data-row="anime"' in html and 'Show 11' not in html
+    # The shared rows are marked per user: title 3 is on this profile's list
+    assert 'fa-check" data-title="movie:3"' in html and 'fa-plus" data-title="movie:4"' in html
+
+
+def test_index_is_compressed_as_it_streams(client, conn):
+    home_catalog(conn)
+    watching(client, conn)
+    plain = client.get('/').get_data(as_text=True)
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()).decode() == plain
+
+
+def test_row_fragments_are_shared_cached_and_follow_the_catalog(client, conn):
+    home_catalog(conn)
+    watching(client, conn, saved=[11])
+    response = client.get('/rows/anime')
+    html = response.get_data(as_text=True)
+    assert 'Anime' in html and 'Show 11' in html and 'Title 1<' not in html
+    # Shared by everyone, so no user's My List marks
+    assert 'fa-check' not in html
+    assert client.get('/rows/anime', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/rows/nope').status_code == 404
+
+    add_title(conn, 16, 'Show 16', media_type='tv', genre='anime')
+    catalog.add_genre_tags(conn, 16, 'tv', ['anime'])
+    catalog.bump_catalog_version(conn)
+    conn.commit()
+    app.catalog_version.reset()
+    assert client.get('/rows/anime', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+    assert 'Show 16' in client.get('/rows/anime').get_data(as_text=True)
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import pytest
+import auth
+
+
+@pytest.fixture
+def hasher():
+    hasher = auth.PasswordHasher(method='scrypt:1024:8:1', workers=1, queue_limit=2, timeout=30)
+    yield hasher
+    if hasher.pool:
+        hasher.pool.shutdown(wait=True)
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_hash_and_verify(hasher):
+    pwhash = hasher.hash('secret')
+    assert hasher.verify(pwhash, 'secret') and not hasher.verify(pwhash, 'wrong')
+    assert not hasher.needs_rehash(pwhash)
+    assert hasher.needs_rehash(pwhash.replace('scrypt:1024', 'scrypt:32768'))
+
+
+def test_full_queue_is_rejected_at_once(hasher):
+    sleepers = [threading.Thread(target=hasher.run, args=(time.sleep, 1)) for _ in range(2)]
+    for thread in sleepers:
+        thread.start()
+    wait_for(lambda: hasher.stats()['in_flight'] == 2)
+
+    started = time.monotonic()
+    with pytest.raises(auth.HasherBusy):
+        hasher.hash('secret')
+    assert time.monotonic() - started < 0.5
+    assert hasher.stats()['rejected'] == 1
+
+    for thread in sleepers:
+        thread.join()
+    assert hasher.stats()['in_flight'] == 0
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes(hasher):
+    hasher.timeout = 0.1
+    with pytest.raises(auth.HasherBusy):
+        hasher.run(time.sleep, 1)
+    assert hasher.stats()['in_flight'] == 1
+    wait_for(lambda: hasher.stats()['in_flight'] == 0)
+
+
+def test_dead_worker_doesnt_break_every_later_login(hasher):
+    # A worker killed mid-hash (os._exit stands in for the OOM killer) breaks the pool
+    broken = hasher.executor()
+    with pytest.raises(Exception):
+        broken.submit(os._exit, 1).result()
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    assert hasher.pool is not broken
+    assert hasher.stats()['in_flight'] == 0
+
+
+def test_inline_hashing_without_workers():
+    hasher = auth.PasswordHasher(method='scrypt:1024:8:1', workers=0)
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+    assert hasher.pool is None
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, 'monotonic', clock)
+    return clock
+
+
+def test_rate_limiter_allows_a_burst_then_refills(clock):
+    limiter = auth.RateLimiter(rate=1, burst=3)
+    assert [limiter.allow('1.2.3.4') for _ in range(3)] == [0, 0, 0]
+    assert limiter.allow('1.2.3.4') == pytest.approx(1)
+    assert limiter.limited == 1
+
+    clock.now += 0.5
+    assert limiter.allow('1.2.3.4') == pytest.approx(0.5)
+    clock.now += 1
+    assert limiter.allow('1.2.3.4') == 0
+
+
+def test_rate_limiter_keys_are_independent(clock):
+    limiter = auth.RateLimiter(rate=1, burst=1)
+    assert limiter.allow('a@example.com') == 0
+    assert limiter.allow('a@example.com') > 0
+    assert limiter.allow('b@example.com') == 0
+
+
+def test_rate_limiter_forgets_the_oldest_keys(clock):
+    limiter = auth.RateLimiter(rate=1, burst=1, max_keys=2)
+    for key in ('a', 'b', 'c'):
+        assert limiter.allow(key) == 0
+    assert list(limiter.buckets) == ['b', 'c']
+    # A forgotten key starts over with a full bucket
+    assert limiter.allow('a') == 0
+    assert limiter.allow('c') > 0
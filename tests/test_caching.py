@@ -0,0 +1,277 @@
+import asyncio
+import threading
+import time
+import pytest
+import caching
+from caching import LRUCache, ResponseCache, SQLiteCache
+
+
+def fill_with_hot_keys(cache, count, requests=50):
+    for n in range(count):
+        cache.put(f'hot{n}', n)
+        for _ in range(requests):
+            assert cache.get(f'hot{n}') == n
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, admission=False)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.peek('a') == 1
+    assert cache.peek('b') is None
+    assert cache.peek('c') == 3
+
+
+def test_lru_respects_max_bytes():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.put('a', 'x', size=6)
+    cache.put('b', 'y', size=6)
+    assert cache.peek('a') is None
+    assert cache.peek('b') == 'y'
+    cache.put('huge', 'z', size=11)
+    assert cache.peek('huge') is None
+
+
+def test_one_off_keys_dont_flush_hot_ones():
+    cache = LRUCache(max_entries=4)
+    fill_with_hot_keys(cache, 4, requests=5)
+    for n in range(4):
+        cache.get(f'hot{n}')
+    cache.get('once')
+    cache.put('once', 'x')
+    assert cache.peek('once') is None
+    assert all(cache.peek(f'hot{n}') == n for n in range(4))
+
+
+def test_new_keys_are_admitted_once_the_key_space_moves_on():
+    cache = LRUCache(max_entries=8)
+    fill_with_hot_keys(cache, 8)
+
+    # The hot keys stop being asked for; a few lookups later they count as stale
+    admitted = []
+    for n in range(40):
+        key = f'new{n}'
+        assert cache.get(key) is None
+        cache.put(key, n)
+        admitted.append(cache.peek(key) == n)
+    assert all(admitted[8:])
+    assert all(cache.peek(f'hot{n}') is None for n in range(8))
+
+
+def test_plain_lru_admits_new_keys_on_first_put():
+    cache = LRUCache(max_entries=8, admission=False)
+    fill_with_hot_keys(cache, 8)
+    for n in range(20):
+        cache.put(f'v2:{n}', n)
+        assert cache.peek(f'v2:{n}') == n
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def response_cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / 'tmdb_cache.db'), **kwargs)
+
+
+def backdate(cache, key, seconds):
+    status, body, fetched_at = cache.lookup(key)
+    cache.memory.put(key, (status, body, fetched_at - seconds), 100)
+
+
+def test_response_cache_serves_stale_while_one_refresh_runs(tmp_path):
+    cache = response_cache(tmp_path, ttl=60, stale_ttl=600)
+    assert cache.get('movie/1', lambda: (200, {'v': 1})) == (200, {'v': 1})
+    backdate(cache, 'movie/1', 120)
+
+    release = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        release.wait(5)
+        return 200, {'v': 2}
+
+    # Every reader gets the stale body straight away; only one refresh goes upstream
+    assert [cache.get('movie/1', refresh) for _ in range(5)] == [(200, {'v': 1})] * 5
+    release.set()
+    cache.refresher.shutdown(wait=True)
+    assert len(calls) == 1
+    assert cache.get('movie/1', refresh) == (200, {'v': 2})
+    assert cache.stats()['stale_hits'] == 5
+
+
+def test_response_cache_falls_back_to_expired_entry_when_upstream_fails(tmp_path):
+    cache = response_cache(tmp_path, ttl=60, stale_ttl=60)
+    cache.get('movie/1', lambda: (200, {'v': 1}))
+    backdate(cache, 'movie/1', 600)
+
+    def down():
+        raise ConnectionError('TMDB is down')
+
+    assert cache.get('movie/1', down) == (200, {'v': 1})
+    with pytest.raises(ConnectionError):
+        cache.get('movie/2', down)
+    # Failures are never cached
+    assert cache.get('movie/2', lambda: (200, {'v': 2})) == (200, {'v': 2})
+
+
+def test_response_cache_misses_share_one_fetch(tmp_path):
+    cache = response_cache(tmp_path)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 200, {'v': 1}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get('movie/1', slow)))
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=lambda: results.append(cache.get('movie/1', slow))) for _ in range(4)]
+    for thread in others:
+        thread.start()
+    release.set()
+    for thread in [first, *others]:
+        thread.join(5)
+    assert results == [(200, {'v': 1})] * 5
+    assert len(calls) == 1
+
+
+def test_response_cache_aget_misses_share_one_fetch(tmp_path):
+    cache = response_cache(tmp_path)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 404, None
+
+    async def main():
+        return await asyncio.gather(*(cache.aget('movie/1', slow) for _ in range(5)))
+
+    assert asyncio.run(main()) == [(404, None)] * 5
+    assert len(calls) == 1
+    # 404s are cached too, for negative_ttl
+    assert cache.get('movie/1', slow) == (404, None) and len(calls) == 1
+
+
+def test_response_cache_aget_keeps_sqlite_off_the_event_loop(tmp_path):
+    response_cache(tmp_path).get('movie/1', lambda: (200, {'v': 1}))
+    cache = response_cache(tmp_path)  # a new process: empty memory, same file
+    threads = []
+
+    def recorded(method):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return wrapper
+
+    cache.lookup, cache.save = recorded(cache.lookup), recorded(cache.save)
+
+    async def fetch():
+        return 200, {'v': 2}
+
+    async def main():
+        return await cache.aget('movie/1', fetch), await cache.aget('movie/2', fetch)
+
+    assert asyncio.run(main()) == ((200, {'v': 1}), (200, {'v': 2}))
+    assert len(threads) == 3 and threading.main_thread() not in threads
+
+
+def test_response_cache_aget_refreshes_stale_entries_once(tmp_path):
+    cache = response_cache(tmp_path, ttl=60, stale_ttl=600)
+    cache.get('movie/1', lambda: (200, {'v': 1}))
+    backdate(cache, 'movie/1', 120)
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 200, {'v': 2}
+
+    async def main():
+        stale = await asyncio.gather(*(cache.aget('movie/1', refresh) for _ in range(5)))
+        await asyncio.gather(*cache.async_inflight.values())
+        return stale, await cache.aget('movie/1', refresh)
+
+    stale, fresh = asyncio.run(main())
+    assert stale == [(200, {'v': 1})] * 5 and fresh == (200, {'v': 2})
+    assert len(calls) == 1
+
+
+def sqlite_cache(tmp_path, **kwargs):
+    return SQLiteCache(str(tmp_path / 'app_cache.db'), **kwargs)
+
+
+def test_sqlite_cache_get_set_add_delete(tmp_path):
+    cache = sqlite_cache(tmp_path)
+    assert cache.get('row') is None
+    assert cache.set('row', {'titles': [1, 2]})
+    assert cache.get('row') == {'titles': [1, 2]} and cache.has('row')
+    assert not cache.add('row', 'other')
+    assert cache.add('new', 'value') and cache.get('new') == 'value'
+    assert cache.delete('row') and not cache.has('row')
+    assert cache.inc('version') == 1 and cache.inc('version', 5) == 6 and cache.dec('version') == 5
+
+
+def test_sqlite_cache_is_shared_through_the_file(tmp_path):
+    sqlite_cache(tmp_path).set('row', 'warmed once')
+    assert sqlite_cache(tmp_path).get('row') == 'warmed once'
+
+
+def test_sqlite_cache_expiry(tmp_path, monkeypatch):
+    cache = sqlite_cache(tmp_path)
+    cache.set('short', 1, timeout=10)
+    cache.set('forever', 2, timeout=0)
+    now = time.time()
+    monkeypatch.setattr(caching.time, 'time', lambda: now + 11)
+    assert cache.get('short') is None and not cache.has('short')
+    assert cache.get('forever') == 2
+    # An expired key counts as missing for add()
+    assert cache.add('short', 3) and cache.get('short') == 3
+
+
+def test_sqlite_cache_prunes_least_recently_read(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: clock[0])
+    cache = sqlite_cache(tmp_path, threshold=10, default_timeout=0)
+    for n in range(10):
+        clock[0] += 60
+        cache.set(f'key{n}', n)
+    clock[0] += 60
+    assert cache.get('key0') == 0  # read recently: survives
+
+    clock[0] += 60
+    cache.set('key10', 10)
+    assert cache.connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0] <= 10
+    assert cache.get('key0') == 0 and cache.get('key10') == 10
+    assert cache.get('key1') is None
+
+
+def test_sqlite_cache_prunes_by_size(tmp_path):
+    cache = sqlite_cache(tmp_path, threshold=1000, max_bytes=50 * 1024)
+    for n in range(20):
+        cache.set(f'key{n}', b'x' * 10 * 1024)
+    size = cache.connection().execute('SELECT SUM(size) FROM cache').fetchone()[0]
+    assert size <= 50 * 1024
+    assert cache.get('key19') is not None
+
+
+def test_sqlite_cache_doesnt_count_the_table_on_every_set(tmp_path):
+    cache = sqlite_cache(tmp_path, threshold=10000)
+    counts = []
+    cache.connection().set_trace_callback(lambda sql: counts.append(sql) if 'COUNT(*)' in sql else None)
+    for n in range(250):
+        cache.set(f'key{n}', n)
+    assert len(counts) <= 3
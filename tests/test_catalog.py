@@ -0,0 +1,138 @@
+import pytest
+import catalog
+from catalog import hero_pool, hero_rotation, pick_hero
+from conftest import add_title
+
+
+def title(tmdb_id, vote=8.0, logo='/logo.png'):
+    return {'media_type': 'movie', 'tmdb_id': tmdb_id, 'title': f'Title {tmdb_id}', 'vote_average': vote,
+            'logo_path': logo, 'backdrop_path': '/backdrop.jpg'}
+
+
+def test_hero_pool_tops_up_a_thin_catalog():
+    rows = [[title(1), title(2, vote=5.0), title(3, logo=None)], [title(1)]]
+    pool = hero_pool(rows)
+    assert [movie['tmdb_id'] for movie in pool] == [1, 3, 2]
+
+
+def test_hero_rotation_is_stable_and_per_slot():
+    pool = [title(n) for n in range(20)]
+    rotation = hero_rotation(pool)
+    assert rotation == hero_rotation(list(reversed(pool)))
+    assert sorted(movie['tmdb_id'] for movie in rotation) == list(range(20))
+    assert hero_rotation(pool, slot=1) != rotation
+
+
+def test_pick_hero_same_within_a_turn_different_across_turns():
+    rotation = hero_rotation([title(n) for n in range(5)])
+    turn = 1234
+    assert pick_hero(rotation, turn) is pick_hero(list(rotation), turn)
+    picks = [pick_hero(rotation, turn + n)['tmdb_id'] for n in range(5)]
+    assert len(set(picks)) == 5
+    assert pick_hero(rotation, turn + 5) is pick_hero(rotation, turn)
+    assert pick_hero([], turn) is None
+
+
+def tagged_catalog(conn, count, genre='action'):
+    for n in range(1, count + 1):
+        add_title(conn, n, f'Title {n}', media_type='movie' if n % 3 else 'tv', genre=genre)
+    catalog.rebuild_genre_index(conn)
+
+
+def test_cursor_paging_walks_the_row_once_in_order(conn):
+    tagged_catalog(conn, 45)
+    seen, after = [], None
+    while True:
+        page = catalog.fetch_row(conn, 'action', limit=20, after=after)
+        seen.extend(row['tmdb_id'] for row in page)
+        cursor = catalog.row_cursor(page)
+        if cursor is None:
+            break
+        after = catalog.decode_cursor(cursor, 'action')
+    assert seen == list(range(1, 46))
+    assert seen[:40] == [row['tmdb_id'] for offset in (0, 20) for row in catalog.fetch_row(conn, 'action', offset=offset)]
+
+
+def test_cursor_paging_is_unaffected_by_titles_added_in_front(conn):
+    tagged_catalog(conn, 30)
+    first = catalog.fetch_row(conn, 'action', limit=10)
+    after = catalog.decode_cursor(catalog.row_cursor(first), 'action')
+    # A refresh tags more titles; they land at the end of the row, not in the pages already seen
+    add_title(conn, 100, 'New', genre='action')
+    catalog.add_genre_tags(conn, 100, 'movie', ['action'])
+    assert [row['tmdb_id'] for row in catalog.fetch_row(conn, 'action', limit=10, after=after)] == list(range(11, 21))
+
+
+def test_cursor_belongs_to_its_row(conn):
+    tagged_catalog(conn, 5)
+    cursor = catalog.row_cursor(catalog.fetch_row(conn, 'action', limit=2))
+    with pytest.raises(ValueError):
+        catalog.decode_cursor(cursor, 'anime')
+    with pytest.raises(ValueError):
+        catalog.decode_cursor('not a cursor!', 'action')
+    assert catalog.row_cursor([]) is None
+
+
+@pytest.fixture
+def searchable(conn):
+    # Triggers keep the FTS indexes in step with movies
+    add_title(conn, 1, 'The Dark Knight', vote=9.0, overview='Batman faces the Joker in Gotham.')
+    add_title(conn, 2, 'Dark Waters', vote=7.0, overview='A lawyer takes on a chemical company.')
+    add_title(conn, 3, 'Knives Out', vote=8.0, overview='A detective investigates a dark family secret.')
+    add_title(conn, 4, 'Amélie', vote=8.5, overview='A shy waitress in Paris.')
+    conn.commit()
+    return conn
+
+
+def titles(rows):
+    return [row['title'] for row in rows]
+
+
+def test_prefix_search_matches_the_word_being_typed(searchable):
+    assert titles(catalog.search_titles(searchable, 'dar')) == ['The Dark Knight', 'Dark Waters', 'Knives Out']
+    # Title hits first; Knives Out only has "kn" in its title and "dark" in its overview
+    assert titles(catalog.search_titles(searchable, 'dark kn')) == ['The Dark Knight', 'Knives Out']
+    # Completed words match exactly: "dar" followed by another word isn't "dark"
+    assert catalog.search_titles(searchable, 'dar kn') == []
+
+
+def test_title_hits_rank_before_overview_hits(searchable):
+    rows = catalog.search_titles(searchable, 'dark')
+    assert titles(rows)[-1] == 'Knives Out'
+
+
+def test_search_ignores_case_accents_and_query_syntax(searchable):
+    assert titles(catalog.search_titles(searchable, 'AMELIE')) == ['Amélie']
+    assert titles(catalog.search_titles(searchable, '"knives*" (')) == ['Knives Out']
+    assert catalog.search_titles(searchable, '  ') == []
+
+
+def test_trigram_search_tolerates_typos_only_when_fuzzy(searchable):
+    assert catalog.search_titles(searchable, 'knigth') == []
+    assert titles(catalog.search_titles(searchable, 'knigth', fuzzy=True))[0] == 'The Dark Knight'
+    assert catalog.trigram_search(searchable, ['ab']) == []
+
+
+def test_search_index_follows_updates_and_deletes(searchable):
+    searchable.execute("UPDATE movies SET title = 'Dark Matter' WHERE tmdb_id = 2")
+    searchable.execute('DELETE FROM movies WHERE tmdb_id = 1')
+    assert titles(catalog.search_titles(searchable, 'dark m')) == ['Dark Matter']
+    assert 'The Dark Knight' not in titles(catalog.search_titles(searchable, 'dark'))
+    assert catalog.search_titles(searchable, 'waters') == []
+
+
+def test_materialize_rows_builds_every_row_in_one_query(conn):
+    for n in range(1, 31):
+        add_title(conn, n, f'Title {n}', media_type='movie' if n % 3 else 'tv',
+                  genre='trending,popular' if n % 2 else 'trending,us_tv_drama')
+    catalog.rebuild_genre_index(conn)
+    rows = catalog.materialize_rows(conn)
+
+    assert list(rows) == list(catalog.BROWSE_ROWS)
+    for name, (tag, media_type, limit) in catalog.BROWSE_ROWS.items():
+        expected = catalog.fetch_row(conn, tag, limit=limit, media_type=media_type)
+        assert [movie['tmdb_id'] for movie in rows[name]] == [movie['tmdb_id'] for movie in expected]
+    assert len(rows['trending']) == catalog.ROW_LIMIT and rows['anime'] == []
+    assert [movie['tmdb_id'] for movie in rows['top10_movies']] == [1, 2, 4, 5, 7, 8, 10, 11, 13, 14]
+    assert {movie['media_type'] for movie in rows['top10_tv']} == {'tv'}
+    assert 'row_name' not in rows['popular'][0] and rows['popular'][0]['row_tag'] == 'popular'
@@ -0,0 +1,36 @@
+import sqlite3
+import db
+import metrics
+
+
+def timed_connection():
+    conn = sqlite3.connect(':memory:', factory=db.TimedConnection)
+    conn.execute('CREATE TABLE numbers (n INTEGER)')
+    conn.executemany('INSERT INTO numbers VALUES (?)', [(n,) for n in range(1000)])
+    return conn
+
+
+def test_iterating_a_cursor_reads_lazily(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(metrics, 'record_query', lambda sql, seconds, rows, parameters: recorded.append(rows))
+    conn = timed_connection()
+    recorded.clear()
+
+    cursor = conn.execute('SELECT n FROM numbers ORDER BY n')
+    rows = iter(cursor)
+    assert [next(rows)[0] for _ in range(3)] == [0, 1, 2]
+    assert cursor.rows == db.ITER_CHUNK
+    cursor.close()
+    assert recorded == [db.ITER_CHUNK]
+
+
+def test_iterating_to_the_end_counts_every_row(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(metrics, 'record_query', lambda sql, seconds, rows, parameters: recorded.append(rows))
+    conn = timed_connection()
+    recorded.clear()
+
+    cursor = conn.execute('SELECT n FROM numbers')
+    assert sum(row[0] for row in cursor) == sum(range(1000))
+    cursor.close()
+    assert recorded == [1000]
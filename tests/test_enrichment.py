@@ -0,0 +1,66 @@
+import time
+import enrichment
+from conftest import add_title
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+
+class Client:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, path, **params):
+        return self.response
+
+
+def queue(conn, *titles):
+    enrichment.enqueue(conn, titles)
+    conn.commit()
+    conn.isolation_level = None  # claim_batch / save_batch open their own transactions
+
+
+def test_enqueue_skips_titles_already_in_the_catalog(conn):
+    add_title(conn, 1, 'In the catalog')
+    assert enrichment.enqueue(conn, [('movie', 1), ('movie', 2)]) == 1
+
+
+def test_claim_is_a_lease(conn):
+    queue(conn, ('movie', 1), ('tv', 2))
+    assert sorted(enrichment.claim_batch(conn, lease=60)) == [('movie', 1, 1), ('tv', 2, 1)]
+    # Leased: nobody else gets them until the lease runs out
+    assert enrichment.claim_batch(conn, lease=60) == []
+
+    conn.execute('UPDATE enrich_jobs SET next_attempt_at = ?', (time.time() - 1,))
+    assert sorted(enrichment.claim_batch(conn)) == [('movie', 1, 2), ('tv', 2, 2)]
+
+
+def test_claim_respects_the_limit_oldest_first(conn):
+    queue(conn, *[('movie', n) for n in range(5)])
+    for n in range(5):
+        conn.execute('UPDATE enrich_jobs SET next_attempt_at = ? WHERE tmdb_id = ?', (time.time() - 100 + n, n))
+    assert [job[1] for job in enrichment.claim_batch(conn, limit=2)] == [0, 1]
+
+
+def test_invalid_json_is_a_failed_attempt(conn):
+    assert enrichment.fetch_title(Client(Response(200, ValueError('truncated'))), 'movie', 1)[0] == 'retry'
+
+    queue(conn, ('movie', 1))
+    assert enrichment.run_batch(conn, Client(Response(200, ValueError('truncated')))) == 1
+    job = conn.execute('SELECT attempts, next_attempt_at, last_error FROM enrich_jobs').fetchone()
+    assert job['attempts'] == 1 and job['next_attempt_at'] > time.time()
+    assert job['last_error'] == 'invalid JSON from TMDB'
+
+
+def test_missing_titles_give_up(conn):
+    queue(conn, ('movie', 1))
+    enrichment.run_batch(conn, Client(Response(404)))
+    assert conn.execute('SELECT next_attempt_at FROM enrich_jobs').fetchone()[0] is None
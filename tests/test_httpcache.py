@@ -0,0 +1,41 @@
+from flask import Flask, jsonify
+from httpcache import HTTPCache
+
+
+def make_app(version):
+    app = Flask(__name__)
+    http_cache = HTTPCache(lambda: version[0])
+    calls = []
+
+    @app.route('/rows')
+    @http_cache.cached(max_age=60)
+    def rows():
+        calls.append(version[0])
+        return jsonify({'version': version[0]})
+
+    return app, http_cache, calls
+
+
+def test_matching_etag_is_a_304_without_running_the_view():
+    app, _, calls = make_app([1])
+    client = app.test_client()
+    first = client.get('/rows')
+    assert first.status_code == 200
+    again = client.get('/rows', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert calls == [1]
+
+
+def test_version_bump_drops_old_bodies():
+    version = [1]
+    app, http_cache, calls = make_app(version)
+    client = app.test_client()
+    old_etag = client.get('/rows').headers['ETag']
+    client.get('/rows')
+    assert calls == [1]
+
+    version[0] = 2
+    response = client.get('/rows', headers={'If-None-Match': old_etag})
+    assert response.status_code == 200 and response.get_json() == {'version': 2}
+    assert calls == [1, 2]
+    assert http_cache.stats()['entries'] == 1
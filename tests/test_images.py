@@ -0,0 +1,59 @@
+import os
+import pytest
+import images
+from conftest import add_user
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+
+class Session:
+    # Stands in for TMDB's image server: every file is 100 bytes of its own
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, timeout=None):
+        self.requests.append(url)
+        return Response(url.encode().ljust(100, b'.')[:100])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = images.ImageCache(str(tmp_path / 'image_cache'), session=Session(), max_bytes=1000)
+    yield cache
+    cache.index.close()
+
+
+def test_images_are_fetched_once(cache):
+    name = cache.get('w300', 'poster.jpg')
+    assert cache.get('w300', 'poster.jpg') == name
+    assert len(cache.session.requests) == 1
+    assert os.path.exists(cache.object_path(name))
+
+
+def test_cache_is_pruned_to_max_bytes_oldest_first(cache):
+    names = []
+    for n in range(15):
+        names.append(cache.get('w300', f'poster{n}.jpg'))
+        cache.index.execute('UPDATE images SET fetched_at = ? WHERE file = ?', (n, f'poster{n}.jpg'))
+        cache.index.commit()
+    assert cache.stats()['bytes'] <= 1000
+    assert not os.path.exists(cache.object_path(names[0]))
+    assert os.path.exists(cache.object_path(names[-1]))
+    assert cache.lookup('w300', 'poster14.jpg') == names[-1]
+
+    # A pruned image is fetched again on the next request
+    cache.get('w300', 'poster0.jpg')
+    assert cache.session.requests.count(images.upstream_url('w300', 'poster0.jpg')) == 2
+
+
+def test_img_needs_a_login(client, conn):
+    response = client.get('/img/w300/poster.jpg')
+    assert response.status_code == 302 and '/login' in response.headers['Location']
+    add_user(conn, 'viewer@example.com')
+    client.post('/login', data={'email': 'viewer@example.com', 'password': 'secret'})
+    assert client.get('/img/w300/not-a-file').status_code == 404
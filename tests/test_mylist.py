@@ -0,0 +1,61 @@
+import pytest
+import enrichment
+import mylist
+from conftest import add_title
+
+
+def listed(conn, profile_id=1):
+    return [(row['media_type'], row['tmdb_id']) for row in mylist.list_titles(conn, profile_id)]
+
+
+def test_toggle_adds_then_removes(conn):
+    assert mylist.toggle(conn, 1, 'movie', 550) == 'added'
+    assert mylist.saved_titles(conn, 1) == {'movie:550'}
+    assert mylist.toggle(conn, 1, 'movie', 550) == 'removed'
+    assert mylist.saved_titles(conn, 1) == set()
+
+
+def test_toggle_is_per_profile_and_media_type(conn):
+    mylist.toggle(conn, 1, 'movie', 550)
+    assert mylist.toggle(conn, 2, 'movie', 550) == 'added'
+    assert mylist.toggle(conn, 1, 'tv', 550) == 'added'
+    assert mylist.saved_titles(conn, 1) == {'movie:550', 'tv:550'}
+    assert conn.execute('SELECT COUNT(*) FROM mylist').fetchone()[0] == 3
+
+
+def test_reorder_puts_the_given_titles_first(conn):
+    for tmdb_id in (1, 2, 3, 4):
+        mylist.toggle(conn, 1, 'movie', tmdb_id)
+    assert listed(conn) == [('movie', 1), ('movie', 2), ('movie', 3), ('movie', 4)]
+
+    assert mylist.reorder(conn, 1, [('movie', 3), ('movie', 1)]) == 2
+    assert listed(conn) == [('movie', 3), ('movie', 1), ('movie', 2), ('movie', 4)]
+
+    # A new order replaces the old one, and titles not on the list are ignored
+    assert mylist.reorder(conn, 1, [('movie', 4), ('tv', 99)]) == 1
+    assert listed(conn) == [('movie', 4), ('movie', 1), ('movie', 2), ('movie', 3)]
+
+
+def test_reorder_leaves_other_profiles_alone(conn):
+    for profile_id in (1, 2):
+        for tmdb_id in (1, 2):
+            mylist.toggle(conn, profile_id, 'movie', tmdb_id)
+    mylist.reorder(conn, 1, [('movie', 2)])
+    assert listed(conn, 2) == [('movie', 1), ('movie', 2)]
+
+
+def test_list_titles_marks_pending_and_unavailable(conn):
+    add_title(conn, 1, 'In the catalog')
+    mylist.add_titles(conn, 1, [('movie', 1), ('movie', 2), ('movie', 3)])
+    enrichment.enqueue(conn, [('movie', 2), ('movie', 3)])
+    conn.execute('UPDATE enrich_jobs SET next_attempt_at = NULL WHERE tmdb_id = 3')
+    rows = {row['tmdb_id']: row for row in mylist.list_titles(conn, 1)}
+    assert (rows[1]['pending'], rows[2]['pending'], rows[3]['pending']) == (0, 1, 1)
+    assert (rows[2]['unavailable'], rows[3]['unavailable']) == (0, 1)
+
+
+def test_parse_title_key():
+    assert mylist.parse_title_key('TV:1399') == ('tv', 1399)
+    for bad in ('person:1', 'movie:', 'movie:-1', 550):
+        with pytest.raises(ValueError):
+            mylist.parse_title_key(bad)
@@ -0,0 +1,163 @@
+import os
+import sys
+import pytest
+import catalog
+import db
+import mylist
+import seed
+import tmdb
+from conftest import add_title
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+import stub_tmdb
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    # The stub TMDB with a small id space, so movies and shows often share an id
+    server, state, base_url = stub_tmdb.start(total_pages=2, catalog_size=300)
+    monkeypatch.setattr(tmdb, 'API_URL', base_url)
+    monkeypatch.setattr(seed.client, 'limiter', None)
+    monkeypatch.setattr(seed, 'REGIONS', ['US', 'GB'])
+    yield state
+    server.shutdown()
+
+
+def seeded(tmp_path, monkeypatch, name):
+    # Seeds a fresh database from the stub; returns its titles and row entries
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / name))
+    seed.save_to_db(pages=2)
+    conn = db.connect()
+    titles = {(row['tmdb_id'], row['media_type']): set(row['genre'].split(','))
+              for row in conn.execute('SELECT tmdb_id, media_type, genre FROM movies')}
+    rows = [tuple(row) for row in conn.execute('SELECT id, tag, tmdb_id, media_type FROM movie_genres ORDER BY id')]
+    conn.close()
+    return titles, rows
+
+
+def shadow_title(conn, tmdb_id, title, media_type='movie', tag='popular'):
+    conn.execute("""
+        INSERT INTO movies_next (tmdb_id, title, overview, poster_path, backdrop_path, media_type, genre)
+        VALUES (?, ?, '', '/poster.jpg', '/backdrop.jpg', ?, ?)
+    """, (tmdb_id, title, media_type, tag))
+    conn.execute('INSERT INTO movie_genres_next (tmdb_id, media_type, tag) VALUES (?, ?, ?)',
+                 (tmdb_id, media_type, tag))
+
+
+def test_swap_keeps_a_saved_title_that_shares_its_id_with_a_new_one(conn):
+    add_title(conn, 328, 'Saved Show', media_type='tv', genre='user_saved')
+    conn.execute("INSERT INTO movie_genres (tmdb_id, media_type, tag) VALUES (328, 'tv', 'user_saved')")
+    mylist.add_titles(conn, 1, [('tv', 328)])
+    seed.start_refresh(conn, 1)
+    shadow_title(conn, 328, 'New Movie')
+    seed.swap_in_refresh(conn)
+
+    titles = conn.execute('SELECT media_type, title FROM movies WHERE tmdb_id = 328 ORDER BY media_type').fetchall()
+    assert [tuple(row) for row in titles] == [('movie', 'New Movie'), ('tv', 'Saved Show')]
+    [saved] = mylist.list_titles(conn, 1)
+    assert (saved['title'], saved['pending']) == ('Saved Show', 0)
+
+
+def test_seed_gives_the_same_catalog_every_run(stub, tmp_path, monkeypatch):
+    first = seeded(tmp_path, monkeypatch, 'first.db')
+    second = seeded(tmp_path, monkeypatch, 'second.db')
+    assert first == second
+
+    titles, rows = first
+    # A movie and a show with the same id are two titles, each with its own tags
+    shared = {tmdb_id for tmdb_id, media_type in titles if media_type == 'movie'} & \
+             {tmdb_id for tmdb_id, media_type in titles if media_type == 'tv'}
+    assert shared
+    for tmdb_id in shared:
+        assert 'anime' not in titles[(tmdb_id, 'movie')] and 'bollywood' not in titles[(tmdb_id, 'tv')]
+    assert {(tmdb_id, media_type) for _, _, tmdb_id, media_type in rows} == set(titles)
+
+
+def test_a_title_that_fails_to_enrich_holds_back_its_pages(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'netflix.db'))
+    get_logo = tmdb.get_logo
+
+    def flaky_logo(data):
+        if data.get('id', 0) % 50 == 0:
+            raise ValueError('bad logo data')
+        return get_logo(data)
+
+    monkeypatch.setattr(tmdb, 'get_logo', flaky_logo)
+    seed.refresh_catalog(pages=2)
+
+    conn = db.connect()
+    # Nothing swapped in, and the failed titles' pages aren't checkpointed as done
+    assert conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM movies_next WHERE tmdb_id % 50 = 0').fetchone()[0] == 0
+    assert not seed.refresh_complete(conn)
+    conn.close()
+
+    monkeypatch.setattr(tmdb, 'get_logo', get_logo)
+    seed.refresh_catalog(pages=2)
+    conn = db.connect()
+    assert conn.execute('SELECT COUNT(*) FROM movies WHERE tmdb_id % 50 = 0').fetchone()[0] > 0
+    assert conn.execute('SELECT COUNT(*) FROM seed_state').fetchone()[0] == 0
+    conn.close()
+
+
+def test_swap_carries_saved_titles_over_with_their_enrichment(conn):
+    add_title(conn, 7, 'Dropped Out', genre='user_saved')
+    conn.execute("UPDATE movies SET age_rating = 'PG', enriched_at = 1700000000 WHERE tmdb_id = 7")
+    mylist.add_titles(conn, 1, [('movie', 7)])
+    seed.start_refresh(conn, 1)
+    seed.swap_in_refresh(conn)
+
+    row = conn.execute('SELECT age_rating, enriched_at FROM movies WHERE tmdb_id = 7').fetchone()
+    assert tuple(row) == ('PG', 1700000000)
+
+
+def test_interrupted_refresh_resumes_and_swaps_in_atomically(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'netflix.db'))
+    seed.save_to_db(pages=1)
+    conn = db.connect()
+    live = conn.execute('SELECT * FROM movies ORDER BY id').fetchall()
+    version = catalog.get_catalog_version(conn)
+    conn.close()
+
+    # Every page 2 fails: the refresh stops with page 1 of each query checkpointed
+    tmdb_get = seed.tmdb_get
+    requested, failing = [], {2}
+
+    def flaky_get(path, **params):
+        if path.startswith('/discover/'):
+            requested.append(params['page'])
+            if params['page'] in failing:
+                raise ConnectionError('TMDB went away')
+        return tmdb_get(path, **params)
+
+    monkeypatch.setattr(seed, 'tmdb_get', flaky_get)
+    seed.refresh_catalog(pages=2)
+
+    conn = db.connect()
+    assert [tuple(row) for row in conn.execute('SELECT * FROM movies ORDER BY id')] == [tuple(row) for row in live]
+    assert catalog.get_catalog_version(conn) == version
+    assert not seed.refresh_complete(conn)
+    assert {row['next_page'] for row in conn.execute('SELECT next_page FROM seed_state')} == {2}
+    conn.close()
+
+    # The resume only asks for what's missing
+    requested.clear()
+    failing.clear()
+    seed.refresh_catalog(pages=2)
+    assert set(requested) == {2}
+    assert len(requested) == len(seed.DISCOVER_QUERIES) * len(seed.REGIONS)
+
+    conn = db.connect()
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_next'").fetchall() == []
+    assert catalog.get_catalog_version(conn) != version
+    count = conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+    assert count > len(live)
+
+    # The search index matches the swapped-in table, and its triggers follow later writes
+    for table in catalog.SEARCH_INDEXES:
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('integrity-check')")
+    add_title(conn, 999999, 'Zyzzyva Returns')
+    assert [row['tmdb_id'] for row in catalog.search_titles(conn, 'zyzzyva')] == [999999]
+    conn.execute('DELETE FROM movies WHERE tmdb_id = 999999')
+    assert catalog.search_titles(conn, 'zyzzyva') == []
+    conn.close()
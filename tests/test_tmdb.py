@@ -0,0 +1,98 @@
+import asyncio
+import time
+import pytest
+import requests
+import tmdb
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class Session:
+    # Answers every get() with the next outcome: a status code, or an exception to raise
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+
+def half_open_client(*outcomes):
+    breaker = tmdb.CircuitBreaker(threshold=1, cooldown=60)
+    breaker.opened_at = time.monotonic() - 61
+    client = tmdb.TMDBClient(retries=2, breaker=breaker)
+    client.session = Session(*outcomes)
+    client.backoff = lambda attempt, response=None: 0
+    return client
+
+
+def test_breaker_rejects_calls_while_open():
+    client = half_open_client()
+    client.breaker.opened_at = time.monotonic()
+    with pytest.raises(tmdb.CircuitOpen):
+        client.get('/movie/1')
+    assert client.session.calls == 0
+
+
+def test_half_open_trial_success_closes_the_breaker():
+    client = half_open_client(503, 200)
+    assert client.get('/movie/1').status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.ChunkedEncodingError('cut off'),
+                                   requests.exceptions.TooManyRedirects('loop')])
+def test_half_open_trial_that_raises_reopens_the_breaker(error):
+    client = half_open_client(error)
+    with pytest.raises(type(error)):
+        client.get('/movie/1')
+    # Not a network error, so no retry, but still a verdict on the trial
+    assert client.session.calls == 1
+    assert client.breaker.state == 'open' and not client.breaker.trial_running
+
+    # Once the cooldown passes the next trial goes through
+    client.breaker.opened_at -= 61
+    client.session = Session(200)
+    assert client.get('/movie/1').status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+def test_network_errors_are_retried():
+    client = half_open_client(requests.ConnectionError('reset'), requests.Timeout('slow'), 200)
+    assert client.get('/movie/1').status_code == 200
+    assert client.session.calls == 3
+
+
+@pytest.mark.skipif(tmdb.aiohttp is None, reason='needs aiohttp')
+def test_cancelled_async_trial_frees_the_breaker():
+    class SlowSession:
+        def get(self, url, **kwargs):
+            return self
+
+        async def __aenter__(self):
+            await asyncio.sleep(60)
+
+        async def __aexit__(self, *exc):
+            return False
+
+    async def main():
+        client = tmdb.AsyncTMDBClient(breaker=half_open_client().breaker)
+        client.session = SlowSession()
+        call = asyncio.ensure_future(client.get('/movie/1'))
+        await asyncio.sleep(0.01)
+        assert client.breaker.trial_running
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        return client.breaker
+
+    breaker = asyncio.run(main())
+    assert not breaker.trial_running and breaker.allow()
@@ -0,0 +1,69 @@
+import sqlite3
+import pytest
+import db
+import watch
+from conftest import add_title
+
+
+@pytest.fixture
+def buffer(conn, tmp_path, monkeypatch):
+    # The flusher opens its own connection to db.DB_PATH
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'netflix.db'))
+    for tmdb_id in range(1, 6):
+        add_title(conn, tmdb_id, f'Title {tmdb_id}')
+    conn.commit()
+    return watch.ProgressBuffer(interval=3600)
+
+
+def stored(conn):
+    return {(row['profile_id'], row['tmdb_id']): row['position']
+            for row in conn.execute('SELECT profile_id, tmdb_id, position FROM watch_progress')}
+
+
+def test_pings_coalesce_and_flush_in_one_write(buffer, conn):
+    for position in (10, 20, 30):
+        buffer.record(1, 'movie', 1, position, 100)
+    buffer.record(2, 'movie', 2, 5, 100)
+    assert buffer.stats()['pending'] == 2
+    assert stored(conn) == {}
+
+    assert buffer.flush() == 2
+    assert stored(conn) == {(1, 1): 30, (2, 2): 5}
+    assert buffer.stats()['pending'] == 0 and buffer.flush() == 0
+
+
+def test_failed_flush_is_restored_without_losing_newer_pings(buffer, conn, monkeypatch):
+    buffer.record(1, 'movie', 1, 10, 100)
+    buffer.record(1, 'movie', 2, 10, 100)
+    write = buffer.write
+
+    def failing_write(entries):
+        # A newer ping for title 1 arrives while the write is failing
+        buffer.record(1, 'movie', 1, 50, 100)
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(buffer, 'write', failing_write)
+    assert buffer.flush() == 0
+    assert buffer.stats()['errors'] == 1
+    assert buffer.pending_for(1)[('movie', 1)][0] == 50
+    assert buffer.pending_for(1)[('movie', 2)][0] == 10
+
+    monkeypatch.setattr(buffer, 'write', write)
+    assert buffer.flush() == 2
+    assert stored(conn) == {(1, 1): 50, (1, 2): 10}
+
+
+def test_continue_watching_merges_buffered_pings(buffer, conn):
+    buffer.record(1, 'movie', 1, 10, 100)
+    buffer.record(1, 'movie', 2, 10, 100)
+    buffer.flush()
+    # Unflushed: title 3 started, title 2 watched to the end, title 1 rewound
+    buffer.record(1, 'movie', 3, 40, 100)
+    buffer.record(1, 'movie', 2, 99, 100)
+    buffer.record(1, 'movie', 1, 5, 100)
+
+    row = watch.continue_watching(conn, 1, pending=buffer.pending_for(1))
+    assert [(movie['tmdb_id'], movie['progress']) for movie in row] == [(1, 5), (3, 40)]
+    # Without the buffer it's what was written
+    assert [movie['tmdb_id'] for movie in watch.continue_watching(conn, 1)] == [2, 1]
+    assert watch.continue_watching(conn, 2, pending=buffer.pending_for(2)) == []
@@ -0,0 +1,434 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp  # only needed by AsyncTMDBClient, i.e. the ASGI entry point (asgi.py)
+except ImportError:
+    aiohttp = None
+
+# --- CONFIGURATION ---
+# Point TMDB_API_URL at a local stub (benchmarks/stub_tmdb.py) to run without the real API
+API_URL = os.environ.get('TMDB_API_URL', 'https://api.themoviedb.org/3')
+IMAGE_URL = os.environ.get('TMDB_IMAGE_URL', 'https://image.tmdb.org/t/p')
+
+# The API key: TMDB_API_KEY from the environment, else config.py. A stub (TMDB_API_URL
+# set) takes any key, so benchmarks and tests run without either.
+try:
+    from config import TMDB_API_KEY
+except ImportError:
+    TMDB_API_KEY = None
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY') or TMDB_API_KEY
+if TMDB_API_KEY is None and 'TMDB_API_URL' in os.environ:
+    TMDB_API_KEY = 'stub'
+
+# TMDB allows roughly 50 requests/second per IP; stay a little under it
+RATE_LIMIT = 40
+
+# (connect, read) seconds: a slow TMDB must never hold a worker thread forever
+TIMEOUT = (3.05, 10)
+
+# Retries on 429/5xx and network errors, with full-jitter exponential backoff
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+MAX_BACKOFF = 8
+
+# After this many failed calls in a row, fail fast for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class TokenBucket:
+    """
+    Lets `rate` calls per second through on average, with bursts of up to
+    `burst`. acquire() blocks until a token is available, so any number of
+    threads can share one bucket.
+    """
+    def __init__(self, rate=RATE_LIMIT, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; while open every
+    call fails at once. After `cooldown` seconds one trial call is let through
+    (half open): success closes the breaker, failure opens it again.
+    """
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def abandon(self):
+        # The call was given up before TMDB answered: no verdict, the next call may be the trial
+        with self.lock:
+            self.trial_running = False
+
+
+class EndpointStats:
+    # Counters plus the last 512 latencies, enough for stable percentiles
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=512)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'rejected': self.rejected,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+
+def endpoint_name(path):
+    # "/movie/550/videos" -> "/movie/{id}/videos", so metrics group per endpoint, not per title
+    return re.sub(r'/\d+', '/{id}', path)
+
+
+class TMDBClient:
+    """
+    The one way app.py and seed.py talk to TMDB: a pooled keep-alive session,
+    (connect, read) timeouts, retries with jittered backoff that honor
+    Retry-After, an optional rate limiter and a circuit breaker.
+
+    get() returns the final requests.Response (404s included). It raises
+    CircuitOpen while TMDB is considered down, and the last error once the
+    retries are used up.
+    """
+    def __init__(self, pool_size=32, timeout=TIMEOUT, retries=MAX_RETRIES, max_backoff=MAX_BACKOFF,
+                 limiter=None, breaker=None):
+        self.session = make_session(pool_size)
+        self.timeout = timeout
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def endpoint_stats(self, path):
+        name = endpoint_name(path)
+        with self.lock:
+            if name not in self.stats:
+                self.stats[name] = EndpointStats()
+            return self.stats[name]
+
+    def get(self, path, **params):
+        stats = self.endpoint_stats(path)
+        if not self.breaker.allow():
+            stats.rejected += 1
+            raise CircuitOpen(f"TMDB circuit open, skipping {endpoint_name(path)}")
+
+        started = time.monotonic()
+        throttled = 0.0
+        stats.calls += 1
+        attempt = 0
+        while True:
+            if self.limiter:
+                # Time spent queued on our own rate limit isn't TMDB's latency
+                queued_at = time.monotonic()
+                self.limiter.acquire()
+                throttled += time.monotonic() - queued_at
+
+            response, error = None, None
+            try:
+                response = self.session.get(build_url(path), params=params_with_key(**params), timeout=self.timeout)
+            except requests.RequestException as e:
+                # Only network errors are worth another try, but every one is a failed call
+                error = e
+
+            retryable = isinstance(error, RETRY_ERRORS) or (error is None and response.status_code in RETRY_STATUSES)
+            if not retryable or attempt >= self.retries:
+                break
+            attempt += 1
+            stats.retries += 1
+            time.sleep(self.backoff(attempt, response))
+
+        stats.latencies.append(time.monotonic() - started - throttled)
+        if retryable or error is not None:
+            stats.errors += 1
+            self.breaker.record_failure()
+            if error is not None:
+                raise error
+        else:
+            self.breaker.record_success()
+        return response
+
+    def backoff(self, attempt, response=None):
+        return backoff_delay(attempt, self.max_backoff, response)
+
+    def metrics(self):
+        with self.lock:
+            endpoints = dict(self.stats)
+        return {
+            'breaker': self.breaker.state,
+            'endpoints': {name: stats.summary() for name, stats in sorted(endpoints.items())},
+        }
+
+
+class AsyncResponse:
+    # What the routes use of a requests.Response, read in full so the connection goes straight back to the pool
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"TMDB answered HTTP {self.status_code}")
+
+
+class AsyncTMDBClient(TMDBClient):
+    """
+    TMDBClient for asyncio code: the same retries, breaker and metrics, on
+    one shared aiohttp session, so a request waiting on TMDB holds no
+    thread. open() and close() belong to the event loop's startup and
+    shutdown. Needs aiohttp installed.
+    """
+    def __init__(self, pool_size=256, timeout=TIMEOUT, retries=MAX_RETRIES, max_backoff=MAX_BACKOFF, breaker=None):
+        if aiohttp is None:
+            raise RuntimeError("AsyncTMDBClient needs aiohttp (pip install aiohttp)")
+        self.pool_size = pool_size
+        self.session = None
+        self.timeout = timeout
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.limiter = None
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def open(self):
+        connect_timeout, read_timeout = self.timeout
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout))
+
+    async def close(self):
+        await self.session.close()
+
+    async def get(self, path, **params):
+        stats = self.endpoint_stats(path)
+        if not self.breaker.allow():
+            stats.rejected += 1
+            raise CircuitOpen(f"TMDB circuit open, skipping {endpoint_name(path)}")
+
+        started = time.monotonic()
+        stats.calls += 1
+        try:
+            response, error, retryable = await self.attempts(path, params, stats)
+        except asyncio.CancelledError:
+            # The caller went away (a client disconnect): don't leave a half-open trial running forever
+            self.breaker.abandon()
+            raise
+
+        stats.latencies.append(time.monotonic() - started)
+        if retryable:
+            stats.errors += 1
+            self.breaker.record_failure()
+            if error is not None:
+                raise error
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def attempts(self, path, params, stats):
+        # The first try and its retries; returns (last response, last error, whether it failed)
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                async with self.session.get(build_url(path), params=params_with_key(**params)) as raw:
+                    response = AsyncResponse(raw.status, raw.headers, await raw.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt >= self.retries:
+                return response, error, retryable
+            attempt += 1
+            stats.retries += 1
+            await asyncio.sleep(self.backoff(attempt, response))
+
+
+def backoff_delay(attempt, max_backoff, response=None):
+    # Retry-After when TMDB sends one, else full jitter
+    retry_after = retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, max_backoff)
+    return random.uniform(0, min(max_backoff, BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def make_session(pool_size=32):
+    # Keep-alive connections shared by every thread, so only the first call pays the TLS handshake
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def build_url(path):
+    return f"{API_URL}{path}"
+
+
+def params_with_key(**params):
+    return {'api_key': TMDB_API_KEY, **params}
+
+
+def details_params(media_type):
+    # Everything seed.py keeps about a title, appended to one details request
+    append_to = "release_dates" if media_type == "movie" else "content_ratings"
+    return {'append_to_response': f"{append_to},credits,videos,images", 'include_image_language': "en,null"}
+
+
+# --- PARSING ---
+# How many cast names a trimmed detail record keeps (the info modal shows 3)
+DETAIL_CAST = 5
+
+
+def pick_trailer(videos):
+    # First YouTube "Trailer", else whatever YouTube video comes first
+    for video in videos:
+        if video.get('site') == 'YouTube' and video.get('type') == 'Trailer':
+            return video['key']
+    if videos and videos[0].get('site') == 'YouTube':
+        return videos[0]['key']
+    return None
+
+
+def get_logo(data):
+    logos = data.get('images', {}).get('logos', [])
+    if logos:
+        return logos[0]['file_path']
+    return None
+
+
+def get_real_certification(media_type, data):
+    # US or Indian rating, else a generic default
+    try:
+        if media_type == "movie":
+            releases = data.get("release_dates", {}).get("results", [])
+            for country in releases:
+                if country["iso_3166_1"] in ["US", "IN"]:
+                    for release in country["release_dates"]:
+                        if release["certification"]:
+                            return release["certification"]
+        else:
+            ratings = data.get("content_ratings", {}).get("results", [])
+            for rating in ratings:
+                if rating["iso_3166_1"] in ["US", "IN"]:
+                    return rating["rating"]
+    except (KeyError, TypeError):
+        pass
+    return "PG-13" if media_type == "movie" else "TV-14"
+
+
+def trim_details(data):
+    """
+    The parts of a details response (with credits and videos appended) the
+    info modal and trailer player use, small enough to keep per title.
+    """
+    runtime = data.get('runtime') or next(iter(data.get('episode_run_time') or []), None)
+    return {
+        'trailer_key': pick_trailer(data.get('videos', {}).get('results', [])),
+        'runtime': runtime,
+        'genres': [genre['name'] for genre in data.get('genres', [])],
+        'cast': [person['name'] for person in data.get('credits', {}).get('cast', [])[:DETAIL_CAST]],
+    }
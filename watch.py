@@ -0,0 +1,222 @@
+import atexit
+import json
+import math
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import db
+
+# --- WATCH PROGRESS ---
+# How far each profile got into each title, for the "Continue Watching" row.
+# The player reports its position every few seconds, far more often than
+# anyone needs it stored, so /progress only records the ping in a
+# ProgressBuffer. Pings for the same (profile, title) overwrite each other
+# there, and a flusher thread writes whatever is left every FLUSH_INTERVAL
+# in one transaction: one upsert per title being watched, not one commit
+# per ping.
+
+FLUSH_INTERVAL = float(os.environ.get('NETFLIX_PROGRESS_FLUSH_MS', 1000)) / 1000  # 0 writes every ping straight away
+MAX_PENDING = 10000   # titles buffered before the flusher is woken early
+FINISHED = 0.95       # past this share of the runtime a title counts as watched and leaves the row
+ROW_LIMIT = 20
+
+
+def create_progress_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watch_progress (
+            profile_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL,
+            tmdb_id INTEGER NOT NULL,
+            position REAL NOT NULL,
+            duration REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (profile_id, media_type, tmdb_id)
+        ) WITHOUT ROWID
+    """)
+    # The row: a profile's titles, latest first
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_watch_progress_recent
+        ON watch_progress(profile_id, updated_at DESC)
+    """)
+
+
+def parse_progress(body):
+    # {"position": 42.5, "duration": 120} -> (42.5, 120.0); raises ValueError on anything else
+    try:
+        position, duration = float(body['position']), float(body['duration'])
+    except (TypeError, KeyError, ValueError):
+        raise ValueError("Expected {\"position\": seconds, \"duration\": seconds}")
+    if not (math.isfinite(position) and math.isfinite(duration)) or position < 0 or duration <= 0:
+        raise ValueError("position and duration must be positive numbers")
+    return min(position, duration), duration
+
+
+def save_progress(conn, entries):
+    """
+    Upserts [(profile_id, media_type, tmdb_id, position, duration, updated_at)].
+    An entry older than what is stored (another worker process got there
+    first) is ignored. Runs inside the caller's transaction.
+    """
+    conn.executemany("""
+        INSERT INTO watch_progress (profile_id, media_type, tmdb_id, position, duration, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(profile_id, media_type, tmdb_id) DO UPDATE SET
+            position = excluded.position, duration = excluded.duration, updated_at = excluded.updated_at
+        WHERE excluded.updated_at >= watch_progress.updated_at
+    """, entries)
+
+
+def continue_watching(conn, profile_id, limit=ROW_LIMIT, pending=None):
+    """
+    Titles the profile started and hasn't finished, most recently watched
+    first. `pending` is ProgressBuffer.pending_for(profile_id): pings not
+    written yet, merged in here so the row is current without a flush.
+    """
+    pending = pending or {}
+    try:
+        rows = conn.execute("""
+            SELECT movies.*, watch_progress.position, watch_progress.duration, watch_progress.updated_at
+            FROM watch_progress
+            JOIN movies ON movies.tmdb_id = watch_progress.tmdb_id AND movies.media_type = watch_progress.media_type
+            WHERE watch_progress.profile_id = ? AND watch_progress.position < watch_progress.duration * ?
+            ORDER BY watch_progress.updated_at DESC
+            LIMIT ?
+        """, (profile_id, FINISHED, limit + len(pending))).fetchall()
+        buffered = conn.execute("""
+            SELECT movies.* FROM json_each(?) AS title
+            JOIN movies ON movies.media_type = json_extract(title.value, '$[0]')
+            AND movies.tmdb_id = json_extract(title.value, '$[1]')
+        """, (json.dumps(list(pending)),)).fetchall() if pending else []
+    except sqlite3.OperationalError:
+        # Database from before watch_progress existed (python migrate.py adds it)
+        return []
+
+    # (media_type, tmdb_id) -> (movie, position, duration, updated_at); a buffered ping wins unless it's older
+    titles = {(row['media_type'], row['tmdb_id']): (row, row['position'], row['duration'], row['updated_at'])
+              for row in rows}
+    for row in buffered:
+        key = (row['media_type'], row['tmdb_id'])
+        ping = pending[key]
+        if key not in titles or ping[2] >= titles[key][3]:
+            titles[key] = (row, *ping)
+
+    watching = sorted((title for title in titles.values() if title[1] < title[2] * FINISHED),
+                      key=lambda title: -title[3])[:limit]
+    return [dict(movie, position=position, duration=duration, progress=round(100 * position / duration))
+            for movie, position, duration, _ in watching]
+
+
+class ProgressBuffer:
+    """
+    Latest ping per (profile, title), written to watch_progress by a daemon
+    thread every `interval` seconds. The thread starts on the first ping in
+    each process (so nothing runs before a forking server forks), and
+    whatever is still buffered is written when the process exits normally.
+    """
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}  # profile_id -> {(media_type, tmdb_id): (position, duration, updated_at)}
+        self.count = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # one write at a time, in order
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.conn = self.conn_pid = None
+        self.pings = self.flushes = self.written = self.errors = 0
+
+    def record(self, profile_id, media_type, tmdb_id, position, duration):
+        if self.interval <= 0:
+            with self.flush_lock:
+                self.write([(profile_id, media_type, tmdb_id, position, duration, time.time())])
+                self.pings += 1
+            return
+        self.start()
+        with self.lock:
+            titles = self.pending.setdefault(profile_id, {})
+            self.count += (media_type, tmdb_id) not in titles
+            titles[(media_type, tmdb_id)] = (position, duration, time.time())
+            self.pings += 1
+            full = self.count >= self.max_pending
+        if full:
+            self.wakeup.set()
+
+    def pending_for(self, profile_id):
+        # A copy of what is buffered for one profile: {(media_type, tmdb_id): (position, duration, updated_at)}
+        with self.lock:
+            return dict(self.pending.get(profile_id, {}))
+
+    def start(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.pid = os.getpid()
+                    # A child forked from a process with pings buffered: those are the parent's to write
+                    self.pending, self.count = {}, 0
+                    atexit.register(self.flush)
+                    threading.Thread(target=self.run, name='progress-flush', daemon=True).start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        # Writes everything buffered in one transaction; returns how many titles it wrote
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending, self.count = self.pending, {}, 0
+            entries = [(profile_id, media_type, tmdb_id, *ping)
+                       for profile_id, titles in pending.items()
+                       for (media_type, tmdb_id), ping in titles.items()]
+            if not entries:
+                return 0
+            try:
+                self.write(entries)
+            except sqlite3.Error as e:
+                print(f"Watch progress flush failed, keeping {len(entries)} titles for the next one: {e}")
+                self.errors += 1
+                self.restore(pending)
+                return 0
+            self.flushes += 1
+            self.written += len(entries)
+            return len(entries)
+
+    def write(self, entries):
+        # Callers hold flush_lock, so the one connection is never used by two threads at once
+        if self.conn_pid != os.getpid():
+            self.conn, self.conn_pid = db.connect(), os.getpid()
+        try:
+            save_progress(self.conn, entries)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def restore(self, pending):
+        # Puts back a failed flush, unless a newer ping came in for the same title meanwhile
+        with self.lock:
+            for profile_id, titles in pending.items():
+                current = self.pending.setdefault(profile_id, {})
+                for key, ping in titles.items():
+                    if key not in current:
+                        current[key] = ping
+                        self.count += 1
+
+    def stats(self):
+        return {'pending': self.count, 'pings': self.pings, 'flushes': self.flushes,
+                'written': self.written, 'errors': self.errors, 'interval_ms': self.interval * 1000}
+
+
+def exit_on_sigterm():
+    """
+    Turns SIGTERM into a normal exit, so the atexit flush runs when `flask run`
+    or a container is stopped. Leaves a handler someone else installed (e.g.
+    gunicorn's, which exits cleanly already) alone; main thread only.
+    """
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))